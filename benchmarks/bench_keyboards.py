@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк кэшированных клавиатур: время построения и число выделений памяти
+по сравнению с построением клавиатуры на каждый вызов
+
+Запуск из корня проекта:
+    python benchmarks/bench_keyboards.py
+"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyboards.builders import get_main_keyboard, get_admin_keyboard  # noqa: E402
+from keyboards.inline import (  # noqa: E402
+    get_email_management_keyboard,
+    get_language_keyboard,
+    get_messages_keyboard,
+    _message_button,
+    _refresh_button,
+)
+from keyboards.registry import clear_keyboard_cache  # noqa: E402
+
+INBOX = [{"id": f"msg{i}", "subject": f"Subject number {i} with a fairly long text"} for i in range(50)]
+
+
+def uncached_messages_keyboard(messages, lang):
+    """get_messages_keyboard без переиспользования кнопок"""
+    from aiogram.types import InlineKeyboardMarkup
+
+    keyboard = [
+        [_message_button.__wrapped__(message.get("id", ""), message.get("subject") or "Без темы")]
+        for message in messages
+    ]
+    keyboard.append([_refresh_button.__wrapped__(lang)])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+CASES = [
+    ("main keyboard", lambda: get_main_keyboard("en"), lambda: get_main_keyboard.__wrapped__("en")),
+    ("admin keyboard", lambda: get_admin_keyboard("en"), lambda: get_admin_keyboard.__wrapped__("en")),
+    ("email management", lambda: get_email_management_keyboard("en"),
+     lambda: get_email_management_keyboard.__wrapped__("en")),
+    ("language keyboard", get_language_keyboard, get_language_keyboard.__wrapped__),
+    ("inbox, 50 messages", lambda: get_messages_keyboard(INBOX, "en"),
+     lambda: uncached_messages_keyboard(INBOX, "en")),
+]
+
+
+def peak_memory(func) -> int:
+    """Пиковый объем памяти (байт), выделенной за один вызов"""
+    func()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(number: int = 20_000):
+    clear_keyboard_cache()
+    print(f"{'case':<22}{'uncached, ns':>14}{'cached, ns':>12}{'speedup':>10}{'peak, bytes':>18}")
+    for name, cached, uncached in CASES:
+        assert cached().model_dump() == uncached().model_dump(), name
+        slow = min(timeit.repeat(uncached, number=number // 10, repeat=3)) / (number // 10) * 1e9
+        fast = min(timeit.repeat(cached, number=number, repeat=3)) / number * 1e9
+        peak = f"{peak_memory(uncached)} -> {peak_memory(cached)}"
+        print(f"{name:<22}{slow:>14.0f}{fast:>12.0f}{slow / fast:>9.1f}x{peak:>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк utils.translator.t: скомпилированные таблицы против прежней реализации
+
+Запуск из корня проекта:
+    python benchmarks/bench_translator.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.translator import LOCALES, t  # noqa: E402
+
+
+def legacy_t(key: str, lang: str = "ru", **kwargs) -> str:
+    """Прежняя реализация t(): два поиска в словарях, fallback и str.format на каждый вызов"""
+    locale_dict = LOCALES.get(lang, {})
+    template = locale_dict.get(key, key)
+    if template == key and lang != "ru":
+        template = LOCALES.get("ru", {}).get(key, key)
+    try:
+        return template.format(**kwargs)
+    except (KeyError, ValueError):
+        return template
+
+
+CASES = [
+    ("constant ru", lambda f: f("btn_get_mail", "ru")),
+    ("constant en", lambda f: f("btn_get_mail", "en")),
+    ("template", lambda f: f("mail_created", "en", email="user@example.com")),
+    ("missing key", lambda f: f("no_such_key", "en")),
+    ("main keyboard (3 calls)", lambda f: (f("btn_get_mail", "en"), f("btn_view_mails", "en"), f("btn_delete", "en"))),
+]
+
+
+def main(number: int = 200_000):
+    print(f"{'case':<26}{'legacy, ns':>12}{'compiled, ns':>14}{'speedup':>10}")
+    for name, case in CASES:
+        assert case(legacy_t) == case(t), name
+        legacy = min(timeit.repeat(lambda: case(legacy_t), number=number, repeat=5)) / number * 1e9
+        compiled = min(timeit.repeat(lambda: case(t), number=number, repeat=5)) / number * 1e9
+        print(f"{name:<26}{legacy:>12.0f}{compiled:>14.0f}{legacy / compiled:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
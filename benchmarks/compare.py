@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Сравнение двух результатов benchmarks/run.py с порогом регрессии
+
+Запуск из корня проекта:
+    python benchmarks/compare.py baseline.json current.json --threshold 0.15
+
+Код возврата 1, если хотя бы один бенчмарк стал медленнее больше чем на порог
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_METRIC = "median_ns"
+
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    """Результаты по именам бенчмарков из JSON-файла"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare(baseline: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]],
+            threshold: float = DEFAULT_THRESHOLD, metric: str = DEFAULT_METRIC) -> List[Tuple[str, float, float, float, str]]:
+    """
+    Сравнение общих бенчмарков
+
+    :return: Строки (имя, было, стало, отношение, статус); статус - "regression", "faster" или "ok"
+    """
+    rows = []
+    for name in sorted(baseline.keys() & current.keys()):
+        before = baseline[name][metric]
+        after = current[name][metric]
+        ratio = after / before if before else 1.0
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 - threshold:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, before, after, ratio, status))
+    return rows
+
+
+def print_comparison(rows: List[Tuple[str, float, float, float, str]], baseline_only: List[str], current_only: List[str]):
+    print(f"{'benchmark':<44}{'before, ns':>14}{'after, ns':>14}{'ratio':>9}  status")
+    for name, before, after, ratio, status in rows:
+        print(f"{name:<44}{before:>14.0f}{after:>14.0f}{ratio:>8.2f}x  {status}")
+    for name in baseline_only:
+        print(f"{name:<44}{'':>14}{'':>14}{'':>9}  missing")
+    for name in current_only:
+        print(f"{name:<44}{'':>14}{'':>14}{'':>9}  new")
+
+
+def check(baseline_path: str, current: Dict[str, Dict[str, Any]], threshold: float = DEFAULT_THRESHOLD,
+          metric: str = DEFAULT_METRIC) -> bool:
+    """Вывести сравнение с файлом baseline; False если есть регрессии"""
+    baseline = load_results(baseline_path)
+    rows = compare(baseline, current, threshold, metric)
+    print_comparison(rows, sorted(baseline.keys() - current.keys()), sorted(current.keys() - baseline.keys()))
+
+    regressions = [row[0] for row in rows if row[4] == "regression"]
+    if regressions:
+        print(f"\nРегрессии больше {threshold:.0%}: {', '.join(regressions)}")
+        return False
+    print(f"\nРегрессий больше {threshold:.0%} нет")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение результатов бенчмарков")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Допустимое замедление (0.1 = 10%%)")
+    parser.add_argument("--metric", default=DEFAULT_METRIC, choices=("median_ns", "min_ns", "mean_ns"))
+    args = parser.parse_args()
+
+    ok = check(args.baseline, load_results(args.current), args.threshold, args.metric)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
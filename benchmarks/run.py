@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Набор бенчмарков горячих путей: переводы, клавиатуры, хранилище пользователей,
+цепочка middlewares и разбор ответов Mail.gw. Результаты сохраняются в JSON
+и сравниваются с предыдущим прогоном (см. benchmarks/compare.py)
+
+Запуск из корня проекта:
+    python benchmarks/run.py --output baseline.json
+    python benchmarks/run.py --output current.json --compare baseline.json --threshold 0.15
+    python benchmarks/run.py --filter storage --sizes 1000,10000
+
+Хранилище пишется во временную папку, рабочие файлы storage/ не затрагиваются
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Пути хранилища вычисляются при импорте модулей бота
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp(prefix="mailbot-bench-")
+
+from aiogram.dispatcher.middlewares.manager import MiddlewareManager  # noqa: E402
+from aiogram.types import Message  # noqa: E402
+
+import bench_keyboards  # noqa: E402
+import bench_translator  # noqa: E402
+import compare  # noqa: E402
+from keyboards.inline import (  # noqa: E402
+    get_confirm_delete_keyboard,
+    get_confirm_replacement_keyboard,
+    get_message_actions_keyboard,
+    get_messages_keyboard,
+)
+from middlewares import BanMiddleware, LanguageMiddleware, ThrottlingMiddleware  # noqa: E402
+from services.api_client import MailGwClient  # noqa: E402
+from config.settings import settings  # noqa: E402
+from tools.fake_mailgw import FakeMailGw  # noqa: E402
+from utils import storage_format, storage_utils  # noqa: E402
+from utils.storage_engine import JsonBackend, StorageBackend  # noqa: E402
+from utils.translator import t  # noqa: E402
+from utils.user_record import UserRecord  # noqa: E402
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+INBOX_SIZES = (100, 1_000)
+# Поля результата замера; остальные добавлены Case.info
+MEASURE_KEYS = ("median_ns", "min_ns", "mean_ns", "stdev_ns", "number", "repeat")
+
+
+class Case:
+    """Один бенчмарк: синхронная функция или корутина без аргументов"""
+
+    def __init__(self, name: str, func: Callable[[], Any], is_async: bool = False,
+                 setup: Optional[Callable[[], Any]] = None, info: Optional[Callable[[], Dict[str, Any]]] = None):
+        """
+        :param setup: Подготовка перед замером (заполнение хранилища)
+        :param info: Дополнительные поля результата после замера (например, размер файла)
+        """
+        self.name = name
+        self.func = func
+        self.is_async = is_async
+        self.setup = setup
+        self.info = info
+
+
+def slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def translator_cases() -> List[Case]:
+    return [Case(f"translator.{slug(name)}", lambda case=case: case(t)) for name, case in bench_translator.CASES]
+
+
+def keyboard_cases() -> List[Case]:
+    cases = []
+    for name, cached, uncached in bench_keyboards.CASES:
+        cases.append(Case(f"keyboards.{slug(name)}.cached", cached))
+        cases.append(Case(f"keyboards.{slug(name)}.uncached", uncached))
+    cases += [
+        Case("keyboards.message_actions.cached", lambda: get_message_actions_keyboard("msg1", "en")),
+        Case("keyboards.confirm_replacement.cached", lambda: get_confirm_replacement_keyboard("en")),
+        Case("keyboards.confirm_delete.cached", lambda: get_confirm_delete_keyboard("en")),
+    ]
+    for size in INBOX_SIZES:
+        inbox = [{"id": f"{i:024x}", "subject": f"Subject number {i} with a fairly long text"} for i in range(size)]
+        cases.append(Case(f"inbox_keyboard.{size}.warm", lambda inbox=inbox: get_messages_keyboard(inbox, "en")))
+        cases.append(Case(
+            f"inbox_keyboard.{size}.cold", lambda inbox=inbox: bench_keyboards.uncached_messages_keyboard(inbox, "en")
+        ))
+    return cases
+
+
+def fill_storage(size: int, backend: Optional[StorageBackend] = None):
+    """Хранилище (по умолчанию - бота, бэкенд из STORAGE_BACKEND) с size пользователями и пустой статистикой"""
+    backend = backend or storage_utils.storage_engine
+    now = int(time.time())
+    users = [
+        UserRecord(
+            1_000_000 + i, f"user{i}@fakemail.test", "x" * 12, "t" * 64, f"{i:024x}",
+            "en" if i % 3 else "ru", now, now, now
+        )
+        for i in range(size)
+    ]
+    with backend.transaction():
+        for user_id in backend.user_ids():
+            backend.delete_user(user_id)
+        backend.put_users(users)
+        backend.put_doc(storage_utils.STATS, {})
+
+
+def storage_cases(sizes) -> List[Case]:
+    cases = []
+    for size in sizes:
+        middle = 1_000_000 + size // 2
+        setup = lambda size=size: fill_storage(size)  # noqa: E731
+        cases.append(Case(f"storage.get_user.{size}", lambda user=middle: storage_utils.get_user(user), setup=setup))
+        cases.append(Case(
+            f"storage.update_user.{size}", lambda user=middle: storage_utils.update_user(user, lang="en"), setup=setup
+        ))
+    return cases
+
+
+def storage_format_cases(sizes) -> List[Case]:
+    """Запись и чтение файла пользователей (бэкенд json) в каждом формате; в результат добавляется размер файла"""
+    cases = []
+    backend = JsonBackend(os.path.join(settings.storage_dir, "formats"))
+
+    def setup(size: int, fmt: str):
+        backend.fmt = fmt
+        fill_storage(size, backend)
+
+    def file_size() -> Dict[str, Any]:
+        return {"file_bytes": os.path.getsize(backend.users_path)}
+
+    for size in sizes:
+        for fmt in storage_format.FORMATS:
+            prepare = lambda size=size, fmt=fmt: setup(size, fmt)  # noqa: E731
+            cases.append(Case(
+                f"storage.save.{fmt}.{size}", backend.write_users_file, setup=prepare, info=file_size
+            ))
+            cases.append(Case(f"storage.load.{fmt}.{size}", backend.read_users_file, setup=prepare, info=file_size))
+    return cases
+
+
+def middleware_cases() -> List[Case]:
+    """Ban -> Throttling -> Language до пустого обработчика, как в create_dispatcher"""
+    async def handler(event, **kwargs):
+        return None
+
+    # Без интервала антиспама измеряется основной путь (сообщение пропускается дальше)
+    chain = MiddlewareManager.wrap_middlewares(
+        [BanMiddleware(), ThrottlingMiddleware(rate_limit=0.0), LanguageMiddleware()], handler
+    )
+    message = Message.model_validate({
+        "message_id": 1, "date": 0, "text": "/inbox",
+        "chat": {"id": 1_000_001, "type": "private"},
+        "from": {"id": 1_000_001, "is_bot": False, "first_name": "Bench"},
+    })
+    return [Case("middleware.chain.1000", lambda: chain(message, {}), is_async=True, setup=lambda: fill_storage(1_000))]
+
+
+def mailgw_cases() -> List[Case]:
+    """Разбор ответов: декодирование JSON и обработка в методах клиента, без сети"""
+    fake = FakeMailGw(messages_per_inbox=50, seed=1)
+    inbox = fake._make_inbox("user@fakemail.test")
+    summary_fields = ("id", "from", "to", "subject", "intro", "seen", "hasAttachments", "size", "createdAt")
+    payloads = {
+        "/domains": {"hydra:member": [{"id": "0" * 24, "domain": domain, "isActive": True} for domain in fake.domains]},
+        "/messages": {"hydra:member": [{key: message[key] for key in summary_fields} for message in inbox]},
+        "/messages/": inbox[0],
+    }
+    raw = {endpoint: json.dumps(payload).encode() for endpoint, payload in payloads.items()}
+
+    client = MailGwClient()
+    client.cache_ttl = 0  # каждый вызов разбирает ответ заново
+
+    async def make_request(method, endpoint, data=None, headers=None):
+        key = "/messages/" if endpoint.startswith("/messages/") else endpoint
+        return json.loads(raw[key])
+
+    client._make_request = make_request
+    message_id = inbox[0]["id"]
+    return [
+        Case("mailgw.get_domains", client.get_domains, is_async=True),
+        Case("mailgw.generate_email", client.generate_email, is_async=True),
+        Case("mailgw.get_messages.50", lambda: client.get_messages("token"), is_async=True),
+        Case("mailgw.get_message", lambda: client.get_message(message_id, "token"), is_async=True),
+    ]
+
+
+def make_timer(case: Case, loop: asyncio.AbstractEventLoop) -> Callable[[int], float]:
+    """Функция: время выполнения number вызовов (секунды)"""
+    if not case.is_async:
+        timer = timeit.Timer(case.func)
+        return timer.timeit
+
+    async def batch(number: int) -> float:
+        func = case.func
+        start = time.perf_counter()
+        for _ in range(number):
+            await func()
+        return time.perf_counter() - start
+
+    return lambda number: loop.run_until_complete(batch(number))
+
+
+def measure(case: Case, loop: asyncio.AbstractEventLoop, min_time: float, repeat: int) -> Dict[str, float]:
+    """Подбор числа вызовов под min_time (как timeit.autorange) и repeat замеров"""
+    timer = make_timer(case, loop)
+    number = 1
+    while True:
+        elapsed = timer(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+
+    per_call = [timer(number) / number * 1e9 for _ in range(repeat)]
+    return {
+        "median_ns": statistics.median(per_call),
+        "min_ns": min(per_call),
+        "mean_ns": statistics.fmean(per_call),
+        "stdev_ns": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(cases: List[Case], min_time: float, repeat: int) -> Dict[str, Any]:
+    loop = asyncio.new_event_loop()
+    results = {}
+    print(f"{'benchmark':<44}{'median, ns':>14}{'min, ns':>14}{'stdev %':>9}")
+    try:
+        for case in cases:
+            if case.setup:
+                case.setup()
+            row = measure(case, loop, min_time, repeat)
+            if case.info:
+                row.update(case.info())
+            results[case.name] = row
+            spread = row["stdev_ns"] / row["mean_ns"] * 100 if row["mean_ns"] else 0.0
+            extra = "".join(f"  {key}={value}" for key, value in row.items() if key not in MEASURE_KEYS)
+            print(f"{case.name:<44}{row['median_ns']:>14.0f}{row['min_ns']:>14.0f}{spread:>8.1f}%{extra}")
+    finally:
+        loop.close()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "min_time": min_time,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей бота")
+    parser.add_argument("--output", default="", help="Сохранить результаты в JSON-файл")
+    parser.add_argument("--compare", default="", help="JSON предыдущего прогона для проверки регрессий")
+    parser.add_argument("--threshold", type=float, default=compare.DEFAULT_THRESHOLD,
+                        help="Допустимое замедление (0.1 = 10%%)")
+    parser.add_argument("--metric", default=compare.DEFAULT_METRIC, choices=("median_ns", "min_ns", "mean_ns"))
+    parser.add_argument("--filter", default="", help="Только бенчмарки, в имени которых есть подстрока")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Размеры хранилища")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Минимальное время одного замера (с)")
+    parser.add_argument("--repeat", type=int, default=5, help="Количество замеров")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    cases = (translator_cases() + keyboard_cases() + storage_cases(sizes) + storage_format_cases(sizes)
+             + middleware_cases() + mailgw_cases())
+    cases = [case for case in cases if args.filter in case.name]
+
+    report = run(cases, args.min_time, args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        print()
+        if not compare.check(args.compare, report["results"], args.threshold, args.metric):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
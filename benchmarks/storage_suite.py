@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Общие проверки и бенчмарки бэкендов хранилища (utils/storage_engine): каждый бэкенд
+проходит одинаковый набор проверок поведения (копии записей, транзакции и откат,
+срезы для долгих чтений, сохранение между запусками, видимость и блокировки между
+процессами), затем
+замеряются основные операции на хранилищах разного размера
+
+Запуск из корня проекта:
+    python benchmarks/storage_suite.py
+    python benchmarks/storage_suite.py --backends journal,sqlite --sizes 1000,100000
+    python benchmarks/storage_suite.py --checks-only
+    python benchmarks/storage_suite.py --output storage.json
+
+Все файлы создаются во временных папках. Код выхода 1 - бэкенд не прошел проверки
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import traceback
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import storage_format  # noqa: E402
+from utils.storage_engine import BACKENDS, MemoryBackend, create_backend, dump_snapshot, load_operations  # noqa: E402
+from utils.storage_engine.journal import JournalBackend  # noqa: E402
+from utils.user_record import UserRecord  # noqa: E402
+
+DEFAULT_SIZES = (1_000, 10_000)
+# Бэкенды без диска пропускают проверки сохранения и работы нескольких процессов
+DISKLESS = ("memory",)
+# Число изменений из каждого процесса в проверке блокировок
+PROCESS_INCREMENTS = 50
+
+CHECKS: List[Callable[[str, str], None]] = []
+
+
+def check(func: Callable[[str, str], None]) -> Callable[[str, str], None]:
+    """Зарегистрировать проверку: func(имя бэкенда, пустая папка) бросает AssertionError"""
+    CHECKS.append(func)
+    return func
+
+
+def expect(condition: bool, message: str):
+    if not condition:
+        raise AssertionError(message)
+
+
+def make_user(user_id: int, **changes: Any) -> UserRecord:
+    now = int(time.time())
+    record = UserRecord(
+        user_id, f"user{user_id}@fakemail.test", "x" * 12, "t" * 64, f"{user_id:024x}",
+        "en" if user_id % 3 else "ru", now, now, now
+    )
+    record.update(**changes)
+    return record
+
+
+def run_process(name: str, directory: str, code: str):
+    """Выполнить code в отдельном процессе, где backend - тот же бэкенд на той же папке"""
+    script = (
+        f"import sys; sys.path.insert(0, {ROOT!r})\n"
+        f"from utils.storage_engine import create_backend\n"
+        f"from utils.user_record import UserRecord\n"
+        f"backend = create_backend({name!r}, {directory!r})\n"
+        f"{code}\n"
+        f"backend.close()\n"
+    )
+    return subprocess.Popen([sys.executable, "-c", script])
+
+
+# Проверки
+
+@check
+def check_users(name: str, directory: str):
+    backend = create_backend(name, directory)
+    expect(backend.get_user(1) is None and backend.count_users() == 0, "пустое хранилище")
+
+    record = make_user(1)
+    backend.put_user(record)
+    record.email = "changed@fakemail.test"
+    stored = backend.get_user(1)
+    expect(stored is not None and stored.email == "user1@fakemail.test", "put_user должен сохранять копию")
+    stored.token = "changed"
+    expect(backend.get_user(1).token == "t" * 64, "get_user должен возвращать копию")
+
+    backend.put_users(make_user(user_id) for user_id in (5, 3, 2))
+    expect(backend.count_users() == 4, "count_users после put_users")
+    expect(backend.user_ids() == [1, 2, 3, 5], "user_ids по возрастанию")
+    expect(sorted(record.user_id for record in backend.iter_users()) == [1, 2, 3, 5], "iter_users")
+
+    extra = make_user(7, note="hello")
+    backend.put_user(extra)
+    expect(backend.get_user(7).extra == {"note": "hello"}, "дополнительные поля записи")
+
+    deleted = backend.delete_user(3)
+    expect(deleted is not None and deleted.user_id == 3, "delete_user возвращает удаленную запись")
+    expect(backend.delete_user(3) is None, "повторное удаление")
+    expect(backend.get_user(3) is None and backend.count_users() == 4, "запись удалена")
+    backend.close()
+
+
+@check
+def check_items_and_docs(name: str, directory: str):
+    backend = create_backend(name, directory)
+    expect(backend.get_item("langs", "1", "ru") == "ru", "значение по умолчанию")
+    backend.set_item("langs", "1", "en")
+    backend.set_item("jobs", "a", {"cursor": 10})
+    expect(backend.get_item("langs", "1") == "en", "set_item")
+    expect(backend.items("jobs") == {"a": {"cursor": 10}}, "items")
+    expect(backend.items("missing") == {}, "пустое пространство имен")
+
+    items = backend.items("langs")
+    items["2"] = "de"
+    expect(backend.get_item("langs", "2") is None, "items должен возвращать копию словаря")
+
+    expect(backend.delete_item("langs", "1") and not backend.delete_item("langs", "1"), "delete_item")
+    expect(backend.get_item("langs", "1") is None, "значение удалено")
+
+    expect(backend.get_doc("stats") is None, "документа нет")
+    backend.put_doc("stats", {"total": 1})
+    backend.put_doc("banned", [1, 2])
+    expect(backend.get_doc("stats") == {"total": 1} and backend.get_doc("banned") == [1, 2], "put_doc")
+    backend.close()
+
+
+@check
+def check_transactions(name: str, directory: str):
+    backend = create_backend(name, directory)
+    backend.put_user(make_user(1))
+    backend.set_item("langs", "1", "ru")
+    backend.put_doc("stats", {"total": 1})
+
+    generation = backend.generation
+    with backend.transaction():
+        backend.get_user(1)
+    expect(backend.generation == generation, "транзакция без изменений не меняет поколение")
+
+    with backend.transaction():
+        backend.put_user(make_user(2))
+        with backend.transaction():
+            backend.set_item("langs", "2", "en")
+        expect(backend.in_transaction, "вложенная транзакция присоединяется к внешней")
+    expect(backend.generation == generation + 1, "одна фиксация на внешнюю транзакцию")
+    expect(backend.get_user(2) is not None and backend.get_item("langs", "2") == "en", "изменения зафиксированы")
+
+    try:
+        with backend.transaction():
+            backend.put_user(make_user(1, email="rollback@fakemail.test"))
+            backend.put_user(make_user(3))
+            backend.delete_user(2)
+            backend.set_item("langs", "1", "en")
+            backend.set_item("langs", "3", "de")
+            backend.put_doc("stats", {"total": 100})
+            backend.put_doc("new", [1])
+            raise RuntimeError("rollback")
+    except RuntimeError:
+        pass
+    expect(not backend.in_transaction, "транзакция завершена")
+    expect(backend.get_user(1).email == "user1@fakemail.test", "откат изменения записи")
+    expect(backend.get_user(3) is None, "откат добавления записи")
+    expect(backend.get_user(2) is not None, "откат удаления записи")
+    expect(backend.get_item("langs", "1") == "ru" and backend.get_item("langs", "3") is None, "откат словаря")
+    expect(backend.get_doc("stats") == {"total": 1} and backend.get_doc("new") is None, "откат документов")
+    expect(backend.count_users() == 2, "число пользователей после отката")
+    backend.close()
+
+
+@check
+def check_snapshots(name: str, directory: str):
+    backend = create_backend(name, directory)
+    backend.put_users(make_user(user_id) for user_id in range(1, 2001))
+    backend.set_item("user_languages", "1", "ru")
+    backend.put_doc("stats", {"total": 2000})
+
+    with backend.snapshot() as first:
+        with backend.snapshot() as same:
+            expect(same.version == first.version, "версия среза без изменений")
+        with backend.transaction():
+            try:
+                backend.snapshot()
+                expect(False, "срез внутри транзакции")
+            except RuntimeError:
+                pass
+
+        # Запись во время чтения среза из другого потока не ждет его и не попадает в него
+        scanned = []
+        reader = threading.Thread(target=lambda: scanned.extend(record.user_id for record in first.iter_users()))
+        reader.start()
+        backend.put_user(make_user(1, email="changed@fakemail.test"))
+        backend.put_user(make_user(5000))
+        backend.delete_user(2)
+        backend.set_item("user_languages", "1", "en")
+        backend.put_doc("stats", {"total": 2000, "changed": True})
+        reader.join()
+
+        expect(sorted(scanned) == list(range(1, 2001)), "срез при параллельной записи")
+        expect(first.count_users() == 2000 and first.user_ids()[:2] == [1, 2], "срез не видит записи после создания")
+        expect(next(r for r in first.iter_users() if r.user_id == 1).email == "user1@fakemail.test", "запись в срезе")
+        expect(first.items("user_languages") == {"1": "ru"} and first.get_doc("stats") == {"total": 2000}, "словари в срезе")
+
+    with backend.snapshot() as second:
+        expect(second.version != first.version, "версия среза после изменений")
+        expect(second.count_users() == 2000 and 5000 in second.user_ids() and 2 not in second.user_ids(), "новый срез")
+        expect(second.user_ids_after(None, 3) == [1, 3, 4] and second.user_ids_after(1999, 5) == [2000, 5000]
+               and second.user_ids_after(5000, 5) == [], "страницы ID в срезе")
+
+        # Содержимое среза переносится в другой бэкенд без потерь
+        copy = MemoryBackend()
+        load_operations(copy, dump_snapshot(second))
+        expect(copy.count_users() == 2000 and copy.get_user(1) == backend.get_user(1), "перенос среза")
+        expect(copy.get_item("user_languages", "1") == "en" and copy.get_doc("stats") == second.get_doc("stats"), "перенос среза")
+    backend.close()
+
+
+@check
+def check_persistence(name: str, directory: str):
+    if name in DISKLESS:
+        return
+    backend = create_backend(name, directory)
+    backend.put_users(make_user(user_id) for user_id in range(1, 101))
+    backend.delete_user(50)
+    backend.set_item("langs", "1", "en")
+    backend.put_doc("stats", {"total": 99})
+    record = backend.get_user(7)
+    backend.close()
+
+    reopened = create_backend(name, directory)
+    expect(reopened.count_users() == 99 and reopened.get_user(50) is None, "пользователи после перезапуска")
+    expect(reopened.get_user(7) == record, "поля записи после перезапуска")
+    expect(reopened.get_item("langs", "1") == "en", "словари после перезапуска")
+    expect(reopened.get_doc("stats") == {"total": 99}, "документы после перезапуска")
+    reopened.close()
+
+
+@check
+def check_processes(name: str, directory: str):
+    if name in DISKLESS:
+        return
+    backend = create_backend(name, directory)
+    backend.put_user(make_user(1))
+    backend.put_doc("counter", 0)
+    expect(backend.count_users() == 1, "запись до запуска процесса")
+    snapshot = backend.snapshot()
+
+    # Изменения другого процесса видны без переоткрытия
+    writer = run_process(name, directory, (
+        "backend.put_user(UserRecord(2, 'other@fakemail.test'))\n"
+        "backend.delete_user(1)\n"
+        "backend.set_item('langs', '2', 'en')"
+    ))
+    expect(writer.wait() == 0, "процесс записи завершился с ошибкой")
+    expect(backend.get_user(1) is None, "удаление другим процессом видно")
+    expect(backend.get_user(2).email == "other@fakemail.test", "запись другого процесса видна")
+    expect(backend.get_item("langs", "2") == "en", "словарь другого процесса виден")
+    expect(snapshot.user_ids() == [1], "срез не видит записи другого процесса")
+    with backend.snapshot() as current:
+        expect(current.version != snapshot.version and current.user_ids() == [2], "новый срез видит запись другого процесса")
+    snapshot.close()
+
+    # Чтение-изменение-запись из нескольких процессов сразу: ни одно изменение не теряется
+    increment = (
+        f"for _ in range({PROCESS_INCREMENTS}):\n"
+        f"    with backend.transaction():\n"
+        f"        backend.put_doc('counter', backend.get_doc('counter') + 1)"
+    )
+    workers = [run_process(name, directory, increment) for _ in range(2)]
+    for _ in range(PROCESS_INCREMENTS):
+        with backend.transaction():
+            backend.put_doc("counter", backend.get_doc("counter") + 1)
+    expect(all(worker.wait() == 0 for worker in workers), "процесс записи завершился с ошибкой")
+    expect(backend.get_doc("counter") == PROCESS_INCREMENTS * 3, f"потеряны изменения: {backend.get_doc('counter')}")
+    backend.close()
+
+
+@check
+def check_journal_compaction(name: str, directory: str):
+    if name != JournalBackend.name:
+        return
+    backend = create_backend(name, directory)
+    reader = create_backend(name, directory)
+    backend.put_users(make_user(user_id) for user_id in range(1, 11))
+    expect(reader.count_users() == 10, "чтение журнала вторым экземпляром")
+
+    backend.compact()
+    backend.put_user(make_user(11))
+    expect(os.path.getsize(backend.log_path) > 0, "журнал после свертки продолжается")
+    expect(reader.count_users() == 11 and reader.get_user(11) is not None, "чтение после свертки в другом экземпляре")
+
+    # Оборванная последняя строка (сбой во время записи) пропускается
+    with open(backend.log_path, "ab") as f:
+        f.write(b'{"u":12,"r":{"email":')
+    reopened = create_backend(name, directory)
+    expect(reopened.count_users() == 11, "недописанная операция журнала")
+    for instance in (backend, reader, reopened):
+        instance.close()
+
+
+@check
+def check_json_files(name: str, directory: str):
+    if name != "json":
+        return
+    # Файлы прежних версий: ключи пользователей - строки, данные бота - общий словарь
+    with open(os.path.join(directory, "user_storage.json"), "w", encoding="utf-8") as f:
+        json.dump({"42": {"email": "old@fakemail.test", "token": "t", "created_at": "2024-01-01T00:00:00"}}, f)
+    with open(os.path.join(directory, "bot_storage.json"), "w", encoding="utf-8") as f:
+        json.dump({"user_languages": {"42": "en"}, "banned_users": [7], "stats": {"total_users": 1}}, f)
+
+    backend = create_backend(name, directory, storage_format.FORMAT_COMPACT)
+    record = backend.get_user(42)
+    expect(record is not None and record.email == "old@fakemail.test" and record.created_at > 0, "старый файл пользователей")
+    expect(backend.get_item("user_languages", "42") == "en", "старый файл данных бота")
+    expect(backend.get_doc("banned_users") == [7], "документы в старом файле")
+
+    backend.set_item("user_languages", "42", "de")
+    with open(os.path.join(directory, "bot_storage.json"), "rb") as f:
+        expect(storage_format.detect(f.read()) == storage_format.FORMAT_COMPACT, "запись в формате бэкенда")
+
+    # Старая запись переводится в текущую версию формата при первой записи файла пользователей
+    backend.put_user(record)
+    with open(os.path.join(directory, "user_storage.json"), "rb") as f:
+        stored = storage_format.decode(f.read())
+    expect(stored.get("_format") == 2 and stored["42"] == {"email": "old@fakemail.test", "token": "t",
+                                                          "created_at": record.created_at}, "версия формата пользователей")
+    backend.close()
+
+
+def run_checks(name: str) -> Dict[str, str]:
+    """Все проверки бэкенда, каждая в своей папке: {проверка: "ok" или текст ошибки}"""
+    results = {}
+    for func in CHECKS:
+        directory = tempfile.mkdtemp(prefix=f"mailbot-{name}-")
+        try:
+            func(name, directory)
+            results[func.__name__] = "ok"
+        except Exception as e:
+            results[func.__name__] = f"{type(e).__name__}: {e}"
+            if not isinstance(e, AssertionError):
+                traceback.print_exc()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+# Бенчмарки
+
+def measure(func: Callable[[], Any], min_time: float, repeat: int) -> float:
+    """Медиана времени одного вызова (нс)"""
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    times = [timer.timeit(number) / number for _ in range(repeat)]
+    return statistics.median(times) * 1e9
+
+
+def run_benchmarks(name: str, size: int, min_time: float, repeat: int) -> Dict[str, float]:
+    """Замеры операций бэкенда на хранилище из size пользователей"""
+    directory = tempfile.mkdtemp(prefix=f"mailbot-{name}-bench-")
+    try:
+        backend = create_backend(name, directory)
+        users = [make_user(1_000_000 + i) for i in range(size)]
+        start = time.perf_counter()
+        backend.put_users(users)
+        results = {"fill": (time.perf_counter() - start) * 1e9}
+
+        middle = 1_000_000 + size // 2
+        record = backend.get_user(middle)
+        results["get_user"] = measure(lambda: backend.get_user(middle), min_time, repeat)
+        results["put_user"] = measure(lambda: backend.put_user(record), min_time, repeat)
+        results["set_item"] = measure(lambda: backend.set_item("user_languages", str(middle), "en"), min_time, repeat)
+        results["get_item"] = measure(lambda: backend.get_item("user_languages", str(middle), "ru"), min_time, repeat)
+        results["count_users"] = measure(backend.count_users, min_time, repeat)
+        results["scan_users"] = measure(lambda: sum(1 for _ in backend.iter_users()), min_time, repeat)
+
+        def snapshot_scan():
+            with backend.snapshot() as snapshot:
+                return sum(1 for _ in snapshot.iter_users())
+
+        def snapshot_after_write():
+            backend.put_user(record)
+            backend.snapshot().close()
+
+        # Изменение + новый срез (копирование при записи) и полный проход по срезу
+        results["put+snapshot"] = measure(snapshot_after_write, min_time, repeat)
+        results["scan_snapshot"] = measure(snapshot_scan, min_time, repeat)
+        backend.close()
+
+        if name not in DISKLESS:
+            def reopen():
+                instance = create_backend(name, directory)
+                instance.count_users()
+                instance.close()
+            results["reopen"] = measure(reopen, min_time, repeat)
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def format_ns(value: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("µs", 1e3)):
+        if value >= scale:
+            return f"{value / scale:.2f} {unit}"
+    return f"{value:.0f} ns"
+
+
+def print_table(size: int, results: Dict[str, Dict[str, float]]):
+    backends = list(results)
+    operations = list(dict.fromkeys(op for ops in results.values() for op in ops))
+    print(f"\n{size} пользователей")
+    print(f"{'операция':<14}" + "".join(f"{name:>14}" for name in backends))
+    for op in operations:
+        row = "".join(f"{format_ns(results[name][op]) if op in results[name] else '-':>14}" for name in backends)
+        print(f"{op:<14}{row}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверки и бенчмарки бэкендов хранилища")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Бэкенды через запятую")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Размеры хранилища через запятую")
+    parser.add_argument("--checks-only", action="store_true", help="Только проверки, без замеров")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Минимальная длительность одного замера (с)")
+    parser.add_argument("--repeat", type=int, default=5, help="Число повторов замера")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    names = [name for name in args.backends.split(",") if name]
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown:
+        parser.error(f"неизвестные бэкенды: {', '.join(unknown)}")
+
+    report: Dict[str, Any] = {"checks": {}, "benchmarks": {}}
+    failed = False
+    for name in names:
+        results = run_checks(name)
+        report["checks"][name] = results
+        errors = {check_name: result for check_name, result in results.items() if result != "ok"}
+        failed = failed or bool(errors)
+        print(f"{name}: {len(results) - len(errors)}/{len(results)} проверок")
+        for check_name, error in errors.items():
+            print(f"  {check_name}: {error}")
+
+    if not args.checks_only:
+        for size in (int(size) for size in args.sizes.split(",") if size):
+            results = {name: run_benchmarks(name, size, args.min_time, args.repeat) for name in names}
+            report["benchmarks"][str(size)] = results
+            print_table(size, results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,20 +8,47 @@ import asyncio
 import logging
 import signal
 import sys
+from typing import Optional
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramAPIError
 from aiogram.types import BotCommand
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 from config.settings import settings
-from routers import commands, language, admin
-from middlewares import ThrottlingMiddleware, LanguageMiddleware, BanMiddleware
+from routers import commands, language, admin, buttons
+from middlewares import (
+    ThrottlingMiddleware, LanguageMiddleware, BanMiddleware,
+    UserLockMiddleware, ConcurrencyMiddleware, MetricsMiddleware, TrafficRecorderMiddleware
+)
+from services.broadcast import broadcast_engine
+from services.backup import backup_service
+from services.expiry import expiry_scheduler
+from services.loop_monitor import loop_monitor
+from services.send_queue import send_queue
+from services.traffic import traffic_recorder, worker_path
+from services.workers import Supervisor, consume_updates
+from utils.fsm_storage import EngineFSMStorage
 from utils.logger import setup_logging
-from utils.translator import load_locales
+from utils.metrics import start_metrics_server
+from utils.translator import watch_locales
+
+
+# Адреса, на которых webhook сервер без секрета недоступен извне
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
 
 
 async def register_commands(bot: Bot):
-    """Регистрация команд бота"""
+    """Регистрация команд бота (ошибка Telegram не мешает запуску)"""
+    logger = logging.getLogger(__name__)
+    
+    # Локальный webhook без WEBHOOK_BASE_URL обычно запускается с фиктивным токеном
+    if settings.run_mode == "webhook" and not settings.webhook_base_url:
+        logger.info("WEBHOOK_BASE_URL не задан: регистрация команд пропущена")
+        return
+    
     commands_list = [
         BotCommand(command="start", description="🚀 Запустить бота"),
         BotCommand(command="help", description="📖 Показать справку"),
@@ -33,10 +60,15 @@ async def register_commands(bot: Bot):
         BotCommand(command="stats", description="📊 Статистика бота"),
         BotCommand(command="broadcast", description="📤 Рассылка сообщений"),
         BotCommand(command="ban", description="🚫 Заблокировать пользователя"),
+        BotCommand(command="profile", description="🔬 Профилирование бота"),
+        BotCommand(command="memory", description="🧠 Анализ памяти"),
     ]
     
-    await bot.set_my_commands(commands_list)
-    logger = logging.getLogger(__name__)
+    try:
+        await bot.set_my_commands(commands_list)
+    except TelegramAPIError as e:
+        logger.error(f"Не удалось зарегистрировать команды бота: {e}")
+        return
     logger.info("Команды бота зарегистрированы")
 
 
@@ -47,60 +79,303 @@ async def shutdown_handler(signal_received, frame):
     sys.exit(0)
 
 
-async def main():
-    """Главная функция запуска бота"""
-    # Настройка логирования
-    setup_logging()
-    
-    # Загрузка локалей
-    load_locales()
-    
-    logger = logging.getLogger(__name__)
-    logger.info("Запуск бота...")
-    
-    # Инициализация бота и диспетчера
+def create_bot() -> Bot:
+    """Создание экземпляра бота с общей очередью исходящих сообщений"""
     bot = Bot(
         token=settings.bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
-    # Регистрация команд
-    await register_commands(bot)
-    
-    dp = Dispatcher()
+    # Все исходящие запросы проходят через общую очередь с лимитами Telegram
+    bot.session.middleware(send_queue)
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    """Создание диспетчера с подключенными middlewares и роутерами"""
+    # Состояния FSM переживают перезапуск и не теряются при многопроцессном режиме
+    dp = Dispatcher(storage=EngineFSMStorage(
+        ttl=settings.fsm_state_ttl,
+        flush_interval=settings.fsm_flush_interval
+    ))
     
     # Подключение middlewares
+    # Запись трафика для воспроизведения - первой, чтобы учитывать ожидание в очередях
+    if settings.record_traffic_file:
+        dp.update.outer_middleware(TrafficRecorderMiddleware())
+    
+    # Обновления одного пользователя обрабатываются по очереди, повторные нажатия отбрасываются
+    dp.update.outer_middleware(UserLockMiddleware())
+    
+    # Ограничение числа одновременно обрабатываемых обновлений с очередью и приоритетом админов
+    dp.update.outer_middleware(ConcurrencyMiddleware(
+        limit=settings.max_concurrent_updates,
+        queue_size=settings.update_queue_size
+    ))
+    
     # Ban middleware - должен быть первым для блокировки пользователей
     dp.message.middleware(BanMiddleware())
     dp.callback_query.middleware(BanMiddleware())
     
-    # Throttling middleware для антиспама (2 секунды между сообщениями)
-    dp.message.middleware(ThrottlingMiddleware(rate_limit=2.0))
+    # Throttling middleware для антиспама (по умолчанию 2 секунды между сообщениями)
+    dp.message.middleware(ThrottlingMiddleware(rate_limit=settings.throttle_rate))
     
     # Language middleware для определения языка пользователя
     dp.message.middleware(LanguageMiddleware())
     dp.callback_query.middleware(LanguageMiddleware())
     
+    # Время выполнения обработчиков (последним, чтобы измерять только сам обработчик)
+    metrics_middleware = MetricsMiddleware()
+    dp.message.middleware(metrics_middleware)
+    dp.callback_query.middleware(metrics_middleware)
+    
     # Подключение роутеров (порядок важен!)
-    dp.include_router(admin.router)    # Админ роутер должен быть первым
+    dp.include_router(buttons.router)  # Кнопки reply-клавиатуры: один поиск по таблице до остальных фильтров
+    dp.include_router(admin.router)    # Админ роутер
     dp.include_router(language.router) # Роутер языка
     dp.include_router(commands.router) # Основные команды
     
+    return dp
+
+
+def check_webhook_settings() -> bool:
+    """Без WEBHOOK_SECRET webhook сервер нельзя открывать наружу: любой сможет слать обновления"""
+    if settings.run_mode != "webhook" or settings.webhook_secret:
+        return True
+    if settings.webhook_listen_host not in LOOPBACK_HOSTS:
+        logging.getLogger(__name__).error(
+            f"WEBHOOK_SECRET не задан, а WEBHOOK_HOST={settings.webhook_listen_host}: "
+            "задайте секрет или слушайте только 127.0.0.1"
+        )
+        return False
+    return True
+
+
+async def on_webhook_startup(bot: Bot, dispatcher: Dispatcher):
+    """Регистрация webhook в Telegram при запуске веб-сервера"""
+    logger = logging.getLogger(__name__)
+    
+    if not settings.webhook_base_url:
+        logger.warning("WEBHOOK_BASE_URL не задан: webhook не регистрируется, обновления принимаются только локально")
+        return
+    
+    webhook_url = f"{settings.webhook_base_url.rstrip('/')}{settings.webhook_path}"
+    await bot.set_webhook(
+        webhook_url,
+        secret_token=settings.webhook_secret or None,
+        allowed_updates=dispatcher.resolve_used_update_types()
+    )
+    logger.info(f"Webhook зарегистрирован: {webhook_url}")
+
+
+async def on_webhook_shutdown(bot: Bot):
+    """Удаление webhook при остановке веб-сервера"""
+    if not settings.webhook_base_url:
+        return
+    
+    await bot.delete_webhook()
+    logging.getLogger(__name__).info("Webhook удален")
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Запуск бота в режиме webhook на встроенном aiohttp сервере"""
+    logger = logging.getLogger(__name__)
+    
+    if not settings.webhook_secret:
+        logger.warning("WEBHOOK_SECRET не задан: заголовок X-Telegram-Bot-Api-Secret-Token не проверяется, сервер доступен только локально")
+    
+    dp.startup.register(on_webhook_startup)
+    dp.shutdown.register(on_webhook_shutdown)
+    
+    app = web.Application()
+    # handle_in_background: Telegram сразу получает ответ, обработка идет в отдельной задаче
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings.webhook_secret or None,
+        handle_in_background=True
+    ).register(app, path=settings.webhook_path)
+    setup_application(app, dp, bot=bot)
+    
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.webhook_listen_host, port=settings.webhook_port)
+    await site.start()
+    logger.info(f"Webhook сервер слушает {settings.webhook_listen_host}:{settings.webhook_port}{settings.webhook_path}")
+    
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def start_locales_watcher() -> Optional[asyncio.Task]:
+    """Запуск фоновой перезагрузки локалей при изменении файлов"""
+    if settings.locales_reload_interval <= 0:
+        return None
+    return asyncio.create_task(watch_locales(settings.locales_reload_interval))
+
+
+async def run_worker(index: int, queue, shared_limit):
+    """Процесс-воркер: обрабатывает обновления своего шарда пользователей"""
+    setup_logging(f"bot-worker{index}.log")
+    logger = logging.getLogger(__name__)
+    
+    # Глобальный лимит исходящих сообщений общий для всех воркеров
+    send_queue.bucket.attach(shared_limit)
+    bot = create_bot()
+    dp = create_dispatcher()
+    locales_watcher = start_locales_watcher()
+    loop_monitor.start()
+    metrics_port = settings.metrics_port + 1 + index if settings.metrics_port > 0 else 0
+    metrics_runner = await start_metrics_server(settings.metrics_host, metrics_port)
+    if settings.record_traffic_file:
+        traffic_recorder.start(worker_path(settings.record_traffic_file, index))
+    
+    # Незавершенные рассылки продолжает только первый воркер
+    if index == 0:
+        await broadcast_engine.resume(bot)
+    
+    # Истекшие ящики своего шарда пользователей
+    expiry_scheduler.start(index, settings.workers)
+    
+    # Хранилище общее для всех воркеров: резервные копии делает только первый
+    if index == 0:
+        backup_service.start()
+    
+    logger.info(f"Воркер {index} готов к обработке обновлений")
+    try:
+        await consume_updates(queue, lambda update: dp.feed_raw_update(bot, update))
+    finally:
+        if locales_watcher:
+            locales_watcher.cancel()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await loop_monitor.stop()
+        await broadcast_engine.shutdown()
+        await expiry_scheduler.stop()
+        await backup_service.stop()
+        await asyncio.to_thread(traffic_recorder.stop)
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+        logger.info(f"Воркер {index} остановлен")
+
+
+def worker_main(index: int, queue, shared_limit):
+    """Точка входа процесса-воркера"""
+    try:
+        asyncio.run(run_worker(index, queue, shared_limit))
+    except KeyboardInterrupt:
+        pass
+
+
+async def run_supervisor():
+    """Многопроцессный режим: приемник обновлений и N воркеров с шардированием по user_id"""
+    logger = logging.getLogger(__name__)
+    
+    bot = create_bot()
+    await register_commands(bot)
+    dp = create_dispatcher()
+    
+    supervisor = Supervisor(settings.workers, worker_main)
+    supervisor.worker_args = (send_queue.bucket.share(supervisor.context),)
+    supervisor.start()
+    
+    exit_code = 0
+    try:
+        if settings.run_mode == "webhook":
+            await on_webhook_startup(bot, dp)
+            await supervisor.serve(supervisor.receive_webhook())
+        else:
+            await supervisor.serve(supervisor.receive_polling(dp.resolve_used_update_types()))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("Остановка приемника обновлений")
+    except RuntimeError as e:
+        # Менеджер процессов перезапустит бот целиком
+        logger.error(f"Остановка приемника обновлений: {e}")
+        exit_code = 1
+    finally:
+        if settings.run_mode == "webhook":
+            await on_webhook_shutdown(bot)
+        await asyncio.to_thread(supervisor.stop)
+        await bot.session.close()
+        logger.info("Бот остановлен")
+    
+    if exit_code:
+        sys.exit(exit_code)
+
+
+async def main():
+    """Главная функция запуска бота"""
+    # Настройка логирования
+    setup_logging()
+    
+    logger = logging.getLogger(__name__)
+    logger.info("Запуск бота...")
+    
+    if not check_webhook_settings():
+        return
+    
+    # Многопроцессный режим: этот процесс только принимает и распределяет обновления
+    if settings.workers > 1:
+        await run_supervisor()
+        return
+    
+    # Инициализация бота и диспетчера
+    bot = create_bot()
+    
+    # Регистрация команд
+    await register_commands(bot)
+    
+    dp = create_dispatcher()
+    
     logger.info("Бот успешно инициализирован")
     
     # Настройка обработчика для корректного завершения
     for sig in [signal.SIGTERM, signal.SIGINT]:
         signal.signal(sig, lambda s, f: asyncio.create_task(shutdown_handler(s, f)))
     
+    # Продолжаем рассылки, прерванные предыдущим перезапуском
+    await broadcast_engine.resume(bot)
+    
+    # Удаление ящиков по сроку жизни (MAIL_TTL_HOURS) локально и в Mail.gw
+    expiry_scheduler.start()
+    
+    # Резервные копии хранилища в storage/backups (BACKUP_INTERVAL_HOURS)
+    backup_service.start()
+    
+    # Локали загружаются при импорте translator; дальше файлы отслеживаются на изменения
+    locales_watcher = start_locales_watcher()
+    
+    metrics_runner = await start_metrics_server(settings.metrics_host, settings.metrics_port)
+    
+    # Задержки event loop и блокирующие вызовы (стек пишется в лог)
+    loop_monitor.start()
+    
+    # Запись трафика (RECORD_TRAFFIC_FILE) для воспроизведения через tools/replay.py
+    traffic_recorder.start(settings.record_traffic_file)
+    
     # Запуск бота
     try:
         logger.info("Бот запущен и готов к работе! Нажмите Ctrl+C для остановки.")
-        await dp.start_polling(bot)
+        if settings.run_mode == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            await dp.start_polling(bot)
     except KeyboardInterrupt:
         logger.info("Получен сигнал KeyboardInterrupt (Ctrl+C)")
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
     finally:
+        if locales_watcher:
+            locales_watcher.cancel()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await loop_monitor.stop()
+        await broadcast_engine.shutdown()
+        await expiry_scheduler.stop()
+        await backup_service.stop()
+        await asyncio.to_thread(traffic_recorder.stop)
         logger.info("Закрытие сессии бота...")
         await bot.session.close()
         logger.info("Бот остановлен")
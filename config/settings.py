@@ -1,17 +1,102 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Literal
 
 
 class Settings(BaseSettings):
     bot_token: str = ""
     admin_ids: str = "123456789,987654321"
     base_url: str = "https://api.mail.gw"
-    
+
+    # Рассылка: число воркеров и период обновления прогресса (скорость ограничивает outbound_rate)
+    broadcast_workers: int = 8
+    broadcast_progress_interval: float = 5.0
+
+    # Очередь исходящих сообщений: глобальный лимит в секунду (на всех воркеров вместе) и per-chat лимиты
+    outbound_rate: float = 30.0
+    outbound_chat_interval: float = 1.0
+    outbound_chat_burst: int = 3
+    outbound_group_interval: float = 3.0
+
+    # Режим запуска: "polling" или "webhook" (встроенный aiohttp сервер).
+    # Пустой webhook_host - 0.0.0.0 при заданном webhook_secret, иначе только 127.0.0.1
+    run_mode: Literal["polling", "webhook"] = "polling"
+    webhook_base_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""
+    webhook_host: str = ""
+    webhook_port: int = 8080
+
+    # Количество процессов-воркеров (больше 1 - многопроцессный режим с шардированием по пользователю)
+    workers: int = 1
+
+    # Папка с файлами хранилища пользователей и статистики бота
+    storage_dir: str = "storage"
+    # Формат файлов хранилища: "json" (читаемый) или "compact" (минифицированный JSON + zlib).
+    # Чтение определяет формат автоматически; существующие файлы переводятся tools/convert_storage.py
+    storage_format: Literal["json", "compact"] = "json"
+    # Бэкенд хранилища: "json" (файлы прежних версий), "journal" (журнал изменений + снимок),
+    # "sqlite" или "memory" (без диска). Данные переносятся tools/convert_storage.py --migrate-to
+    storage_backend: Literal["json", "journal", "sqlite", "memory"] = "json"
+    # Резервные копии хранилища (сжатый JSONL в storage_dir/backups): период в часах
+    # (0 - выключены) и сколько последних копий хранить
+    backup_interval_hours: float = 24.0
+    backup_keep: int = 7
+
+    # Срок жизни почтового ящика (часы, 0 - без удаления) и число одновременных удалений в Mail.gw
+    mail_ttl_hours: float = 168.0
+    expiry_concurrency: int = 5
+
+    # Антиспам: минимальный интервал между сообщениями пользователя (секунды, 0 - выключен)
+    throttle_rate: float = 2.0
+
+    # Персистентное FSM-хранилище (в хранилище бота): TTL брошенных состояний и задержка записи
+    fsm_state_ttl: float = 1800.0
+    fsm_flush_interval: float = 1.0
+
+    # Ограничение параллельной обработки обновлений: слоты и размер очереди ожидания
+    max_concurrent_updates: int = 50
+    update_queue_size: int = 200
+
+    # Период проверки файлов локалей на изменения (0 - без перезагрузки на лету)
+    locales_reload_interval: float = 2.0
+
+    # HTTP-эндпоинт /metrics (0 - отключен, включается явно, например 9100). Воркеры слушают metrics_port + 1 + номер воркера
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 0
+
+    # Логирование: уровень, ротация logs/bot.log ("size" - по размеру, "time" - по времени)
+    log_level: str = "INFO"
+    log_rotation: str = "size"
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_rotation_when: str = "midnight"
+    log_backup_count: int = 5
+    # Доля ответов Mail.gw, которые целиком пишутся в лог (только при LOG_LEVEL=DEBUG)
+    log_payload_sample_rate: float = 0.01
+
+    # Мониторинг event loop: период измерения задержки (0 - выключен), порог блокировки
+    # со снятием стека, порог медленного шага asyncio и период записи перцентилей в лог
+    loop_monitor_interval: float = 0.1
+    loop_stall_threshold_ms: float = 500.0
+    loop_slow_callback_ms: float = 100.0
+    loop_lag_report_interval: float = 60.0
+    # Режим отладки asyncio: логирует каждый медленный шаг с именем задачи (дорого для продакшена)
+    loop_debug: bool = False
+
+    # Запись входящих обновлений и ответов Mail.gw в сжатый файл для tools/replay.py (пусто - выключена)
+    record_traffic_file: str = ""
+
     @property
     def admin_ids_list(self) -> List[int]:
         """Преобразует строку admin_ids в список целых чисел"""
         return [int(id.strip()) for id in self.admin_ids.split(',') if id.strip()]
 
+    @property
+    def webhook_listen_host(self) -> str:
+        """Адрес webhook сервера: без секрета по умолчанию слушаем только локальный интерфейс"""
+        if self.webhook_host:
+            return self.webhook_host
+        return "0.0.0.0" if self.webhook_secret else "127.0.0.1"
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
@@ -1,5 +1,6 @@
 # Filters package
 from .admin_filter import is_admin, AdminFilter
 from .has_mail_filter import has_mail, no_mail, HasMailFilter
+from .button_filter import is_button, ButtonFilter
 
-__all__ = ['is_admin', 'AdminFilter', 'has_mail', 'no_mail', 'HasMailFilter']
+__all__ = ['is_admin', 'AdminFilter', 'has_mail', 'no_mail', 'HasMailFilter', 'is_button', 'ButtonFilter']
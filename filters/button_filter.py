@@ -0,0 +1,64 @@
+"""
+Фильтр для кнопок reply-клавиатуры: текст кнопки на любом языке -> действие
+"""
+
+import logging
+from aiogram.filters import BaseFilter
+from aiogram.types import Message
+from typing import Dict, Union
+
+from config.settings import settings
+from utils.translator import LOCALES, on_locales_reload
+
+logger = logging.getLogger(__name__)
+
+# Кнопки, доступные только администраторам
+ADMIN_ACTIONS = frozenset({"btn_admin_stats", "btn_admin_broadcast", "btn_admin_ban", "btn_admin_back"})
+
+# Таблица: текст кнопки (на всех языках) -> ключ кнопки в локалях
+BUTTON_ACTIONS: Dict[str, str] = {}
+
+
+def build_button_table():
+    """Построение таблицы кнопок из ключей btn_* всех локалей"""
+    table = {}
+    for lang_code, locale_dict in LOCALES.items():
+        for key, text in locale_dict.items():
+            if not key.startswith("btn_"):
+                continue
+            if table.get(text, key) != key:
+                logger.warning(f"Текст кнопки '{text}' ({lang_code}) уже занят кнопкой {table[text]}")
+                continue
+            table[text] = key
+
+    BUTTON_ACTIONS.clear()
+    BUTTON_ACTIONS.update(table)
+
+
+class ButtonFilter(BaseFilter):
+    """Фильтр для нажатий кнопок reply-клавиатуры: один поиск в словаре вместо цепочки фильтров"""
+
+    async def __call__(self, message: Message) -> Union[bool, Dict[str, str]]:
+        """
+        Проверяет, является ли текст сообщения кнопкой
+
+        :param message: Объект сообщения
+        :return: {"button_action": ключ кнопки} или False
+        """
+        action = BUTTON_ACTIONS.get(message.text) if message.text else None
+        if action is None:
+            return False
+
+        # Админские кнопки от обычного пользователя обрабатываются как обычный текст
+        if action in ADMIN_ACTIONS and (not message.from_user or message.from_user.id not in settings.admin_ids_list):
+            return False
+
+        return {"button_action": action}
+
+
+build_button_table()
+# Тексты кнопок могут измениться при перезагрузке локалей
+on_locales_reload(build_button_table)
+
+# Создаем экземпляр фильтра
+is_button = ButtonFilter()
@@ -32,7 +32,7 @@ class HasMailFilter(BaseFilter):
         user_data = get_user(user_id)
         
         # Проверяем наличие активной почты
-        has_active_mail = bool(user_data and user_data.get('email') and user_data.get('token'))
+        has_active_mail = bool(user_data and user_data.has_mail)
         
         # Возвращаем результат в зависимости от требуемого условия
         return has_active_mail if self.has_mail else not has_active_mail
@@ -3,9 +3,11 @@
 """
 
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from keyboards.registry import cached_keyboard
 from utils.translator import t
 
 
+@cached_keyboard()
 def get_main_keyboard(lang: str = "ru") -> ReplyKeyboardMarkup:
     """Основная reply-клавиатура с кнопками управления"""
     keyboard = [[
@@ -21,14 +23,15 @@ def get_main_keyboard(lang: str = "ru") -> ReplyKeyboardMarkup:
     )
 
 
+@cached_keyboard()
 def get_admin_keyboard(lang: str = "ru") -> ReplyKeyboardMarkup:
     """Админская reply-клавиатура"""
     keyboard = [[
-        KeyboardButton(text="📊 Статистика"),
-        KeyboardButton(text="📤 Рассылка")
+        KeyboardButton(text=t("btn_admin_stats", lang)),
+        KeyboardButton(text=t("btn_admin_broadcast", lang))
     ], [
-        KeyboardButton(text="🚫 Забанить пользователя"),
-        KeyboardButton(text="🔙 Назад")
+        KeyboardButton(text=t("btn_admin_ban", lang)),
+        KeyboardButton(text=t("btn_admin_back", lang))
     ]]
     return ReplyKeyboardMarkup(
         keyboard=keyboard, 
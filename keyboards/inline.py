@@ -4,41 +4,52 @@ Inline клавиатуры для бота
 
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from typing import List, Dict
+from keyboards.registry import cached_keyboard
 from utils.translator import t, get_available_languages
 
 
+@cached_keyboard(maxsize=4096)
+def _message_button(message_id: str, subject: str) -> InlineKeyboardButton:
+    """Кнопка письма в списке (переиспользуется между обновлениями списка)"""
+    # Ограничиваем длину текста на кнопке
+    button_text = f"📧 {subject[:30]}..." if len(subject) > 30 else f"📧 {subject}"
+    
+    return InlineKeyboardButton(
+        text=button_text,
+        callback_data=f"view_message:{message_id}"
+    )
+
+
+@cached_keyboard()
+def _refresh_button(lang: str) -> InlineKeyboardButton:
+    """Кнопка обновления списка писем"""
+    return InlineKeyboardButton(
+        text=t("refresh", lang),
+        callback_data="refresh_inbox"
+    )
+
+
 def get_messages_keyboard(messages: List[Dict], lang: str = "ru") -> InlineKeyboardMarkup:
     """Клавиатура для списка писем"""
-    keyboard = []
-    
-    for message in messages:
-        message_id = message.get("id", "")
-        subject = message.get("subject", "Без темы")
-        sender = message.get("from", {}).get("address", "Неизвестный отправитель")
-        
-        # Ограничиваем длину текста на кнопке
-        button_text = f"📧 {subject[:30]}..." if len(subject) > 30 else f"📧 {subject}"
-        
-        keyboard.append([
-            InlineKeyboardButton(
-                text=button_text,
-                callback_data=f"view_message:{message_id}"
-            )
-        ])
+    keyboard = [
+        [_message_button(message.get("id", ""), message.get("subject") or "Без темы")]
+        for message in messages
+    ]
     
     # Кнопка обновления списка
-    keyboard.append([
-        InlineKeyboardButton(
-            text=t("refresh", lang),
-            callback_data="refresh_inbox"
-        )
-    ])
+    keyboard.append([_refresh_button(lang)])
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
 def get_message_actions_keyboard(message_id: str, lang: str = "ru") -> InlineKeyboardMarkup:
     """Клавиатура для действий с сообщением"""
+    return _get_message_actions_keyboard(lang)
+
+
+@cached_keyboard()
+def _get_message_actions_keyboard(lang: str) -> InlineKeyboardMarkup:
+    """Клавиатура действий с письмом не зависит от письма и кэшируется по языку"""
     keyboard = [
         [
             InlineKeyboardButton(
@@ -51,6 +62,7 @@ def get_message_actions_keyboard(message_id: str, lang: str = "ru") -> InlineKey
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@cached_keyboard()
 def get_email_management_keyboard(lang: str = "ru") -> InlineKeyboardMarkup:
     """Клавиатура для управления почтой"""
     keyboard = [
@@ -77,6 +89,7 @@ def get_email_management_keyboard(lang: str = "ru") -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@cached_keyboard()
 def get_language_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для выбора языка"""
     available_languages = get_available_languages()
@@ -91,3 +104,29 @@ def get_language_keyboard() -> InlineKeyboardMarkup:
         ])
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+@cached_keyboard()
+def get_confirm_replacement_keyboard(lang: str = "ru") -> InlineKeyboardMarkup:
+    """Клавиатура подтверждения замены почты"""
+    keyboard = [
+        [
+            InlineKeyboardButton(text=t("confirm_yes", lang), callback_data="confirm_new_email"),
+            InlineKeyboardButton(text=t("confirm_no", lang), callback_data="cancel_new_email")
+        ]
+    ]
+    
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+@cached_keyboard()
+def get_confirm_delete_keyboard(lang: str = "ru") -> InlineKeyboardMarkup:
+    """Клавиатура подтверждения удаления почты"""
+    keyboard = [
+        [
+            InlineKeyboardButton(text=t("delete_yes", lang), callback_data="confirm_delete_email"),
+            InlineKeyboardButton(text=t("delete_no", lang), callback_data="cancel_delete_email")
+        ]
+    ]
+    
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -0,0 +1,53 @@
+"""
+Реестр кэшированных клавиатур: каждая статическая клавиатура строится один раз на язык
+"""
+
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from utils.metrics import metrics
+from utils.translator import on_locales_reload
+
+_cached_builders: List[Callable] = []
+
+
+def cached_keyboard(maxsize: Optional[int] = None):
+    """Декоратор: мемоизация конструктора клавиатуры со сбросом при перезагрузке локалей"""
+    def decorator(func: Callable) -> Callable:
+        cached = lru_cache(maxsize=maxsize)(func)
+        _cached_builders.append(cached)
+        return cached
+    return decorator
+
+
+def clear_keyboard_cache():
+    """Сбросить все закэшированные клавиатуры"""
+    for builder in _cached_builders:
+        builder.cache_clear()
+
+
+def keyboard_cache_info() -> Dict[str, Dict[str, int]]:
+    """Статистика кэша клавиатур: попадания, промахи и размер"""
+    info = {}
+    for builder in _cached_builders:
+        stats = builder.cache_info()
+        info[builder.__name__] = {"hits": stats.hits, "misses": stats.misses, "size": stats.currsize}
+    return info
+
+
+def _cache_counters() -> Dict[tuple, int]:
+    """Попадания и промахи кэша клавиатур для метрик"""
+    counters = {}
+    for name, stats in keyboard_cache_info().items():
+        counters[(name, "hit")] = stats["hits"]
+        counters[(name, "miss")] = stats["misses"]
+    return counters
+
+
+metrics.callback(
+    "keyboard_cache_requests_total", "Обращения к кэшу клавиатур",
+    _cache_counters, ("keyboard", "result"), type_name="counter"
+)
+
+# Тексты кнопок берутся из локалей, поэтому после их перезагрузки клавиатуры строятся заново
+on_locales_reload(clear_keyboard_cache)
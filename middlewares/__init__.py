@@ -5,5 +5,13 @@ Middlewares для бота
 from .throttling import ThrottlingMiddleware
 from .language import LanguageMiddleware
 from .ban import BanMiddleware
+from .user_lock import UserLockMiddleware
+from .concurrency import ConcurrencyMiddleware
+from .metrics import MetricsMiddleware
+from .recorder import TrafficRecorderMiddleware
 
-__all__ = ['ThrottlingMiddleware', 'LanguageMiddleware', 'BanMiddleware']
+__all__ = [
+    'ThrottlingMiddleware', 'LanguageMiddleware', 'BanMiddleware',
+    'UserLockMiddleware', 'ConcurrencyMiddleware', 'MetricsMiddleware',
+    'TrafficRecorderMiddleware'
+]
@@ -6,7 +6,7 @@ from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
 
-from utils.storage_utils import load_bot_data
+from utils.storage_utils import is_user_banned
 
 
 class BanMiddleware(BaseMiddleware):
@@ -31,10 +31,7 @@ class BanMiddleware(BaseMiddleware):
             return await handler(event, data)
         
         # Проверяем, заблокирован ли пользователь
-        bot_data = load_bot_data()
-        banned_users = bot_data.get('banned', [])
-        
-        if user_id in banned_users:
+        if is_user_banned(user_id):
             # Пользователь заблокирован, не обрабатываем его сообщения
             if isinstance(event, Message):
                 await event.answer("🚫 Вы заблокированы и не можете использовать этого бота.")
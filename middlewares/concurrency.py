@@ -0,0 +1,128 @@
+"""
+Middleware для ограничения числа одновременно обрабатываемых обновлений
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+
+from config.settings import settings
+from utils.metrics import metrics
+from utils.storage_utils import get_user_language
+from utils.translator import t
+
+logger = logging.getLogger(__name__)
+
+# Дешевые команды обрабатываются вне общей очереди
+FAST_LANE_COMMANDS = ("/start", "/help", "/language")
+FAST_LANE_CALLBACKS = ("set_language:",)
+
+PRIORITY_ADMIN = 0
+PRIORITY_DEFAULT = 1
+
+
+class ConcurrencyMiddleware(BaseMiddleware):
+    """
+    Ограничивает число обновлений в обработке. Лишние ждут в ограниченной очереди
+    (админы - первыми), при переполнении очереди пользователь получает ответ "занято"
+    """
+
+    def __init__(self, limit: int, queue_size: int):
+        """
+        :param limit: Максимум одновременно обрабатываемых обновлений
+        :param queue_size: Максимум обновлений, ожидающих обработки
+        """
+        self.limit = limit
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self.counter = itertools.count()
+        self.shed = 0
+        metrics.callback(
+            "bot_updates", "Обновления в обработке и в очереди",
+            lambda: {("in_flight",): self.in_flight, ("queued",): len(self.waiters)}, ("state",)
+        )
+        metrics.callback(
+            "bot_updates_shed_total", "Обновления, отклоненные из-за переполнения очереди",
+            lambda: self.shed, type_name="counter"
+        )
+
+    @staticmethod
+    def _is_fast_lane(event: Update) -> bool:
+        """Проверка, относится ли обновление к дешевым командам"""
+        if event.message and event.message.text:
+            command = event.message.text.split(maxsplit=1)[0].split("@", 1)[0]
+            return command in FAST_LANE_COMMANDS
+        if event.callback_query and event.callback_query.data:
+            return event.callback_query.data.startswith(FAST_LANE_CALLBACKS)
+        return False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Основная логика middleware"""
+        if not isinstance(event, Update) or self._is_fast_lane(event):
+            return await handler(event, data)
+
+        user: Optional[User] = data.get("event_from_user")
+        priority = PRIORITY_ADMIN if user and user.id in settings.admin_ids_list else PRIORITY_DEFAULT
+
+        if not await self._acquire(priority):
+            self.shed += 1
+            await self._reply_busy(event, user)
+            return
+
+        try:
+            return await handler(event, data)
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int) -> bool:
+        """Занять слот обработки; False - очередь переполнена"""
+        if self.in_flight < self.limit and not self.waiters:
+            self.in_flight += 1
+            return True
+
+        if len(self.waiters) >= self.queue_size and priority != PRIORITY_ADMIN:
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Слот мог быть уже передан этому ожиданию - возвращаем его
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        return True
+
+    def _release(self):
+        """Освободить слот и передать его следующему ожидающему"""
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def _reply_busy(self, event: Update, user: Optional[User]):
+        """Ответить пользователю, что бот перегружен"""
+        lang = get_user_language(user.id) if user else "ru"
+        logger.warning(f"Очередь обработки переполнена, обновление {event.update_id} отклонено")
+
+        if event.message:
+            await event.message.answer(t("busy", lang))
+        elif event.callback_query:
+            await event.callback_query.answer(t("busy", lang), show_alert=True)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Текущее состояние: обновления в обработке, в очереди и отклоненные"""
+        return {"in_flight": self.in_flight, "queued": len(self.waiters), "shed": self.shed}
@@ -0,0 +1,57 @@
+"""
+Middleware для сбора времени выполнения обработчиков
+"""
+
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from utils.metrics import metrics
+
+HANDLER_LATENCY = metrics.histogram(
+    "bot_handler_duration_seconds", "Время выполнения обработчика", ("handler",)
+)
+HANDLER_ERRORS = metrics.counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("handler",)
+)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware: измеряет время выполнения найденного обработчика.
+    Регистрируется последним, чтобы не учитывать время остальных middlewares
+    """
+
+    def __init__(self):
+        self.names: Dict[Callable, str] = {}
+
+    def _handler_name(self, data: Dict[str, Any]) -> str:
+        """Имя обработчика для метки: модуль и имя функции"""
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        name = self.names.get(callback)
+        if name is None:
+            name = f"{getattr(callback, '__module__', '')}.{getattr(callback, '__qualname__', 'unknown')}"
+            self.names[callback] = name
+
+        # Кнопки reply-клавиатуры обрабатываются одним обработчиком - различаем по действию
+        button_action = data.get("button_action")
+        return f"{name}:{button_action}" if button_action else name
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Основная логика middleware"""
+        name = self._handler_name(data)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - start)
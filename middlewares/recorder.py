@@ -0,0 +1,44 @@
+"""
+Middleware для записи входящих обновлений (включается настройкой RECORD_TRAFFIC_FILE)
+"""
+
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+
+from services.traffic import traffic_recorder
+from utils.storage_utils import get_user, get_user_language
+
+
+class TrafficRecorderMiddleware(BaseMiddleware):
+    """
+    Записывает каждое обновление со временем поступления и полной длительностью обработки.
+    При первом появлении пользователя в записи сохраняется, есть ли у него почта и какой язык
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Основная логика middleware"""
+        if not traffic_recorder.enabled or not isinstance(event, Update):
+            return await handler(event, data)
+
+        user: Optional[User] = data.get("event_from_user")
+        user_state = None
+        if user and user.id not in traffic_recorder.seen_users:
+            user_data = get_user(user.id)
+            user_state = {"mail": bool(user_data and user_data.email), "lang": get_user_language(user.id)}
+
+        arrived = traffic_recorder.offset()
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            traffic_recorder.record_update(
+                event.model_dump(mode="json", exclude_none=True, by_alias=True), arrived, time.perf_counter() - start,
+                user.id if user else None, user_state
+            )
@@ -8,9 +8,13 @@ from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Update, Message
 
+from utils.memory import memory_inspector
+from utils.metrics import metrics
 from utils.translator import t
 from utils.storage_utils import get_user
 
+THROTTLE_REJECTIONS = metrics.counter("bot_throttle_rejections_total", "Сообщения, отклоненные антиспамом")
+
 
 class ThrottlingMiddleware(BaseMiddleware):
     """Middleware для ограничения частоты использования команд"""
@@ -21,6 +25,7 @@ class ThrottlingMiddleware(BaseMiddleware):
         """
         self.rate_limit = rate_limit
         self.user_timings: Dict[int, float] = {}
+        memory_inspector.register("throttling_user_timings", lambda: self.user_timings)
         
     async def __call__(
         self,
@@ -47,13 +52,14 @@ class ThrottlingMiddleware(BaseMiddleware):
             if time_passed < self.rate_limit:
                 # Пользователь отправляет сообщения слишком часто
                 remaining_time = self.rate_limit - time_passed
+                THROTTLE_REJECTIONS.inc()
                 
                 # Получаем язык пользователя
                 lang = "ru"  # По умолчанию
                 if user_id:
                     user_data = get_user(user_id)
-                    if user_data and user_data.get('lang'):
-                        lang = user_data['lang']
+                    if user_data and user_data.lang:
+                        lang = user_data.lang
                 
                 await event.answer(
                     t("throttling_message", lang, remaining_time=remaining_time)
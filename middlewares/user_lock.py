@@ -0,0 +1,75 @@
+"""
+Middleware для последовательной обработки обновлений одного пользователя
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+
+from utils.memory import memory_inspector
+
+logger = logging.getLogger(__name__)
+
+
+class UserLockMiddleware(BaseMiddleware):
+    """
+    Обновления одного пользователя выполняются по очереди, разные пользователи - параллельно.
+    Повтор того же действия (тот же текст или callback data), пока первое еще выполняется, отбрасывается
+    """
+
+    def __init__(self):
+        self.locks: Dict[int, Tuple[asyncio.Lock, int]] = {}
+        self.in_flight: Set[Tuple[int, str]] = set()
+        memory_inspector.register("user_locks", lambda: self.locks)
+        memory_inspector.register("user_operations_in_flight", lambda: self.in_flight)
+
+    @staticmethod
+    def _operation_key(event: Update) -> Optional[str]:
+        """Ключ операции для поиска дубликатов"""
+        if event.message and event.message.text:
+            return f"message:{event.message.text}"
+        if event.callback_query and event.callback_query.data:
+            return f"callback:{event.callback_query.data}"
+        return None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Основная логика middleware"""
+        user: Optional[User] = data.get("event_from_user")
+        if not user or not isinstance(event, Update):
+            return await handler(event, data)
+
+        user_id = user.id
+        operation = self._operation_key(event)
+
+        if operation is not None:
+            if (user_id, operation) in self.in_flight:
+                logger.info(f"Пользователь {user_id}: повтор операции {operation} отброшен")
+                if event.callback_query:
+                    await event.callback_query.answer()
+                return
+            self.in_flight.add((user_id, operation))
+
+        lock, waiters = self.locks.get(user_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self.locks[user_id] = (lock, waiters + 1)
+
+        try:
+            async with lock:
+                return await handler(event, data)
+        finally:
+            lock, waiters = self.locks[user_id]
+            if waiters <= 1:
+                del self.locks[user_id]
+            else:
+                self.locks[user_id] = (lock, waiters - 1)
+
+            if operation is not None:
+                self.in_flight.discard((user_id, operation))
@@ -5,5 +5,6 @@
 from . import commands
 from . import language
 from . import admin
+from . import buttons
 
-__all__ = ['commands', 'language', 'admin']
+__all__ = ['commands', 'language', 'admin', 'buttons']
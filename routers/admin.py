@@ -2,24 +2,41 @@
 Роутер для администраторских команд
 """
 
+import asyncio
+import html
 import logging
 from datetime import datetime
-from aiogram import Router, F
+from typing import List
+from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
 from filters import is_admin
 from keyboards.builders import get_admin_keyboard
+from services.broadcast import broadcast_engine
+from services.loop_monitor import loop_monitor
+from services.profiler import profiler
+from services.send_queue import send_queue
 from utils.storage_utils import (
-    get_bot_stats, update_bot_stats, add_banned_user, 
-    get_banned_users, add_broadcast_record, get_all_users
+    get_bot_stats, get_stats_trend, add_banned_user, get_banned_users, count_users
 )
+from utils.memory import memory_inspector, process_rss
 from utils.translator import t
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values: List[int]) -> str:
+    """Мини-график из символов для почасовой статистики"""
+    peak = max(values, default=0)
+    if not peak:
+        return SPARK_CHARS[0] * len(values)
+    return "".join(SPARK_CHARS[value * (len(SPARK_CHARS) - 1) // peak] for value in values)
+
 
 @router.message(Command("admin"), is_admin)
 async def cmd_admin(message: Message, lang: str = "ru"):
@@ -40,23 +57,28 @@ async def cmd_stats(message: Message, lang: str = "ru"):
     logger.info(f"Администратор {user_id} запросил статистику")
     
     try:
-        # Получаем статистику из bot_storage
+        # Счетчики поддерживаются при каждом изменении хранилища
         stats = get_bot_stats()
+        trend = get_stats_trend(stats)
+        new_users = [bucket.get('total_users', 0) for bucket in trend]
+        new_emails = [bucket.get('created_emails', 0) for bucket in trend]
         
-        # Подсчитываем активные сессии (пользователи с email)
-        all_users = get_all_users()
-        active_sessions = sum(1 for user_data in all_users.values() if user_data.get('email'))
-        
-        # Обновляем статистику
-        stats['total_users'] = len(all_users)
-        update_bot_stats(stats)
+        queue_stats = send_queue.snapshot()
+        loop_stats = loop_monitor.snapshot()
         
         stats_text = f"""📊 <b>Статистика бота</b>
 
 👥 <b>Общее число пользователей:</b> {stats.get('total_users', 0)}
 📧 <b>Создано email адресов:</b> {stats.get('created_emails', 0)}
-🟢 <b>Активные сессии:</b> {active_sessions}
-🚫 <b>Заблокированные пользователи:</b> {len(get_banned_users())}
+🟢 <b>Активные сессии:</b> {stats.get('active_sessions', 0)}
+🚫 <b>Заблокированные пользователи:</b> {stats.get('banned_users', 0)}
+📤 <b>Рассылок:</b> {stats.get('total_broadcasts', 0)}
+📮 <b>Очередь отправки:</b> {queue_stats['queue_depth']} (p95 ожидания {queue_stats['wait_p95_ms']:.0f} мс)
+⏱ <b>Задержка event loop:</b> p95 {loop_stats['p95_ms']:.0f} мс, блокировок {loop_stats['stalls']}
+
+📈 <b>За {len(trend)} ч:</b> +{sum(new_users)} пользователей, +{sum(new_emails)} email
+<code>{sparkline(new_users)}</code> новые пользователи
+<code>{sparkline(new_emails)}</code> новые email
 
 📅 <b>Дата:</b> {datetime.now().strftime('%d.%m.%Y %H:%M')}"""
         
@@ -86,47 +108,12 @@ async def cmd_broadcast(message: Message, lang: str = "ru"):
     logger.info(f"Администратор {user_id} начал рассылку: {broadcast_text[:50]}...")
     
     try:
-        # Получаем всех пользователей
-        all_users = get_all_users()
-        
-        if not all_users:
+        if not count_users():
             await message.answer("❌ Нет пользователей для рассылки")
             return
         
-        await message.answer(f"📤 Начинаю рассылку для {len(all_users)} пользователей...")
-        
-        sent_count = 0
-        failed_count = 0
-        
-        # Отправляем сообщение каждому пользователю
-        for user_id_str in all_users.keys():
-            try:
-                target_user_id = int(user_id_str)
-                if message.bot:
-                    await message.bot.send_message(target_user_id, broadcast_text)
-                sent_count += 1
-            except Exception as e:
-                logger.warning(f"Не удалось отправить сообщение пользователю {user_id_str}: {e}")
-                failed_count += 1
-        
-        # Сохраняем запись о рассылке
-        broadcast_record = {
-            "date": datetime.now().isoformat(),
-            "admin_id": user_id,
-            "text": broadcast_text,
-            "sent": sent_count,
-            "failed": failed_count
-        }
-        add_broadcast_record(broadcast_record)
-        
-        result_text = f"""✅ <b>Рассылка завершена</b>
-
-📤 <b>Отправлено:</b> {sent_count}
-❌ <b>Не удалось отправить:</b> {failed_count}
-📝 <b>Текст:</b> {broadcast_text[:100]}{'...' if len(broadcast_text) > 100 else ''}"""
-        
-        await message.answer(result_text)
-        logger.info(f"Рассылка завершена: {sent_count} отправлено, {failed_count} неудачно")
+        # Рассылка выполняется в фоне, прогресс обновляется в отдельном сообщении
+        await broadcast_engine.start(message.bot, user_id, message.chat.id, broadcast_text)
         
     except Exception as e:
         logger.error(f"Ошибка при рассылке: {e}")
@@ -187,15 +174,88 @@ async def cmd_ban(message: Message, lang: str = "ru"):
         await message.answer("❌ Ошибка при выполнении команды")
 
 
-# Обработчики кнопок админ-панели
-@router.message(F.text == "📊 Статистика", is_admin)
-async def handle_stats_button(message: Message, lang: str = "ru"):
+@router.message(Command("profile"), is_admin)
+async def cmd_profile(message: Message, lang: str = "ru"):
+    """Команда для профилирования бота без остановки: /profile [секунды]"""
+    user_id = message.from_user.id if message.from_user else 0
+    
+    text_parts = (message.text or "").split(' ', 1)
+    try:
+        seconds = int(text_parts[1]) if len(text_parts) > 1 else 30
+    except ValueError:
+        await message.answer("❌ Использование: /profile <секунды>")
+        return
+    
+    if not 1 <= seconds <= profiler.max_seconds:
+        await message.answer(f"❌ Длительность должна быть от 1 до {profiler.max_seconds} секунд")
+        return
+    
+    if not profiler.start(message.bot, message.chat.id, seconds):
+        await message.answer("⚠️ Профилирование уже выполняется, дождитесь отчета")
+        return
+    
+    logger.info(f"Администратор {user_id} запустил профилирование на {seconds} с")
+    await message.answer(f"🔬 Профилирование запущено на {seconds} с. Отчет придет по завершении.")
+
+
+@router.message(Command("memory"), is_admin)
+async def cmd_memory(message: Message, lang: str = "ru"):
+    """
+    Команда для анализа памяти: /memory - размеры структур,
+    /memory trace|top|diff|stop - снимки tracemalloc
+    """
+    user_id = message.from_user.id if message.from_user else 0
+    text_parts = (message.text or "").split(' ', 1)
+    action = text_parts[1].strip().lower() if len(text_parts) > 1 else ""
+    logger.info(f"Администратор {user_id} запросил анализ памяти: {action or 'структуры'}")
+    
+    if action == "trace":
+        # Снимок tracemalloc обходит все аллокации - выполняем вне event loop
+        await asyncio.to_thread(memory_inspector.start_tracing)
+        await message.answer("🧠 tracemalloc включен, базовый снимок сохранен.\n"
+                             "<code>/memory diff</code> - прирост, <code>/memory stop</code> - выключить")
+        return
+    
+    if action == "stop":
+        memory_inspector.stop_tracing()
+        await message.answer("🧠 tracemalloc выключен")
+        return
+    
+    if action in ("top", "diff"):
+        if not memory_inspector.tracing:
+            await message.answer("⚠️ tracemalloc не включен. Используйте <code>/memory trace</code>")
+            return
+        if action == "top":
+            title, lines = "Живые аллокации", await asyncio.to_thread(memory_inspector.top_allocations)
+        else:
+            title, lines = "Прирост с базового снимка", await asyncio.to_thread(memory_inspector.diff_allocations)
+        body = html.escape("\n".join(lines)) or "нет данных"
+        await message.answer(f"🧠 <b>{title}</b>\n\n<pre>{body}</pre>")
+        return
+    
+    if action:
+        await message.answer("❌ Использование: /memory [trace|top|diff|stop]")
+        return
+    
+    rows = memory_inspector.report()
+    lines = [f"{size / 1024:9.1f} KiB {items:>8} {name}" for name, items, size in rows]
+    body = html.escape("\n".join(lines)) or "нет данных"
+    tracing = "включен" if memory_inspector.tracing else "выключен"
+    await message.answer(
+        f"🧠 <b>Память процесса</b>\n\n"
+        f"RSS: {process_rss() / 1024 / 1024:.1f} MiB\n"
+        f"tracemalloc: {tracing}\n\n"
+        f"<pre>{body}</pre>"
+    )
+
+
+# Обработчики кнопок админ-панели (вызываются из routers/buttons.py по таблице кнопок)
+async def handle_stats_button(message: Message, state: FSMContext, lang: str = "ru"):
     """Обработчик кнопки статистики"""
     await cmd_stats(message, lang)
 
 
-@router.message(F.text == "📤 Рассылка", is_admin)
-async def handle_broadcast_button(message: Message, lang: str = "ru"):
+async def handle_broadcast_button(message: Message, state: FSMContext, lang: str = "ru"):
     """Обработчик кнопки рассылки"""
     await message.answer(
         "📤 <b>Рассылка сообщений</b>\n\n"
@@ -204,8 +264,7 @@ async def handle_broadcast_button(message: Message, lang: str = "ru"):
     )
 
 
-@router.message(F.text == "🚫 Забанить пользователя", is_admin)
-async def handle_ban_button(message: Message, lang: str = "ru"):
+async def handle_ban_button(message: Message, state: FSMContext, lang: str = "ru"):
     """Обработчик кнопки блокировки"""
     await message.answer(
         "🚫 <b>Блокировка пользователя</b>\n\n"
@@ -215,8 +274,7 @@ async def handle_ban_button(message: Message, lang: str = "ru"):
     )
 
 
-@router.message(F.text == "🔙 Назад", is_admin)
-async def handle_back_button(message: Message, lang: str = "ru"):
+async def handle_back_button(message: Message, state: FSMContext, lang: str = "ru"):
     """Обработчик кнопки возврата"""
     from keyboards.builders import get_main_keyboard
     await message.answer(
@@ -0,0 +1,38 @@
+"""
+Роутер для кнопок reply-клавиатуры
+"""
+
+import logging
+from typing import Awaitable, Callable, Dict
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.fsm.context import FSMContext
+
+from filters import is_button
+from routers import admin, commands
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+# Ключ кнопки в локалях -> обработчик
+BUTTON_HANDLERS: Dict[str, Callable[[Message, FSMContext, str], Awaitable[None]]] = {
+    "btn_get_mail": commands.handle_get_mail,
+    "btn_view_mails": commands.handle_view_mails,
+    "btn_delete": commands.handle_delete_mail,
+    "btn_admin_stats": admin.handle_stats_button,
+    "btn_admin_broadcast": admin.handle_broadcast_button,
+    "btn_admin_ban": admin.handle_ban_button,
+    "btn_admin_back": admin.handle_back_button,
+}
+
+
+@router.message(is_button)
+async def handle_button(message: Message, state: FSMContext, button_action: str, lang: str = "ru"):
+    """Обработчик нажатия кнопки: действие уже найдено фильтром в таблице кнопок"""
+    handler = BUTTON_HANDLERS.get(button_action)
+    if handler is None:
+        logger.warning(f"Для кнопки {button_action} не задан обработчик")
+        await commands.handle_unknown_message(message, lang)
+        return
+
+    await handler(message, state, lang)
@@ -6,15 +6,20 @@ import logging
 import random
 import string
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, InaccessibleMessage
+from aiogram.types import Message, CallbackQuery, InaccessibleMessage
 from aiogram.filters import Command
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 
 from keyboards.builders import get_main_keyboard
-from keyboards.inline import get_messages_keyboard, get_message_actions_keyboard
+from keyboards.inline import (
+    get_messages_keyboard,
+    get_message_actions_keyboard,
+    get_confirm_replacement_keyboard,
+    get_confirm_delete_keyboard
+)
 from services.api_client import MailGwClient
-from utils.storage_utils import get_user, update_user, delete_user
+from utils.storage_utils import get_user, update_user, delete_user, increment_email_counter
 from utils.translator import t
 from filters import has_mail, no_mail
 from states import MailStates
@@ -75,18 +80,11 @@ async def cmd_newmail(message: Message, state: FSMContext, lang: str = "ru"):
     
     # Проверяем, есть ли уже активная почта
     existing_user = get_user(message.from_user.id)
-    if existing_user and existing_user.get('email'):
+    if existing_user and existing_user.email:
         # Показываем подтверждение для замены существующей почты
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text=t("confirm_yes", lang), callback_data="confirm_new_email"),
-                InlineKeyboardButton(text=t("confirm_no", lang), callback_data="cancel_new_email")
-            ]
-        ])
-        
         await message.answer(
-            t("mail_exists", lang, email=existing_user['email']),
-            reply_markup=keyboard
+            t("mail_exists", lang, email=existing_user.email),
+            reply_markup=get_confirm_replacement_keyboard(lang)
         )
         await state.set_state(MailStates.confirm_replacement)
         return
@@ -121,6 +119,7 @@ async def create_new_email(message: Message, state: FSMContext, lang: str = "ru"
             if not account_data:
                 await message.answer(t("error_create_account", lang))
                 return
+            increment_email_counter()
             
             # Получаем токен
             token = await client.get_token(email, password)
@@ -166,22 +165,22 @@ async def cmd_inbox(message: Message, lang: str = "ru"):
     
     # Проверяем, есть ли активная почта
     user_data = get_user(message.from_user.id)
-    if not user_data or not user_data.get('email'):
+    if not user_data or not user_data.email:
         await message.answer(t("no_mail", lang))
         return
     
     await message.answer(t("checking_inbox", lang))
     async with MailGwClient() as client:
         try:
-            messages = await client.get_messages(user_data['token'])
+            messages = await client.get_messages(user_data.token)
             
             if not messages or len(messages) == 0:
-                await message.answer(t("inbox_empty", lang, email=user_data['email']))
+                await message.answer(t("inbox_empty", lang, email=user_data.email))
                 return
             
             # Показываем список писем с inline кнопками
             await message.answer(
-                t("inbox_messages", lang, email=user_data['email'], count=len(messages)),
+                t("inbox_messages", lang, email=user_data.email, count=len(messages)),
                 reply_markup=get_messages_keyboard(messages, lang)
             )
             
@@ -202,40 +201,30 @@ async def cmd_delete(message: Message, state: FSMContext, lang: str = "ru"):
     
     # Проверяем, есть ли активная почта
     user_data = get_user(message.from_user.id)
-    if not user_data or not user_data.get('email'):
+    if not user_data or not user_data.email:
         await message.answer(t("no_mail_delete", lang))
         return
     
     # Показываем подтверждение удаления
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text=t("delete_yes", lang), callback_data="confirm_delete_email"),
-            InlineKeyboardButton(text=t("delete_no", lang), callback_data="cancel_delete_email")
-        ]
-    ])
-    
     await message.answer(
-        t("mail_delete_confirm", lang, email=user_data['email']),
-        reply_markup=keyboard
+        t("mail_delete_confirm", lang, email=user_data.email),
+        reply_markup=get_confirm_delete_keyboard(lang)
     )
     await state.set_state(MailStates.confirm_deletion)
 
 
-# Обработчики кнопок
+# Обработчики кнопок (вызываются из routers/buttons.py по таблице кнопок)
 
-@router.message(F.text.in_(["Получить почту", "Get email"]))
 async def handle_get_mail(message: Message, state: FSMContext, lang: str = "ru"):
     """Обработчик кнопки 'Получить почту'"""
     await cmd_newmail(message, state, lang)
 
 
-@router.message(F.text.in_(["Посмотреть письма", "View messages"]))
-async def handle_view_mails(message: Message, lang: str = "ru"):
+async def handle_view_mails(message: Message, state: FSMContext, lang: str = "ru"):
     """Обработчик кнопки 'Посмотреть письма'"""
     await cmd_inbox(message, lang)
 
 
-@router.message(F.text.in_(["Удалить", "Delete"]))
 async def handle_delete_mail(message: Message, state: FSMContext, lang: str = "ru"):
     """Обработчик кнопки 'Удалить'"""
     await cmd_delete(message, state, lang)
@@ -251,6 +240,7 @@ async def callback_confirm_new_email(callback: CallbackQuery, state: FSMContext,
         return
     
     # Удаляем старую почту
+    old_user_data = get_user(callback.from_user.id)
     delete_user(callback.from_user.id)    # Создаем новую почту через прямой вызов API
     try:
         if callback.message and not isinstance(callback.message, InaccessibleMessage):
@@ -262,6 +252,10 @@ async def callback_confirm_new_email(callback: CallbackQuery, state: FSMContext,
     
     async with MailGwClient() as client:
         try:
+            # Удаляем старый аккаунт на сервере, чтобы он не остался брошенным
+            if old_user_data and old_user_data.account_id and old_user_data.token:
+                await client.delete_account(old_user_data.account_id, old_user_data.token)
+            
             # Генерируем email
             email = await client.generate_email()
             if not email:
@@ -278,6 +272,7 @@ async def callback_confirm_new_email(callback: CallbackQuery, state: FSMContext,
                 await callback.message.answer(t("error_create_account", lang))
                 await state.clear()
                 return
+            increment_email_counter()
             
             # Получаем токен
             token = await client.get_token(email, password)
@@ -330,7 +325,7 @@ async def callback_confirm_delete_email(callback: CallbackQuery, state: FSMConte
     
     # Получаем данные пользователя
     user_data = get_user(callback.from_user.id)
-    if not user_data or not user_data.get('email'):
+    if not user_data or not user_data.email:
         await callback.message.answer(t("no_mail_delete", lang))
         await state.clear()
         return
@@ -338,15 +333,15 @@ async def callback_confirm_delete_email(callback: CallbackQuery, state: FSMConte
     async with MailGwClient() as client:
         try:
             success = await client.delete_account(
-                user_data.get('account_id', ''), 
-                user_data['token']
+                user_data.account_id, 
+                user_data.token
             )
             
             # Очищаем данные пользователя в любом случае
             delete_user(callback.from_user.id)
             
             if success:
-                await callback.message.answer(t("mail_deleted", lang, email=user_data['email']))
+                await callback.message.answer(t("mail_deleted", lang, email=user_data.email))
             else:
                 await callback.message.answer(t("error_delete", lang))
                 
@@ -389,13 +384,13 @@ async def callback_view_message(callback: CallbackQuery, lang: str = "ru"):
     
     # Проверяем, есть ли активная почта
     user_data = get_user(callback.from_user.id)
-    if not user_data or not user_data.get('email'):
+    if not user_data or not user_data.email:
         await callback.answer(t("no_mail", lang))
         return
     
     async with MailGwClient() as client:
         try:
-            message_data = await client.get_message(message_id, user_data['token'])
+            message_data = await client.get_message(message_id, user_data.token)
             
             if not message_data:
                 await callback.answer(t("error_messages", lang))
@@ -451,20 +446,20 @@ async def callback_back_to_inbox(callback: CallbackQuery, lang: str = "ru"):
     
     # Проверяем, есть ли активная почта
     user_data = get_user(callback.from_user.id)
-    if not user_data or not user_data.get('email'):
+    if not user_data or not user_data.email:
         await callback.answer(t("no_mail", lang))
         return
     
     async with MailGwClient() as client:
         try:
-            messages = await client.get_messages(user_data['token'])
+            messages = await client.get_messages(user_data.token)
             
             if not messages or len(messages) == 0:
-                inbox_text = t("inbox_empty", lang, email=user_data['email'])
+                inbox_text = t("inbox_empty", lang, email=user_data.email)
                 await callback.message.answer(inbox_text)
                 return
             
-            inbox_text = t("inbox_messages", lang, email=user_data['email'], count=len(messages))
+            inbox_text = t("inbox_messages", lang, email=user_data.email, count=len(messages))
             
             await callback.message.answer(
                 inbox_text,
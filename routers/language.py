@@ -4,13 +4,14 @@
 
 import logging
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, InaccessibleMessage
+from aiogram.types import Message, CallbackQuery, InaccessibleMessage
 from aiogram.filters import Command
 from aiogram.exceptions import TelegramBadRequest
 
 from utils.translator import t, get_available_languages
 from utils.storage_utils import set_user_language
 from keyboards.builders import get_main_keyboard
+from keyboards.inline import get_language_keyboard
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -26,23 +27,9 @@ async def cmd_language(message: Message, lang: str = "ru"):
     user_id = message.from_user.id
     logger.info(f"Пользователь {user_id} запросил смену языка")
     
-    # Создаем клавиатуру с доступными языками
-    available_languages = get_available_languages()
-    keyboard = []
-    
-    for lang_code, lang_name in available_languages.items():
-        keyboard.append([
-            InlineKeyboardButton(
-                text=lang_name,
-                callback_data=f"set_language:{lang_code}"
-            )
-        ])
-    
-    reply_markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
-    
     await message.answer(
         t("language_select", lang),
-        reply_markup=reply_markup
+        reply_markup=get_language_keyboard()
     )
 
 
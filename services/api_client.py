@@ -7,13 +7,50 @@ import logging
 import random
 import string
 import time
+import weakref
 from typing import Dict, List, Optional, Any
 import aiohttp
 
 from config.settings import settings
+from services.traffic import traffic_recorder
+from utils.memory import memory_inspector
+from utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+MAILGW_LATENCY = metrics.histogram(
+    "mailgw_request_duration_seconds", "Время запроса к Mail.gw", ("method", "endpoint")
+)
+MAILGW_REQUESTS = metrics.counter(
+    "mailgw_requests_total", "Запросы к Mail.gw по статусу ответа", ("method", "endpoint", "status")
+)
+MAILGW_CACHE = metrics.counter(
+    "mailgw_cache_requests_total", "Обращения к кэшу клиента Mail.gw", ("result",)
+)
+
+
+def log_payload(title: str, payload: Any):
+    """
+    Запись полного ответа API в лог: только на уровне DEBUG и для выборки запросов,
+    чтобы не форматировать большие ответы на каждый запрос
+    """
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < settings.log_payload_sample_rate:
+        logger.debug(f"{title}: {payload}")
+
+
+def endpoint_label(endpoint: str) -> str:
+    """Шаблон эндпоинта для метрик: идентификаторы заменяются на {id}"""
+    parts = endpoint.split("?", 1)[0].strip("/").split("/")
+    return "/" + "/".join(parts[:1] + ["{id}"] * (len(parts) - 1))
+
+
+# Клиенты создаются на каждый запрос; живые экземпляры нужны для оценки памяти их кэшей
+_live_clients: "weakref.WeakSet[MailGwClient]" = weakref.WeakSet()
+memory_inspector.register(
+    "mailgw_client_cache",
+    lambda: {(id(client), key): value for client in list(_live_clients) for key, value in client.cache.items()}
+)
+
 
 class MailGwClient:
     """Клиент для работы с Mail.gw API"""
@@ -23,6 +60,7 @@ class MailGwClient:
         self.session = None
         self.cache = {}
         self.cache_ttl = 60
+        _live_clients.add(self)
         
     async def __aenter__(self):
         await self.start_session()
@@ -54,8 +92,10 @@ class MailGwClient:
         
     def _get_from_cache(self, key):
         if self._is_cache_valid(key):
+            MAILGW_CACHE.labels("hit").inc()
             data, _ = self.cache[key]
             return data
+        MAILGW_CACHE.labels("miss").inc()
         return None
         
     def _set_cache(self, key, data):
@@ -73,9 +113,14 @@ class MailGwClient:
         
         if headers:
             request_headers.update(headers)
-            
+        
+        label = endpoint_label(endpoint)
+        status = "error"
+        result = None
+        started = traffic_recorder.offset()
+        start = time.perf_counter()
         try:
-            logger.info(f"Making {method} request to {url}")
+            logger.debug(f"Making {method} request to {url}")
             
             async with self.session.request(
                 method=method,
@@ -83,10 +128,11 @@ class MailGwClient:
                 json=data if data else None,
                 headers=request_headers
             ) as response:
+                status = str(response.status)
                 
                 if response.status == 200 or response.status == 201:
                     result = await response.json()
-                    logger.info(f"Request successful: {response.status}")
+                    logger.debug(f"Request successful: {response.status}")
                     return result
                 else:
                     logger.error(f"Request failed with status {response.status}: {url}")
@@ -95,28 +141,35 @@ class MailGwClient:
         except Exception as e:
             logger.error(f"Error when requesting {url}: {e}")
             return None
+        finally:
+            elapsed = time.perf_counter() - start
+            MAILGW_LATENCY.labels(method, label).observe(elapsed)
+            MAILGW_REQUESTS.labels(method, label, status).inc()
+            if traffic_recorder.enabled:
+                traffic_recorder.record_mailgw(method, endpoint, status, result, started, elapsed)
             
     async def get_domains(self):
         cache_key = "domains"
         cached = self._get_from_cache(cache_key)
         if cached:
-            logger.info(f"Retrieved domains from cache: {len(cached)} domains")
+            logger.debug(f"Retrieved domains from cache: {len(cached)} domains")
             return cached
             
         result = await self._make_request("GET", "/domains")
-        logger.info(f"Domains API response: {result}")
+        log_payload("Domains API response", result)
         
         if result and "hydra:member" in result:
             domains = result["hydra:member"]
-            logger.info(f"Found {len(domains)} domains: {[d.get('domain', 'unknown') for d in domains]}")
+            logger.info(f"Found {len(domains)} domains")
             self._set_cache(cache_key, domains)
             return domains
         elif result and isinstance(result, list):
-            logger.info(f"Domains returned as list: {result}")
+            logger.info(f"Domains returned as list: {len(result)} domains")
             self._set_cache(cache_key, result)
             return result
         
-        logger.error(f"No domains found in response: {result}")
+        logger.error(f"No domains found in response of type {type(result).__name__}")
+        log_payload("Domains API response without domains", result)
         return None
         
     def generate_username(self, length=8):
@@ -164,7 +217,7 @@ class MailGwClient:
         
         logger.info(f"Creating account for email: {email}")
         result = await self._make_request("POST", "/accounts", data)
-        logger.info(f"Account creation response: {result}")
+        log_payload("Account creation response", result)
         return result
         
     async def get_token(self, email, password):
@@ -175,7 +228,7 @@ class MailGwClient:
         
         logger.info(f"Getting token for email: {email}")
         result = await self._make_request("POST", "/token", data)
-        logger.info(f"Token response: {result}")
+        log_payload("Token response", result)
         
         if result and "token" in result:
             return result["token"]
@@ -192,7 +245,7 @@ class MailGwClient:
         headers = {"Authorization": f"Bearer {token}"}
         result = await self._make_request("GET", "/messages", headers=headers)
         
-        logger.info(f"Raw API response for messages: {result}")
+        log_payload("Raw API response for messages", result)
         
         if result is None:
             logger.warning("API response is None")
@@ -200,16 +253,17 @@ class MailGwClient:
         
         # Проверяем, если это список напрямую (новый формат API)
         if isinstance(result, list):
-            logger.info(f"Found {len(result)} messages in direct list format")
+            logger.debug(f"Found {len(result)} messages in direct list format")
             return result
         
         # Проверяем старый формат с hydra:member
         if isinstance(result, dict) and "hydra:member" in result:
             messages = result["hydra:member"]
-            logger.info(f"Found {len(messages)} messages in hydra:member format")
+            logger.debug(f"Found {len(messages)} messages in hydra:member format")
             return messages
         
-        logger.warning(f"Unexpected response format. Result: {result}")
+        logger.warning(f"Unexpected response format: {type(result).__name__}")
+        log_payload("Unexpected messages response", result)
         return []
     async def get_message(self, message_id, token):
         cache_key = f"message_{message_id}_{token}"
@@ -238,9 +292,13 @@ class MailGwClient:
         
         url = f"{self.base_url}/accounts/{account_id}"
         
+        status = "error"
+        started = traffic_recorder.offset()
+        start = time.perf_counter()
         try:
             async with self.session.delete(url, headers=headers) as response:
-                logger.info(f"Delete account response: status={response.status}")
+                status = str(response.status)
+                logger.debug(f"Delete account response: status={response.status}")
                 
                 # Для DELETE запросов успешными считаются коды 200, 204, 404
                 # 404 может означать что аккаунт уже удален
@@ -255,3 +313,9 @@ class MailGwClient:
         except Exception as e:
             logger.error(f"Error deleting account {account_id}: {e}")
             return False
+        finally:
+            elapsed = time.perf_counter() - start
+            MAILGW_LATENCY.labels("DELETE", "/accounts/{id}").observe(elapsed)
+            MAILGW_REQUESTS.labels("DELETE", "/accounts/{id}", status).inc()
+            if traffic_recorder.enabled:
+                traffic_recorder.record_mailgw("DELETE", f"/accounts/{account_id}", status, None, started, elapsed)
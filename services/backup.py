@@ -0,0 +1,185 @@
+"""
+Периодические резервные копии хранилища: согласованный срез пишется потоком в сжатый JSONL
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Hashable, Iterator, List, Optional
+
+from config.settings import settings
+from utils.metrics import metrics
+from utils.storage_engine import StorageSnapshot, dump_snapshot
+from utils.storage_utils import storage_engine
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX = "backup-"
+BACKUP_SUFFIX = ".jsonl.gz"
+# Версия формата в заголовке файла
+BACKUP_VERSION = 1
+# Скорость важнее степени сжатия: копия пишется, пока бот работает
+COMPRESS_LEVEL = 3
+# Сколько строк сжимается за один вызов записи
+WRITE_BATCH = 1000
+
+BACKUPS = metrics.counter("storage_backups_total", "Резервные копии хранилища", ("result",))
+BACKUP_DURATION = metrics.histogram(
+    "storage_backup_duration_seconds", "Время записи резервной копии хранилища",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+
+def _line(value: Dict[str, Any]) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def write_backup(snapshot: StorageSnapshot, path: str, backend: str = "") -> int:
+    """
+    Записать срез в файл (блокирующая запись - вызывать в потоке). Строки сжимаются по мере
+    чтения среза, файл появляется под своим именем только целиком записанным
+
+    :return: Размер файла в байтах
+    """
+    tmp_path = f"{path}.tmp"
+    header = {
+        "backup": BACKUP_VERSION,
+        "backend": backend,
+        "created_at": datetime.now().isoformat(),
+        "users": snapshot.count_users(),
+    }
+    try:
+        with gzip.open(tmp_path, "wb", compresslevel=COMPRESS_LEVEL) as f:
+            f.write(_line(header))
+            batch: List[bytes] = []
+            for op in dump_snapshot(snapshot):
+                batch.append(_line(op))
+                if len(batch) >= WRITE_BATCH:
+                    f.write(b"".join(batch))
+                    batch.clear()
+            f.write(b"".join(batch))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return os.path.getsize(path)
+
+
+def read_backup(path: str) -> Iterator[Dict[str, Any]]:
+    """Операции из файла резервной копии (для utils.storage_engine.load_operations)"""
+    with gzip.open(path, "rb") as f:
+        header = json.loads(f.readline() or b"{}")
+        if header.get("backup") != BACKUP_VERSION:
+            raise ValueError(f"Not a storage backup: {path}")
+        for line in f:
+            yield json.loads(line)
+
+
+def list_backups(directory: str) -> List[str]:
+    """Файлы резервных копий от старых к новым (имя содержит время создания)"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in names
+        if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)
+    )
+
+
+class BackupService:
+    """
+    Фоновая задача резервного копирования. Срез хранилища берется в event loop (копия словарей
+    или читающая транзакция SQLite), а сериализация и сжатие выполняются в потоке, поэтому запись
+    в хранилище и обработка обновлений во время копирования не останавливаются.
+    Если данные не менялись с прошлой копии, новая не создается
+    """
+
+    def __init__(self, directory: str, interval: float, keep: int):
+        """
+        :param directory: Папка резервных копий
+        :param interval: Период копирования (секунды); 0 - копирование выключено
+        :param keep: Сколько последних копий хранить
+        """
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.last_version: Optional[Hashable] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Запустить фоновую задачу (первая копия - через interval после последней существующей)"""
+        if self.interval <= 0 or self.task is not None:
+            return
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            task, self.task = self.task, None
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _first_delay(self) -> float:
+        backups = list_backups(self.directory)
+        if not backups:
+            return 0.0
+        return max(0.0, os.path.getmtime(backups[-1]) + self.interval - time.time())
+
+    async def _run(self):
+        delay = self._first_delay()
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.interval
+            try:
+                await self.backup()
+            except Exception as e:
+                BACKUPS.labels("error").inc()
+                logger.error(f"Ошибка резервного копирования хранилища: {e}")
+
+    async def backup(self) -> Optional[str]:
+        """Создать резервную копию; возвращает путь к файлу или None, если данные не менялись"""
+        snapshot = storage_engine.snapshot()
+        try:
+            if snapshot.version == self.last_version:
+                BACKUPS.labels("skipped").inc()
+                return None
+
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{BACKUP_PREFIX}{datetime.now():%Y%m%d-%H%M%S}{BACKUP_SUFFIX}")
+            start = time.perf_counter()
+            size = await asyncio.to_thread(write_backup, snapshot, path, storage_engine.name)
+            elapsed = time.perf_counter() - start
+        finally:
+            snapshot.close()
+
+        self.last_version = snapshot.version
+        BACKUPS.labels("created").inc()
+        BACKUP_DURATION.observe(elapsed)
+        logger.info(f"Резервная копия хранилища: {path}, {size} байт, {elapsed:.2f} с")
+        await asyncio.to_thread(self.prune)
+        return path
+
+    def prune(self):
+        """Удалить копии сверх keep последних"""
+        backups = list_backups(self.directory)
+        for path in backups[:max(len(backups) - self.keep, 0)]:
+            try:
+                os.unlink(path)
+                logger.info(f"Удалена старая резервная копия {path}")
+            except OSError as e:
+                logger.error(f"Не удалось удалить резервную копию {path}: {e}")
+
+
+# Глобальная задача резервного копирования
+backup_service = BackupService(
+    directory=os.path.join(settings.storage_dir, "backups"),
+    interval=settings.backup_interval_hours * 3600,
+    keep=settings.backup_keep
+)
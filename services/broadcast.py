@@ -0,0 +1,190 @@
+"""
+Фоновый движок массовых рассылок с продолжением после перезапуска (лимиты Telegram - в send_queue)
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError
+
+from config.settings import settings
+from services.send_queue import bulk_priority
+from utils.storage_utils import (
+    add_broadcast_record, count_users, delete_broadcast_job,
+    get_broadcast_jobs, iter_user_ids, save_broadcast_job
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastEngine:
+    """
+    Движок рассылок: пул воркеров и сохранение прогресса в хранилище. Скорость отправки
+    и повтор после 429 обеспечивает очередь исходящих сообщений (services/send_queue.py),
+    через которую проходит каждый запрос бота; рассылка идет в ней с низким приоритетом
+    """
+
+    def __init__(self, workers: int, progress_interval: float, batch_size: int = 500):
+        """
+        :param workers: Количество параллельных отправителей
+        :param progress_interval: Период обновления сообщения с прогрессом (секунды)
+        :param batch_size: Размер пачки пользователей, после которой сохраняется прогресс
+        """
+        self.workers = workers
+        self.progress_interval = progress_interval
+        self.batch_size = batch_size
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    async def start(self, bot: Bot, admin_id: int, chat_id: int, text: str) -> Dict[str, Any]:
+        """Создать задачу рассылки и запустить ее в фоне"""
+        job = {
+            "job_id": uuid.uuid4().hex[:12],
+            "admin_id": admin_id,
+            "chat_id": chat_id,
+            "progress_message_id": None,
+            "text": text,
+            "total": count_users(),
+            "cursor": None,
+            "sent": 0,
+            "failed": 0,
+            "created_at": datetime.now().isoformat()
+        }
+
+        progress_message = await bot.send_message(chat_id, self._render_progress(job))
+        job["progress_message_id"] = progress_message.message_id
+        save_broadcast_job(job)
+
+        self._spawn(bot, job)
+        logger.info(f"Рассылка {job['job_id']} запущена администратором {admin_id} для {job['total']} пользователей")
+        return job
+
+    async def resume(self, bot: Bot):
+        """Продолжить рассылки, прерванные перезапуском бота"""
+        for job in get_broadcast_jobs().values():
+            if job["job_id"] in self.tasks:
+                continue
+            logger.info(f"Продолжение рассылки {job['job_id']} с пользователя после {job.get('cursor')}")
+            self._spawn(bot, job)
+
+    async def shutdown(self):
+        """Остановить активные рассылки (прогресс уже сохранен в хранилище)"""
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, bot: Bot, job: Dict[str, Any]):
+        """Запустить фоновую задачу рассылки"""
+        task = asyncio.create_task(self._run(bot, job))
+        self.tasks[job["job_id"]] = task
+        task.add_done_callback(lambda _: self.tasks.pop(job["job_id"], None))
+
+    async def _run(self, bot: Bot, job: Dict[str, Any]):
+        """Основной цикл рассылки: пачки пользователей обрабатываются пулом воркеров"""
+        # Сообщения рассылки уступают очередь интерактивным ответам пользователям
+        with bulk_priority():
+            await self._run_batches(bot, job)
+
+    async def _run_batches(self, bot: Bot, job: Dict[str, Any]):
+        """Обработка пачек пользователей с сохранением прогресса"""
+        last_progress = time.monotonic()
+
+        try:
+            for batch in iter_user_ids(self.batch_size, after=job.get("cursor")):
+                queue: asyncio.Queue = asyncio.Queue()
+                for user_id in batch:
+                    queue.put_nowait(user_id)
+
+                await asyncio.gather(*(
+                    self._worker(bot, queue, job) for _ in range(min(self.workers, len(batch)))
+                ))
+
+                # Прогресс сохраняется после каждой пачки: при перезапуске пачка может быть отправлена повторно
+                job["cursor"] = batch[-1]
+                save_broadcast_job(job)
+
+                if time.monotonic() - last_progress >= self.progress_interval:
+                    last_progress = time.monotonic()
+                    await self._update_progress(bot, job)
+
+            await self._finish(bot, job)
+
+        except asyncio.CancelledError:
+            logger.info(f"Рассылка {job['job_id']} приостановлена на пользователе {job.get('cursor')}")
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при выполнении рассылки {job['job_id']}: {e}")
+
+    async def _worker(self, bot: Bot, queue: asyncio.Queue, job: Dict[str, Any]):
+        """Воркер: забирает пользователей из очереди и отправляет им сообщение"""
+        while not queue.empty():
+            user_id = queue.get_nowait()
+            if await self._send(bot, user_id, job["text"]):
+                job["sent"] += 1
+            else:
+                job["failed"] += 1
+
+    async def _send(self, bot: Bot, user_id: int, text: str) -> bool:
+        """Отправка одному пользователю (лимит и повтор после 429 - в очереди исходящих сообщений)"""
+        try:
+            await bot.send_message(user_id, text)
+            return True
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            logger.warning(f"Не удалось отправить сообщение пользователю {user_id}: {e}")
+        except TelegramAPIError as e:
+            # В том числе TelegramRetryAfter, если очередь исчерпала повторы
+            logger.warning(f"Ошибка Telegram API при отправке пользователю {user_id}: {e}")
+        return False
+
+    async def _finish(self, bot: Bot, job: Dict[str, Any]):
+        """Завершение рассылки: запись в историю и итоговое сообщение администратору"""
+        add_broadcast_record({
+            "date": datetime.now().isoformat(),
+            "admin_id": job["admin_id"],
+            "text": job["text"],
+            "sent": job["sent"],
+            "failed": job["failed"]
+        })
+        delete_broadcast_job(job["job_id"])
+        await self._update_progress(bot, job, finished=True)
+        logger.info(f"Рассылка {job['job_id']} завершена: {job['sent']} отправлено, {job['failed']} неудачно")
+
+    async def _update_progress(self, bot: Bot, job: Dict[str, Any], finished: bool = False):
+        """Обновить сообщение с прогрессом у администратора"""
+        if not job.get("progress_message_id"):
+            return
+
+        try:
+            await bot.edit_message_text(
+                self._render_progress(job, finished),
+                chat_id=job["chat_id"],
+                message_id=job["progress_message_id"]
+            )
+        except TelegramAPIError as e:
+            logger.warning(f"Не удалось обновить прогресс рассылки {job['job_id']}: {e}")
+
+    @staticmethod
+    def _render_progress(job: Dict[str, Any], finished: bool = False) -> str:
+        """Текст сообщения с прогрессом рассылки"""
+        text = job["text"]
+        processed = job["sent"] + job["failed"]
+        title = "✅ <b>Рассылка завершена</b>" if finished else "📤 <b>Рассылка выполняется...</b>"
+
+        return f"""{title}
+
+👥 <b>Обработано:</b> {processed} из {job['total']}
+📤 <b>Отправлено:</b> {job['sent']}
+❌ <b>Не удалось отправить:</b> {job['failed']}
+📝 <b>Текст:</b> {text[:100]}{'...' if len(text) > 100 else ''}"""
+
+
+# Глобальный экземпляр движка рассылок
+broadcast_engine = BroadcastEngine(
+    workers=settings.broadcast_workers,
+    progress_interval=settings.broadcast_progress_interval
+)
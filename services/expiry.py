@@ -0,0 +1,243 @@
+"""
+Удаление почтовых ящиков по истечении срока жизни: локально и в Mail.gw
+"""
+
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from config.settings import settings
+from services.api_client import MailGwClient
+from utils.memory import memory_inspector
+from utils.metrics import metrics
+from utils.storage_utils import delete_user, get_user, iter_users, on_user_change, storage_engine
+from utils.user_record import UserRecord
+
+logger = logging.getLogger(__name__)
+
+# Повтор удаления в Mail.gw при ошибке; после последней попытки запись удаляется только локально
+MAX_DELETE_ATTEMPTS = 3
+RETRY_DELAY = 300.0
+# Максимальное время сна: после перевода системных часов расписание пересчитывается
+MAX_SLEEP = 3600.0
+
+EXPIRED = metrics.counter(
+    "mail_expired_total", "Почтовые ящики, удаленные по сроку жизни", ("result",)
+)
+
+
+class ExpiryScheduler:
+    """
+    Мин-куча сроков истечения ящиков. Добавление и перенос - O(log n), устаревшие элементы
+    кучи пропускаются при извлечении. Расписание загружается при запуске и обновляется
+    обработчиком изменений хранилища (update_user/delete_user)
+    """
+
+    def __init__(self, ttl: float, concurrency: int):
+        """
+        :param ttl: Срок жизни ящика (секунды); 0 - ящики не удаляются
+        :param concurrency: Максимум одновременных удалений
+        """
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self.heap: List[Tuple[float, int]] = []
+        # Актуальный срок по пользователю; элемент кучи с другим сроком устарел
+        self.deadlines: Dict[int, float] = {}
+        self.attempts: Dict[int, int] = {}
+        # Пользователи, чей ящик удаляется прямо сейчас
+        self.expiring: Set[int] = set()
+        self.in_flight: Set[asyncio.Task] = set()
+        self.shard = (0, 1)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[int] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.task: Optional[asyncio.Task] = None
+        on_user_change(self._on_user_change)
+        memory_inspector.register("expiry_heap", lambda: self.heap)
+        metrics.callback("mail_expiry_scheduled", "Ящики в расписании удаления", lambda: len(self.deadlines))
+
+    def expires_at(self, record: UserRecord) -> Optional[float]:
+        """Время истечения ящика (unix time) или None, если почты нет"""
+        if not record.email:
+            return None
+        created = record.mail_created_at or record.created_at or time.time()
+        return created + self.ttl
+
+    def _owns(self, user_id: int) -> bool:
+        """Пользователь относится к шарду этого процесса"""
+        index, workers = self.shard
+        return user_id % workers == index
+
+    def start(self, index: int = 0, workers: int = 1):
+        """
+        Загрузить расписание из хранилища и запустить фоновую задачу
+
+        :param index: Номер воркера; каждый воркер удаляет ящики только своего шарда пользователей
+        :param workers: Количество воркеров
+        """
+        if self.ttl <= 0 or self.task is not None:
+            return
+
+        self.shard = (index, workers)
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.wakeup = asyncio.Event()
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        # Полный проход - один раз при запуске, дальше расписание поддерживается инкрементально
+        for record in iter_users():
+            if not self._owns(record.user_id):
+                continue
+            expires_at = self.expires_at(record)
+            if expires_at is not None:
+                self.deadlines[record.user_id] = expires_at
+        self.heap = [(expires_at, user_id) for user_id, expires_at in self.deadlines.items()]
+        heapq.heapify(self.heap)
+
+        self.task = asyncio.create_task(self._run())
+        logger.info(f"Расписание удаления почты загружено: {len(self.deadlines)} ящиков")
+
+    async def stop(self):
+        """Остановка фоновой задачи и незавершенных удалений"""
+        tasks = list(self.in_flight)
+        if self.task is not None:
+            tasks.append(self.task)
+            self.task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.heap.clear()
+        self.deadlines.clear()
+
+    def _on_user_change(self, user_id: int, record: Optional[UserRecord]):
+        """Обработчик изменений хранилища"""
+        if self.task is None or not self._owns(user_id):
+            return
+        expires_at = self.expires_at(record) if record else None
+        if threading.get_ident() == self.loop_thread:
+            self._reschedule(user_id, expires_at)
+        else:
+            self.loop.call_soon_threadsafe(self._reschedule, user_id, expires_at)
+
+    def _reschedule(self, user_id: int, expires_at: Optional[float]):
+        """
+        Срок по изменению записи. Истекший ящик, который сейчас удаляется или ждет повтора
+        удаления, не переносится: иначе любое изменение записи отменило бы паузу RETRY_DELAY
+        """
+        if expires_at is not None and expires_at <= time.time():
+            if user_id in self.expiring or user_id in self.attempts:
+                return
+        elif expires_at is not None:
+            # Новая почта: попытки удаления прежнего ящика больше не нужны
+            self.attempts.pop(user_id, None)
+        self.schedule(user_id, expires_at)
+
+    def schedule(self, user_id: int, expires_at: Optional[float]):
+        """Назначить (или отменить при None) срок удаления ящика пользователя"""
+        if expires_at is None:
+            # Элемент остается в куче и будет пропущен при извлечении
+            self.deadlines.pop(user_id, None)
+            self.attempts.pop(user_id, None)
+            return
+        if self.deadlines.get(user_id) == expires_at:
+            return
+
+        self.deadlines[user_id] = expires_at
+        heapq.heappush(self.heap, (expires_at, user_id))
+        if self.heap[0] == (expires_at, user_id):
+            self.wakeup.set()
+        # Устаревших элементов стало слишком много - пересобираем кучу
+        if len(self.heap) > 2 * len(self.deadlines) + 64:
+            self.heap = [(deadline, uid) for uid, deadline in self.deadlines.items()]
+            heapq.heapify(self.heap)
+
+    def _pop_due(self, now: float) -> Optional[int]:
+        """Извлечь пользователя с истекшим сроком; устаревшие элементы выбрасываются"""
+        while self.heap:
+            expires_at, user_id = self.heap[0]
+            if self.deadlines.get(user_id) != expires_at:
+                heapq.heappop(self.heap)
+                continue
+            if expires_at > now:
+                return None
+            heapq.heappop(self.heap)
+            del self.deadlines[user_id]
+            return user_id
+        return None
+
+    async def _run(self):
+        """Сон до ближайшего срока и удаление истекших ящиков"""
+        while True:
+            user_id = self._pop_due(time.time())
+            if user_id is None:
+                timeout = min(self.heap[0][0] - time.time(), MAX_SLEEP) if self.heap else None
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if user_id in self.expiring:
+                continue
+
+            # Не больше concurrency удалений одновременно; остальные ждут в куче
+            await self.semaphore.acquire()
+            self.expiring.add(user_id)
+            task = asyncio.create_task(self._expire(user_id))
+            self.in_flight.add(task)
+            task.add_done_callback(lambda t, uid=user_id: self._expire_done(t, uid))
+
+    def _expire_done(self, task: asyncio.Task, user_id: int):
+        self.in_flight.discard(task)
+        self.expiring.discard(user_id)
+        self.semaphore.release()
+
+    async def _expire(self, user_id: int):
+        """Удаление ящика в Mail.gw и локальной записи"""
+        try:
+            record = get_user(user_id)
+            if not record or not record.email:
+                return
+
+            # Пользователь мог создать новую почту, пока задача ждала очереди
+            expires_at = self.expires_at(record)
+            if expires_at > time.time():
+                self.schedule(user_id, expires_at)
+                return
+
+            async with MailGwClient() as client:
+                deleted = await client.delete_account(record.account_id, record.token)
+
+            attempts = self.attempts.get(user_id, 0) + 1
+            if not deleted and attempts < MAX_DELETE_ATTEMPTS:
+                self.attempts[user_id] = attempts
+                self.schedule(user_id, time.time() + RETRY_DELAY)
+                EXPIRED.labels("retry").inc()
+                return
+
+            self.attempts.pop(user_id, None)
+            # Пока шел запрос к Mail.gw, пользователь мог создать новую почту: ее запись не трогаем
+            with storage_engine.transaction():
+                current = get_user(user_id)
+                if current is None or current.account_id != record.account_id:
+                    EXPIRED.labels("replaced").inc()
+                    logger.info(f"Почта пользователя {user_id} сменилась во время удаления, запись сохранена")
+                    return
+                delete_user(user_id)
+            EXPIRED.labels("deleted" if deleted else "local_only").inc()
+            logger.info(f"Почта пользователя {user_id} удалена по сроку жизни")
+        except Exception as e:
+            EXPIRED.labels("error").inc()
+            logger.error(f"Ошибка удаления истекшей почты пользователя {user_id}: {e}")
+
+
+# Глобальный планировщик удаления почты
+expiry_scheduler = ExpiryScheduler(
+    ttl=settings.mail_ttl_hours * 3600,
+    concurrency=settings.expiry_concurrency
+)
@@ -0,0 +1,173 @@
+"""
+Мониторинг задержек event loop и поиск блокирующих вызовов
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from config.settings import settings
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = metrics.histogram(
+    "event_loop_lag_seconds", "Задержка срабатывания таймера event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+LOOP_STALLS = metrics.counter("event_loop_stalls_total", "Блокировки event loop дольше порога")
+SLOW_CALLBACKS = metrics.counter("event_loop_slow_callbacks_total", "Шаги asyncio дольше slow_callback_duration")
+
+
+class _SlowCallbackFilter(logging.Filter):
+    """Считает предупреждения asyncio о медленных шагах (режим отладки event loop)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.getMessage().startswith("Executing "):
+            SLOW_CALLBACKS.inc()
+        return True
+
+
+class LoopMonitor:
+    """
+    Фоновая задача измеряет задержку event loop, а поток-сторож замечает, что задача
+    давно не отмечалась, и записывает стек главного потока в момент блокировки
+    """
+
+    def __init__(self, interval: float, stall_threshold: float, slow_callback: float,
+                 report_interval: float, window: int = 1000):
+        """
+        :param interval: Период измерения задержки (секунды); 0 - мониторинг выключен
+        :param stall_threshold: Блокировка дольше этого времени логируется со стеком
+        :param slow_callback: Порог asyncio slow_callback_duration
+        :param report_interval: Период записи перцентилей задержки в лог
+        :param window: Количество последних измерений для перцентилей
+        """
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.slow_callback = slow_callback
+        self.report_interval = report_interval
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.heartbeat = time.monotonic()
+        self.loop_thread_id: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.watchdog: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+        self.stalls = 0
+
+    def start(self):
+        """Запуск мониторинга в текущем event loop"""
+        if self.interval <= 0 or self.task is not None:
+            return
+
+        loop = asyncio.get_running_loop()
+        loop.slow_callback_duration = self.slow_callback
+        if settings.loop_debug:
+            # Режим отладки дорогой, но asyncio сам логирует медленные шаги с именем задачи
+            loop.set_debug(True)
+            logging.getLogger("asyncio").addFilter(_SlowCallbackFilter())
+
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stopped.clear()
+        self.task = asyncio.create_task(self._measure())
+        self.watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self.watchdog.start()
+        logger.info(
+            f"Мониторинг event loop запущен: период {self.interval * 1000:.0f} мс, "
+            f"порог блокировки {self.stall_threshold * 1000:.0f} мс"
+        )
+
+    async def stop(self):
+        """Остановка мониторинга"""
+        self.stopped.set()
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        self.watchdog = None
+
+    async def _measure(self):
+        """Измерение задержки: насколько позже запланированного просыпается sleep"""
+        loop = asyncio.get_running_loop()
+        last_report = loop.time()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            self.heartbeat = time.monotonic()
+
+            lag = max(0.0, now - expected)
+            self.samples.append(lag)
+            LOOP_LAG.observe(lag)
+
+            if now - last_report >= self.report_interval:
+                last_report = now
+                stats = self.snapshot()
+                logger.info(
+                    f"Задержка event loop: p50={stats['p50_ms']:.1f} мс, p95={stats['p95_ms']:.1f} мс, "
+                    f"p99={stats['p99_ms']:.1f} мс, max={stats['max_ms']:.1f} мс, блокировок: {self.stalls}"
+                )
+
+    def _watch(self):
+        """Поток-сторож: при блокировке event loop записывает стек главного потока"""
+        check_interval = min(self.interval, self.stall_threshold / 2)
+        reported = None
+        while not self.stopped.wait(check_interval):
+            heartbeat = self.heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.stall_threshold or reported == heartbeat:
+                continue
+
+            # Одна блокировка логируется один раз
+            reported = heartbeat
+            self.stalls += 1
+            LOOP_STALLS.inc()
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "стек недоступен"
+            logger.warning(
+                f"Event loop заблокирован дольше {blocked * 1000:.0f} мс. Стек главного потока:\n{stack}"
+            )
+
+    def snapshot(self) -> Dict[str, float]:
+        """Перцентили задержки event loop по последним измерениям (мс)"""
+        samples = sorted(self.samples)
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+        return {
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": samples[-1] * 1000 if samples else 0.0,
+            "stalls": self.stalls,
+        }
+
+
+# Глобальный монитор event loop
+loop_monitor = LoopMonitor(
+    interval=settings.loop_monitor_interval,
+    stall_threshold=settings.loop_stall_threshold_ms / 1000,
+    slow_callback=settings.loop_slow_callback_ms / 1000,
+    report_interval=settings.loop_lag_report_interval
+)
+
+
+def _lag_quantiles() -> Dict[tuple, float]:
+    """Перцентили задержки для метрик (секунды)"""
+    stats = loop_monitor.snapshot()
+    return {("0.5",): stats["p50_ms"] / 1000, ("0.95",): stats["p95_ms"] / 1000, ("0.99",): stats["p99_ms"] / 1000}
+
+
+metrics.callback(
+    "event_loop_lag_quantile_seconds", "Перцентили задержки event loop по последним измерениям",
+    _lag_quantiles, ("quantile",)
+)
@@ -0,0 +1,101 @@
+"""
+Профилирование работающего бота по команде администратора
+"""
+
+import asyncio
+import cProfile
+import html
+import io
+import logging
+import os
+import pstats
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from aiogram import Bot
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = "logs"
+
+
+class Profiler:
+    """
+    Сессия cProfile в потоке event loop: профилируется все, что выполняется в loop
+    за указанное время (обработка обновлений продолжается). Одновременно - одна сессия
+    """
+
+    def __init__(self, max_seconds: int = 300):
+        """
+        :param max_seconds: Максимальная длительность одной сессии
+        """
+        self.max_seconds = max_seconds
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """Идет ли сейчас сессия профилирования"""
+        return self.task is not None and not self.task.done()
+
+    def start(self, bot: Bot, chat_id: int, seconds: float, top: int = 15) -> bool:
+        """
+        Запустить сессию в фоне; по окончании отчет отправляется в chat_id
+
+        :return: False если сессия уже идет
+        """
+        if self.running:
+            return False
+        self.task = asyncio.create_task(self._run(bot, chat_id, seconds, top))
+        return True
+
+    async def _run(self, bot: Bot, chat_id: int, seconds: float, top: int):
+        """Профилирование event loop в течение seconds секунд и отправка отчета"""
+        profile = cProfile.Profile()
+        logger.info(f"Профилирование запущено на {seconds:g} с")
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+
+        try:
+            # Сохранение и разбор статистики - в отдельном потоке, чтобы не блокировать loop
+            path, lines = await asyncio.to_thread(self._save_report, profile, top)
+            await bot.send_message(chat_id, self._render_report(path, lines, seconds))
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении профиля: {e}")
+            await bot.send_message(chat_id, "❌ Не удалось сохранить профиль")
+
+    @staticmethod
+    def _save_report(profile: cProfile.Profile, top: int) -> Tuple[str, List[str]]:
+        """Сохранить pstats в logs/ и сформировать top функций по cumulative time"""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.pstats")
+        profile.dump_stats(path)
+
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        stats.sort_stats(pstats.SortKey.CUMULATIVE)
+        lines = []
+        for func in stats.fcn_list[:top]:
+            _, total_calls, _, cumulative, _ = stats.stats[func]
+            filename, line, name = func
+            # У встроенных функций нет файла и строки
+            location = f" ({os.path.basename(filename)}:{line})" if line else ""
+            lines.append(f"{cumulative:8.3f}s {total_calls:>8} {name}{location}")
+
+        logger.info(f"Профиль сохранен: {path}")
+        return path, lines
+
+    @staticmethod
+    def _render_report(path: str, lines: List[str], seconds: float) -> str:
+        """Текст отчета с top функций"""
+        body = html.escape("\n".join(lines)) or "нет данных"
+        return (
+            f"🔬 <b>Профиль за {seconds:g} с</b>\n"
+            f"Файл: <code>{html.escape(path)}</code>\n\n"
+            f"<pre>cumtime    ncalls function\n{body}</pre>"
+        )
+
+
+# Глобальный профилировщик
+profiler = Profiler()
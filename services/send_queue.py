@@ -0,0 +1,319 @@
+"""
+Центральная очередь исходящих запросов к Telegram с глобальным и per-chat ограничением скорости
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from config.settings import settings
+from utils.memory import memory_inspector
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих сообщений (меньше - важнее)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+_send_priority: ContextVar[int] = ContextVar("send_priority", default=PRIORITY_INTERACTIVE)
+
+# Префиксы методов Bot API, которые отправляют или меняют сообщения в чате
+LIMITED_METHOD_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+
+# Методы редактирования, повторные вызовы которых для одного сообщения можно схлопнуть
+COALESCED_METHODS = ("EditMessageText", "EditMessageReplyMarkup", "EditMessageCaption")
+
+
+@contextmanager
+def bulk_priority():
+    """Пометить исходящие запросы внутри блока как массовые (низкий приоритет)"""
+    token = _send_priority.set(PRIORITY_BULK)
+    try:
+        yield
+    finally:
+        _send_priority.reset(token)
+
+
+class GlobalBucket:
+    """
+    Глобальный token bucket. Лимит Telegram общий для токена бота, поэтому в многопроцессном
+    режиме состояние переносится в общую память процессов (share/attach) и воркеры берут
+    токены из одного bucket: один процесс может использовать весь лимит, если другие простаивают.
+    Блокировка держится микросекунды, поэтому берется прямо в event loop
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = float(max(rate, 1.0))
+        # Токены и время последнего пополнения (time.monotonic общее для процессов)
+        self.state: Any = [self.capacity, time.monotonic()]
+        self.lock: Any = nullcontext()
+
+    def share(self, context) -> Tuple[Any, Any]:
+        """Перенести состояние в общую память (в приемнике до запуска воркеров); результат - для attach"""
+        self.state = context.RawArray("d", list(self.state))
+        self.lock = context.Lock()
+        return self.state, self.lock
+
+    def attach(self, shared: Tuple[Any, Any]):
+        """Использовать общее состояние, созданное share в другом процессе"""
+        self.state, self.lock = shared
+
+    def take(self) -> float:
+        """Взять токен: 0 - токен получен, иначе через сколько секунд появится следующий"""
+        with self.lock:
+            tokens = self._refill()
+            if tokens >= 1:
+                self.state[0] = tokens - 1
+                return 0.0
+            return (1 - tokens) / self.rate
+
+    def pause(self, seconds: float):
+        """Остановить выдачу токенов на seconds: долг в токенах гасится за это время"""
+        with self.lock:
+            self.state[0] = min(self._refill(), -seconds * self.rate)
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        tokens = min(self.capacity, self.state[0] + (now - self.state[1]) * self.rate)
+        self.state[0] = tokens
+        self.state[1] = now
+        return tokens
+
+
+class OutboundQueue(BaseRequestMiddleware):
+    """
+    Request middleware сессии бота: все исходящие сообщения проходят через общий
+    лимит (с приоритетом интерактивных ответов), per-chat лимит, схлопывание
+    повторных правок одного сообщения и повтор после TelegramRetryAfter
+    """
+
+    def __init__(self, rate: float, chat_interval: float, chat_burst: int,
+                 group_interval: float, max_retries: int = 3):
+        """
+        :param rate: Глобальный лимит сообщений в секунду
+        :param chat_interval: Минимальный средний интервал между сообщениями в личный чат
+        :param chat_burst: Сколько сообщений подряд можно отправить в чат без ожидания
+        :param group_interval: Минимальный средний интервал для групп и каналов
+        :param max_retries: Сколько раз повторять запрос после 429
+        """
+        self.chat_interval = chat_interval
+        self.chat_burst = chat_burst
+        self.group_interval = group_interval
+        self.max_retries = max_retries
+
+        # Глобальный token bucket с очередью ожидающих по приоритету
+        self.bucket = GlobalBucket(rate)
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self.counter = itertools.count()
+        self.pump_task: Optional[asyncio.Task] = None
+
+        # Per-chat лимит по алгоритму GCRA: теоретическое время следующей отправки
+        self.chat_tat: Dict[Any, float] = {}
+        self.chat_waiting = 0
+
+        # Последняя поставленная в очередь правка для (chat_id, message_id, метод)
+        self.pending_edits: Dict[Tuple[Any, Any, str], asyncio.Future] = {}
+
+        # Метрики
+        self.wait_samples: Deque[float] = deque(maxlen=1000)
+        self.total_requests = 0
+        self.coalesced = 0
+        self.retries = 0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        """Основная логика middleware"""
+        method_name = type(method).__name__
+        chat_id = getattr(method, "chat_id", None)
+
+        if chat_id is None or not method_name.startswith(LIMITED_METHOD_PREFIXES):
+            return await make_request(bot, method)
+
+        edit_key = None
+        edit_future = None
+        if method_name in COALESCED_METHODS and getattr(method, "message_id", None):
+            edit_key = (chat_id, method.message_id, method_name)
+            edit_future = self._register_edit(edit_key)
+
+        try:
+            started = time.monotonic()
+            await self._wait_chat(chat_id)
+
+            # Пока ждали, пришла более новая правка того же сообщения - отдаем ее результат
+            latest_edit = self.pending_edits.get(edit_key) if edit_key is not None else None
+            if latest_edit is not None and latest_edit is not edit_future:
+                self.coalesced += 1
+                response = await asyncio.shield(latest_edit)
+            else:
+                await self._acquire_global(_send_priority.get())
+                self.wait_samples.append(time.monotonic() - started)
+                self.total_requests += 1
+                response = await self._request_with_retry(make_request, bot, method, chat_id)
+        except BaseException as e:
+            self._resolve_edit(edit_key, edit_future, exception=e)
+            raise
+
+        self._resolve_edit(edit_key, edit_future, response=response)
+        return response
+
+    async def _request_with_retry(self, make_request, bot, method, chat_id):
+        """
+        Выполнение запроса с повтором после TelegramRetryAfter. На время retry_after
+        останавливается и глобальный лимит, а повтор снова получает глобальный токен
+        в порядке приоритета, как новый запрос
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"Flood control для чата {chat_id}, повтор через {e.retry_after} с")
+                self.chat_tat[chat_id] = time.monotonic() + e.retry_after
+                self.bucket.pause(e.retry_after)
+                await self._acquire_global(_send_priority.get())
+
+    def _register_edit(self, key) -> asyncio.Future:
+        """Зарегистрировать новую правку сообщения, заменяющую предыдущие из очереди"""
+        future = asyncio.get_running_loop().create_future()
+        # Результат забирают только схлопнутые вызовы, поэтому исключение помечаем как полученное
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.pending_edits[key] = future
+        return future
+
+    def _resolve_edit(self, key, future: Optional[asyncio.Future], response=None,
+                      exception: Optional[BaseException] = None):
+        """Передать результат правки вызовам, которые были схлопнуты в нее"""
+        if future is None or future.done():
+            return
+
+        if self.pending_edits.get(key) is future:
+            del self.pending_edits[key]
+
+        if isinstance(exception, asyncio.CancelledError):
+            future.cancel()
+        elif exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(response)
+
+    async def _wait_chat(self, chat_id):
+        """Per-chat лимит: GCRA с допустимой пачкой из chat_burst сообщений"""
+        interval = self.chat_interval if isinstance(chat_id, int) and chat_id > 0 else self.group_interval
+        now = time.monotonic()
+
+        tat = max(self.chat_tat.get(chat_id, now), now)
+        self.chat_tat[chat_id] = tat + interval
+        delay = tat - now - interval * (self.chat_burst - 1)
+
+        if len(self.chat_tat) > 10000:
+            self._cleanup_chats(now)
+
+        if delay > 0:
+            self.chat_waiting += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.chat_waiting -= 1
+
+    def _cleanup_chats(self, now: float):
+        """Удаление чатов, лимит которых уже полностью восстановился"""
+        self.chat_tat = {chat_id: tat for chat_id, tat in self.chat_tat.items() if tat > now}
+
+    async def _acquire_global(self, priority: int):
+        """Получить токен глобального лимита с учетом приоритета"""
+        if not self.waiters and self.bucket.take() == 0:
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), future))
+
+        if self.pump_task is None or self.pump_task.done():
+            self.pump_task = asyncio.create_task(self._pump())
+
+        await future
+
+    async def _pump(self):
+        """Выдача токенов ожидающим в порядке приоритета"""
+        while self.waiters:
+            if self.waiters[0][2].done():
+                heapq.heappop(self.waiters)
+                continue
+
+            delay = self.bucket.take()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, future = heapq.heappop(self.waiters)
+            future.set_result(None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Метрики очереди: глубина и задержка постановки в очередь"""
+        samples = sorted(self.wait_samples)
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+        return {
+            "queue_depth": len(self.waiters) + self.chat_waiting,
+            "global_waiting": len(self.waiters),
+            "chat_waiting": self.chat_waiting,
+            "total_requests": self.total_requests,
+            "coalesced_edits": self.coalesced,
+            "retries": self.retries,
+            "wait_p50_ms": percentile(0.5),
+            "wait_p95_ms": percentile(0.95),
+            "wait_max_ms": samples[-1] * 1000 if samples else 0.0,
+        }
+
+
+# Глобальный экземпляр очереди исходящих сообщений. Очередь своя в каждом процессе-воркере,
+# глобальный лимит в многопроцессном режиме общий (GlobalBucket.share)
+send_queue = OutboundQueue(
+    rate=settings.outbound_rate,
+    chat_interval=settings.outbound_chat_interval,
+    chat_burst=settings.outbound_chat_burst,
+    group_interval=settings.outbound_group_interval
+)
+
+memory_inspector.register("send_queue_chat_limits", lambda: send_queue.chat_tat)
+memory_inspector.register("send_queue_pending_edits", lambda: send_queue.pending_edits)
+
+metrics.callback(
+    "telegram_send_queue_depth", "Исходящие запросы к Telegram, ожидающие отправки",
+    lambda: {("global",): len(send_queue.waiters), ("chat",): send_queue.chat_waiting}, ("limit",)
+)
+metrics.callback(
+    "telegram_requests_total", "Исходящие запросы к Telegram через очередь",
+    lambda: send_queue.total_requests, type_name="counter"
+)
+metrics.callback(
+    "telegram_coalesced_edits_total", "Редактирования, замененные более новыми",
+    lambda: send_queue.coalesced, type_name="counter"
+)
+metrics.callback(
+    "telegram_retries_total", "Повторы запросов после RetryAfter",
+    lambda: send_queue.retries, type_name="counter"
+)
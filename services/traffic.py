@@ -0,0 +1,225 @@
+"""
+Запись входящих обновлений и ответов Mail.gw для воспроизведения (tools/replay.py)
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from config.settings import settings
+from filters.button_filter import BUTTON_ACTIONS
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Настройки, от которых зависит обработка обновлений: сохраняются в заголовке записи,
+# tools/replay.py по умолчанию воспроизводит с ними
+RECORDED_SETTINGS = (
+    "throttle_rate", "max_concurrent_updates", "update_queue_size", "fsm_state_ttl", "mail_ttl_hours"
+)
+
+# Объекты, поле id которых - идентификатор пользователя или чата
+ID_PARENTS = ("from", "chat", "user", "sender_chat", "forward_from", "forward_from_chat")
+ID_KEYS = ("user_id", "chat_id")
+# Личные данные в обновлениях: заменяются строкой той же длины
+PERSONAL_KEYS = (
+    "first_name", "last_name", "username", "title", "phone_number", "bio", "email", "chat_instance"
+)
+TEXT_KEYS = ("text", "caption")
+# Личные данные в ответах Mail.gw
+MAILGW_PERSONAL_KEYS = ("name", "subject", "intro", "text", "token", "password")
+# Период сброса буфера gzip на диск
+FLUSH_INTERVAL = 1.0
+
+_STOP = object()
+
+
+def _mask(value: str) -> str:
+    """Строка той же длины: размеры сообщений и смещения entities сохраняются"""
+    return "x" * len(value)
+
+
+def _mask_address(value: str) -> str:
+    """Email: маскируется только имя ящика, домен нужен для воспроизведения"""
+    local, sep, domain = value.partition("@")
+    return _mask(local) + sep + domain
+
+
+class TrafficRecorder:
+    """
+    Запись трафика в сжатый JSONL. Записи ставятся в очередь в event loop,
+    сериализация и сжатие - в отдельном потоке
+    """
+
+    def __init__(self):
+        self.path = ""
+        self.enabled = False
+        self.started = 0.0
+        self.queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self.thread: Optional[threading.Thread] = None
+        # Соль псевдонимов генерируется на каждую запись и не сохраняется
+        self.salt = b""
+        self.seen_users: Set[int] = set()
+
+    def start(self, path: str):
+        """Начать запись в path (.jsonl.gz); пустой путь - запись выключена"""
+        if not path or self.enabled:
+            return
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.salt = os.urandom(16)
+        self.seen_users.clear()
+        self.started = time.monotonic()
+        self.queue.put({
+            "k": "h",
+            "v": FORMAT_VERSION,
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "admins": [self.pseudo_id(admin_id) for admin_id in settings.admin_ids_list],
+            "settings": {name: getattr(settings, name) for name in RECORDED_SETTINGS},
+        })
+        self.thread = threading.Thread(target=self._write, name="traffic-recorder", daemon=True)
+        self.thread.start()
+        self.enabled = True
+        logger.info(f"Запись трафика включена: {path}")
+
+    def stop(self):
+        """Дописать очередь и закрыть файл"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.queue.put(_STOP)
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        logger.info(f"Запись трафика завершена: {self.path}")
+
+    def _write(self):
+        """Поток записи: сжатый JSONL с периодическим сбросом на диск"""
+        with gzip.open(self.path, "at", encoding="utf-8", compresslevel=6) as f:
+            last_flush = time.monotonic()
+            while True:
+                try:
+                    record = self.queue.get(timeout=FLUSH_INTERVAL)
+                except queue.Empty:
+                    record = None
+                if record is _STOP:
+                    break
+                if record is not None:
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+                    f.write("\n")
+                if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                    f.flush()
+                    last_flush = time.monotonic()
+
+    def offset(self) -> float:
+        """Время от начала записи (секунды)"""
+        return time.monotonic() - self.started
+
+    # Анонимизация
+
+    def pseudo_id(self, value: int) -> int:
+        """Стабильный в пределах записи псевдоним идентификатора (знак сохраняется)"""
+        digest = hashlib.blake2b(str(abs(value)).encode(), key=self.salt, digest_size=5).digest()
+        pseudo = int.from_bytes(digest, "big") + 1
+        return -pseudo if value < 0 else pseudo
+
+    @staticmethod
+    def _anonymize_text(text: str) -> str:
+        """Команды и кнопки сохраняются (по ним идет маршрутизация), остальной текст маскируется"""
+        if text in BUTTON_ACTIONS:
+            return text
+        if text.startswith("/"):
+            command, sep, rest = text.partition(" ")
+            return command + sep + _mask(rest)
+        return _mask(text)
+
+    def anonymize_update(self, node: Any, parent: str = "") -> Any:
+        """Копия обновления без личных данных"""
+        if isinstance(node, list):
+            return [self.anonymize_update(item, parent) for item in node]
+        if not isinstance(node, dict):
+            return node
+
+        result = {}
+        for key, value in node.items():
+            if isinstance(value, int) and not isinstance(value, bool) and (
+                key in ID_KEYS or (key == "id" and parent in ID_PARENTS)
+            ):
+                result[key] = self.pseudo_id(value)
+            elif isinstance(value, str) and key in PERSONAL_KEYS:
+                result[key] = _mask(value)
+            elif isinstance(value, str) and key in TEXT_KEYS:
+                result[key] = self._anonymize_text(value)
+            else:
+                result[key] = self.anonymize_update(value, key)
+        return result
+
+    def anonymize_mailgw(self, node: Any) -> Any:
+        """Копия ответа Mail.gw без адресов, содержимого писем и токенов"""
+        if isinstance(node, list):
+            return [self.anonymize_mailgw(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+
+        result = {}
+        for key, value in node.items():
+            if key == "address" and isinstance(value, str):
+                result[key] = _mask_address(value)
+            elif key in MAILGW_PERSONAL_KEYS and isinstance(value, str):
+                result[key] = _mask(value)
+            elif key == "html" and isinstance(value, list):
+                result[key] = [_mask(part) if isinstance(part, str) else part for part in value]
+            else:
+                result[key] = self.anonymize_mailgw(value)
+        return result
+
+    # Записи
+
+    def record_update(self, update: Dict[str, Any], arrived: float, duration: float,
+                      user_id: Optional[int] = None, user_state: Optional[Dict[str, Any]] = None):
+        """
+        Входящее обновление
+
+        :param arrived: Время поступления от начала записи
+        :param user_state: Состояние пользователя при первом появлении в записи (почта, язык)
+        """
+        record = {"k": "u", "t": round(arrived, 4), "dur": round(duration, 5), "d": self.anonymize_update(update)}
+        if user_id is not None and user_id not in self.seen_users:
+            self.seen_users.add(user_id)
+            record["s"] = dict(user_state or {}, uid=self.pseudo_id(user_id))
+        self.queue.put(record)
+
+    def record_mailgw(self, method: str, path: str, status: str, body: Any, started: float, duration: float):
+        """Ответ Mail.gw (status "error" - запрос завершился исключением)"""
+        self.queue.put({
+            "k": "m",
+            "t": round(started, 4),
+            "dur": round(duration, 5),
+            "m": method,
+            "p": path.split("?", 1)[0],
+            "st": status,
+            "d": self.anonymize_mailgw(body),
+        })
+
+
+def worker_path(path: str, index: int) -> str:
+    """Отдельный файл записи для процесса-воркера: traffic.jsonl.gz -> traffic.worker0.jsonl.gz"""
+    base, ext = path, ""
+    for suffix in (".jsonl.gz", ".gz"):
+        if path.endswith(suffix):
+            base, ext = path[:-len(suffix)], suffix
+            break
+    return f"{base}.worker{index}{ext}"
+
+
+# Глобальный рекордер трафика
+traffic_recorder = TrafficRecorder()
@@ -0,0 +1,223 @@
+"""
+Многопроцессный режим: один приемник обновлений и N процессов-воркеров с шардированием по пользователю
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Типы обновлений, в которых есть отправитель
+USER_UPDATE_TYPES = (
+    "message", "edited_message", "callback_query", "inline_query",
+    "chosen_inline_result", "shipping_query", "pre_checkout_query",
+    "my_chat_member", "chat_member", "chat_join_request"
+)
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+
+# Воркер, проработавший меньше MIN_WORKER_UPTIME секунд, считается упавшим при запуске;
+# после MAX_FAST_RESTARTS таких падений подряд приемник завершается с ошибкой
+MIN_WORKER_UPTIME = 10.0
+MAX_FAST_RESTARTS = 3
+
+
+def extract_user_id(update: Dict[str, Any]) -> int:
+    """Получить ID пользователя из сырого обновления (без разбора в pydantic-модель)"""
+    for update_type in USER_UPDATE_TYPES:
+        event = update.get(update_type)
+        if not event:
+            continue
+        if event.get("from"):
+            return event["from"]["id"]
+        if event.get("chat"):
+            return event["chat"]["id"]
+    return update.get("update_id", 0)
+
+
+def shard_for(update: Dict[str, Any], workers: int) -> int:
+    """Номер воркера для обновления: все обновления одного пользователя попадают в один процесс"""
+    return extract_user_id(update) % workers
+
+
+async def consume_updates(queue, handle: Callable[[Dict[str, Any]], Awaitable[Any]]):
+    """
+    Цикл воркера: читает обновления из межпроцессной очереди и обрабатывает их
+    параллельно для разных пользователей и строго по порядку для одного пользователя
+
+    :param queue: multiprocessing.Queue с сырыми обновлениями (None - сигнал остановки)
+    :param handle: Корутина обработки одного обновления
+    """
+    loop = asyncio.get_running_loop()
+    tails: Dict[int, asyncio.Task] = {}
+
+    async def process(previous: Optional[asyncio.Task], update: Dict[str, Any]):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await handle(update)
+        except Exception as e:
+            logger.error(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+
+    while True:
+        update = await loop.run_in_executor(None, queue.get)
+        if update is None:
+            break
+
+        user_id = extract_user_id(update)
+        task = asyncio.create_task(process(tails.get(user_id), update))
+        tails[user_id] = task
+        task.add_done_callback(lambda t, uid=user_id: tails.get(uid) is t and tails.pop(uid))
+
+    await asyncio.gather(*tails.values(), return_exceptions=True)
+
+
+class Supervisor:
+    """Запускает процессы-воркеры и распределяет между ними обновления"""
+
+    def __init__(self, workers: int, worker_target: Callable[[int, Any], None]):
+        """
+        :param workers: Количество процессов-воркеров
+        :param worker_target: Функция процесса воркера (index, queue, *worker_args), должна импортироваться по имени
+        """
+        self.workers = workers
+        self.worker_target = worker_target
+        # Дополнительные аргументы воркеров (объекты общей памяти создаются через self.context)
+        self.worker_args: Tuple[Any, ...] = ()
+        self.context = multiprocessing.get_context("spawn")
+        self.queues: List[Any] = [self.context.Queue() for _ in range(workers)]
+        self.processes: List[Any] = [None] * workers
+        self.started_at: List[float] = [0.0] * workers
+        self.fast_restarts: List[int] = [0] * workers
+
+    def start(self):
+        """Запуск процессов-воркеров"""
+        for index in range(self.workers):
+            self._spawn(index)
+        logger.info(f"Запущено воркеров: {self.workers}")
+
+    def _spawn(self, index: int):
+        """Запустить воркер index; очередь остается прежней, поэтому непрочитанные обновления не теряются"""
+        process = self.context.Process(
+            target=self.worker_target,
+            args=(index, self.queues[index], *self.worker_args),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+
+    def check_workers(self):
+        """Перезапустить завершившиеся воркеры (RuntimeError, если воркер падает сразу после запуска)"""
+        for index, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            uptime = time.monotonic() - self.started_at[index]
+            self.fast_restarts[index] = self.fast_restarts[index] + 1 if uptime < MIN_WORKER_UPTIME else 0
+            if self.fast_restarts[index] >= MAX_FAST_RESTARTS:
+                raise RuntimeError(f"Worker {index} keeps exiting right after start (code {process.exitcode})")
+            logger.error(f"Воркер {index} завершился с кодом {process.exitcode} через {uptime:.0f} с, перезапуск")
+            self._spawn(index)
+
+    async def serve(self, receiver: Awaitable[Any], interval: float = 1.0):
+        """
+        Прием обновлений с наблюдением за воркерами. Упавший воркер перезапускается с тем же
+        номером и очередью; если воркер не поднимается, прием останавливается с RuntimeError
+        """
+        receiver_task = asyncio.ensure_future(receiver)
+        try:
+            while not receiver_task.done():
+                await asyncio.wait([receiver_task], timeout=interval)
+                self.check_workers()
+            await receiver_task
+        finally:
+            receiver_task.cancel()
+            await asyncio.gather(receiver_task, return_exceptions=True)
+
+    def route(self, update: Dict[str, Any]):
+        """Передать обновление воркеру, отвечающему за пользователя"""
+        self.queues[shard_for(update, self.workers)].put(update)
+
+    def stop(self, timeout: float = 10.0):
+        """Остановка воркеров: сигнал завершения и ожидание текущей обработки"""
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        logger.info("Воркеры остановлены")
+
+    async def receive_polling(self, allowed_updates: List[str], poll_timeout: int = 30):
+        """Приемник long polling: сырые getUpdates без разбора обновлений в модели"""
+        url = f"{TELEGRAM_API_URL}/bot{settings.bot_token}/getUpdates"
+        offset = 0
+
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=poll_timeout + 10)) as session:
+            # Режимы webhook и getUpdates взаимоисключающие
+            async with session.post(f"{TELEGRAM_API_URL}/bot{settings.bot_token}/deleteWebhook") as response:
+                if response.status != 200:
+                    logger.warning(f"deleteWebhook вернул HTTP {response.status}: {await response.text()}")
+
+            while True:
+                try:
+                    async with session.post(url, json={
+                        "offset": offset,
+                        "timeout": poll_timeout,
+                        "allowed_updates": allowed_updates
+                    }) as response:
+                        payload = await response.json(loads=json.loads)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning(f"Ошибка getUpdates: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                if not payload.get("ok"):
+                    logger.error(f"getUpdates вернул ошибку: {payload.get('description')}")
+                    await asyncio.sleep(payload.get("parameters", {}).get("retry_after", 1))
+                    continue
+
+                for update in payload["result"]:
+                    self.route(update)
+                    offset = update["update_id"] + 1
+
+    async def receive_webhook(self):
+        """Приемник webhook: проверка секрета и маршрутизация без разбора обновлений"""
+        async def handle(request: web.Request) -> web.Response:
+            if settings.webhook_secret and not secrets.compare_digest(
+                request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), settings.webhook_secret
+            ):
+                return web.Response(status=401)
+            try:
+                update = await request.json(loads=json.loads)
+            except ValueError:
+                return web.Response(status=400)
+            if not isinstance(update, dict):
+                return web.Response(status=400)
+            self.route(update)
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post(settings.webhook_path, handle)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, host=settings.webhook_listen_host, port=settings.webhook_port)
+        await site.start()
+        logger.info(f"Приемник webhook слушает {settings.webhook_listen_host}:{settings.webhook_port}{settings.webhook_path}")
+
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
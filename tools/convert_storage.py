@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Перевод файлов хранилища между форматами "json" и "compact" (см. utils/storage_format.py)
+и перенос данных между бэкендами хранилища (см. utils/storage_engine)
+
+Запуск из корня проекта:
+    python tools/convert_storage.py --to compact                 # файлы из STORAGE_DIR
+    python tools/convert_storage.py --to json storage/user_storage.json
+    python tools/convert_storage.py                              # только показать форматы и размеры
+    python tools/convert_storage.py --migrate-to sqlite          # из STORAGE_BACKEND в sqlite
+    python tools/convert_storage.py --restore storage/backups/backup-20240101-000000.jsonl.gz
+
+Файл переписывается атомарно под той же блокировкой, что и у бота, поэтому
+конвертировать можно и на работающем боте. Бот читает оба формата, но при
+следующей записи сохранит файл в формате STORAGE_FORMAT - его нужно поменять тоже.
+Перенос между бэкендами и восстановление из резервной копии (services/backup.py)
+выполняются на остановленном боте; после переноса нужно поменять STORAGE_BACKEND
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import storage_format  # noqa: E402
+from utils.file_lock import file_lock, write_bytes_atomic  # noqa: E402
+
+
+def default_files() -> List[str]:
+    """Файлы хранилища в порядке блокировки бота"""
+    from config.settings import settings
+    from utils.storage_engine.journal import SNAPSHOT_NAME
+    from utils.storage_utils import BOT_STORAGE_FILE, STORAGE_FILE
+    return [STORAGE_FILE, BOT_STORAGE_FILE, os.path.join(settings.storage_dir, SNAPSHOT_NAME)]
+
+
+def convert(path: str, target: str) -> bool:
+    """Перевести файл в формат target (пустой - только вывести сведения)"""
+    if not os.path.exists(path):
+        print(f"{path}: нет файла")
+        return True
+
+    with file_lock(path):
+        with open(path, "rb") as f:
+            payload = f.read()
+        source = storage_format.detect(payload)
+        try:
+            data = storage_format.decode(payload)
+        except ValueError as e:
+            print(f"{path}: файл поврежден ({e})")
+            return False
+
+        if not target or target == source:
+            print(f"{path}: {source}, {len(payload)} байт")
+            return True
+
+        start = time.perf_counter()
+        converted = storage_format.encode(data, target)
+        write_bytes_atomic(path, converted)
+        elapsed = (time.perf_counter() - start) * 1000
+
+    print(
+        f"{path}: {source} -> {target}, {len(payload)} -> {len(converted)} байт "
+        f"({len(converted) / max(len(payload), 1):.0%}), {elapsed:.1f} мс"
+    )
+    return True
+
+
+def migrate(source_name: str, target_name: str) -> bool:
+    """Скопировать все данные из бэкенда source_name в target_name (папка и формат из настроек)"""
+    from config.settings import settings
+    from utils.storage_engine import copy_storage, create_backend
+
+    if source_name == target_name:
+        print(f"Хранилище уже в бэкенде {target_name}")
+        return False
+
+    source = create_backend(source_name, settings.storage_dir, settings.storage_format)
+    target = create_backend(target_name, settings.storage_dir, settings.storage_format)
+    try:
+        if target.count_users():
+            print(f"В бэкенде {target_name} уже есть пользователи: перенос перезапишет их записи")
+
+        start = time.perf_counter()
+        copy_storage(source, target)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{source_name} -> {target_name}: {target.count_users()} пользователей, {elapsed:.1f} мс")
+        print(f"Теперь установите STORAGE_BACKEND={target_name}")
+    finally:
+        source.close()
+        target.close()
+    return True
+
+
+def restore(path: str) -> bool:
+    """Загрузить резервную копию в хранилище STORAGE_BACKEND"""
+    from services.backup import read_backup
+    from utils.storage_engine import load_operations
+    from utils.storage_utils import storage_engine
+
+    if storage_engine.count_users():
+        print("В хранилище уже есть пользователи: записи из копии заменят совпадающие")
+
+    start = time.perf_counter()
+    try:
+        count = load_operations(storage_engine, read_backup(path))
+    except (OSError, EOFError, ValueError) as e:
+        # Транзакция откатывается: хранилище остается как было
+        print(f"{path}: ошибка чтения резервной копии ({e})")
+        return False
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{path} -> {storage_engine.name}: {count} записей, {storage_engine.count_users()} пользователей, {elapsed:.1f} мс")
+    return True
+
+
+def main():
+    from utils.storage_engine import BACKENDS
+
+    parser = argparse.ArgumentParser(description="Перевод файлов хранилища между форматами")
+    parser.add_argument("files", nargs="*", help="Файлы хранилища (по умолчанию - из STORAGE_DIR)")
+    parser.add_argument("--to", default="", choices=("",) + storage_format.FORMATS,
+                        help="Целевой формат (без параметра - только показать текущий)")
+    parser.add_argument("--migrate-to", default="", choices=("",) + tuple(name for name in BACKENDS if name != "memory"),
+                        help="Перенести данные из текущего бэкенда (STORAGE_BACKEND) в указанный")
+    parser.add_argument("--migrate-from", default="", help="Исходный бэкенд (по умолчанию - STORAGE_BACKEND)")
+    parser.add_argument("--restore", default="", help="Восстановить хранилище STORAGE_BACKEND из резервной копии")
+    args = parser.parse_args()
+
+    if args.restore:
+        if not restore(args.restore):
+            sys.exit(1)
+        return
+
+    if args.migrate_to:
+        from config.settings import settings
+        if not migrate(args.migrate_from or settings.storage_backend, args.migrate_to):
+            sys.exit(1)
+        return
+
+    ok = True
+    for path in args.files or default_files():
+        ok = convert(path, args.to) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
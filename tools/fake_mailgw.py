@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Локальная замена Mail.gw API для нагрузочного тестирования: аккаунты, токены и письма
+хранятся в памяти, задержка ответов, ошибки и 429 задаются параметрами
+
+Запуск из корня проекта:
+    python tools/fake_mailgw.py --port 8025 --latency-ms 80 --error-rate 0.01 --rate-limit-rate 0.02
+
+Бот подключается к серверу через переменную окружения BASE_URL=http://127.0.0.1:8025
+"""
+
+import argparse
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from aiohttp import web
+
+DEFAULT_DOMAINS = ("fakemail.test", "loadtest.test")
+
+
+class FakeMailGw:
+    """Состояние и обработчики поддельного Mail.gw"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, messages_per_inbox: int = 5,
+                 domains: Sequence[str] = DEFAULT_DOMAINS, seed: Optional[int] = None):
+        """
+        :param latency: Средняя задержка ответа (секунды)
+        :param jitter: Случайное отклонение задержки в обе стороны (секунды)
+        :param error_rate: Доля запросов, на которые отвечается 500
+        :param rate_limit_rate: Доля запросов, на которые отвечается 429
+        :param messages_per_inbox: Сколько писем появляется в ящике при создании аккаунта
+        :param seed: Зерно генератора для воспроизводимых прогонов
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.messages_per_inbox = messages_per_inbox
+        self.domains = list(domains)
+        self.random = random.Random(seed)
+
+        self.accounts: Dict[str, Dict[str, Any]] = {}
+        self.addresses: Dict[str, str] = {}
+        self.tokens: Dict[str, str] = {}
+        self.inboxes: Dict[str, List[Dict[str, Any]]] = {}
+        # Ответы по эндпоинту и статусу: {"GET /messages 200": 10, ...}
+        self.stats: Counter = Counter()
+
+    def _new_id(self) -> str:
+        """Идентификатор в формате Mail.gw (24 hex-символа)"""
+        return f"{self.random.getrandbits(96):024x}"
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    def _make_inbox(self, address: str) -> List[Dict[str, Any]]:
+        """Письма нового ящика"""
+        inbox = []
+        for index in range(self.messages_per_inbox):
+            text = f"Message {index} body for {address}. " * 20
+            inbox.append({
+                "id": self._new_id(),
+                "from": {"address": f"sender{index}@example.com", "name": f"Sender {index}"},
+                "to": [{"address": address, "name": ""}],
+                "subject": f"Test message {index}",
+                "intro": text[:120],
+                "text": text,
+                "html": [f"<p>{text}</p>"],
+                "seen": False,
+                "hasAttachments": False,
+                "size": len(text),
+                "createdAt": self._now(),
+            })
+        return inbox
+
+    def _account_for(self, request: web.Request) -> Optional[str]:
+        """Аккаунт по заголовку Authorization: Bearer <token>"""
+        auth = request.headers.get("Authorization", "")
+        if not auth.startswith("Bearer "):
+            return None
+        return self.tokens.get(auth[len("Bearer "):])
+
+    @web.middleware
+    async def faults(self, request: web.Request, handler) -> web.StreamResponse:
+        """Задержка и внедрение ошибок перед любым обработчиком"""
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            response = web.json_response(
+                {"code": 429, "message": "Too Many Requests"}, status=429, headers={"Retry-After": "1"}
+            )
+        elif roll < self.rate_limit_rate + self.error_rate:
+            response = web.json_response({"code": 500, "message": "Internal Server Error"}, status=500)
+        else:
+            response = await handler(request)
+
+        route = request.match_info.route.resource
+        path = route.canonical if route is not None else request.path
+        self.stats[f"{request.method} {path} {response.status}"] += 1
+        return response
+
+    async def get_domains(self, request: web.Request) -> web.Response:
+        members = [
+            {"id": f"{index:024x}", "domain": domain, "isActive": True, "isPrivate": False,
+             "createdAt": self._now(), "updatedAt": self._now()}
+            for index, domain in enumerate(self.domains)
+        ]
+        return web.json_response({"hydra:member": members, "hydra:totalItems": len(members)})
+
+    async def create_account(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        address = data.get("address", "")
+        if not data.get("password") or "@" not in address:
+            return web.json_response({"detail": "address: This value is not valid."}, status=422)
+        if address.split("@", 1)[1] not in self.domains:
+            return web.json_response({"detail": "address: This domain is not valid."}, status=422)
+        if address in self.addresses:
+            return web.json_response({"detail": "address: This value is already used."}, status=422)
+
+        account_id = self._new_id()
+        account = {
+            "id": account_id, "address": address, "quota": 40000000, "used": 0,
+            "isDisabled": False, "isDeleted": False, "createdAt": self._now(), "updatedAt": self._now(),
+        }
+        self.accounts[account_id] = dict(account, password=data["password"])
+        self.addresses[address] = account_id
+        self.inboxes[account_id] = self._make_inbox(address)
+        return web.json_response(account, status=201)
+
+    async def get_token(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        account_id = self.addresses.get(data.get("address", ""))
+        if account_id is None or self.accounts[account_id]["password"] != data.get("password"):
+            return web.json_response({"code": 401, "message": "Invalid credentials."}, status=401)
+
+        token = f"{self.random.getrandbits(256):064x}"
+        self.tokens[token] = account_id
+        return web.json_response({"token": token, "id": account_id})
+
+    async def get_messages(self, request: web.Request) -> web.Response:
+        account_id = self._account_for(request)
+        if account_id is None:
+            return web.json_response({"code": 401, "message": "JWT Token not found"}, status=401)
+
+        summary_fields = ("id", "from", "to", "subject", "intro", "seen", "hasAttachments", "size", "createdAt")
+        members = [{key: message[key] for key in summary_fields} for message in self.inboxes.get(account_id, [])]
+        return web.json_response({"hydra:member": members, "hydra:totalItems": len(members)})
+
+    async def get_message(self, request: web.Request) -> web.Response:
+        account_id = self._account_for(request)
+        if account_id is None:
+            return web.json_response({"code": 401, "message": "JWT Token not found"}, status=401)
+
+        for message in self.inboxes.get(account_id, []):
+            if message["id"] == request.match_info["message_id"]:
+                return web.json_response(message)
+        return web.json_response({"code": 404, "message": "Not Found"}, status=404)
+
+    async def delete_account(self, request: web.Request) -> web.Response:
+        account_id = request.match_info["account_id"]
+        if account_id not in self.accounts:
+            return web.json_response({"code": 404, "message": "Not Found"}, status=404)
+        if self._account_for(request) != account_id:
+            return web.json_response({"code": 403, "message": "Access Denied."}, status=403)
+
+        account = self.accounts.pop(account_id)
+        self.addresses.pop(account["address"], None)
+        self.inboxes.pop(account_id, None)
+        self.tokens = {token: owner for token, owner in self.tokens.items() if owner != account_id}
+        return web.Response(status=204)
+
+    def create_app(self) -> web.Application:
+        """aiohttp-приложение с эндпоинтами Mail.gw"""
+        app = web.Application(middlewares=[self.faults])
+        app.router.add_get("/domains", self.get_domains)
+        app.router.add_post("/accounts", self.create_account)
+        app.router.add_delete("/accounts/{account_id}", self.delete_account)
+        app.router.add_post("/token", self.get_token)
+        app.router.add_get("/messages", self.get_messages)
+        app.router.add_get("/messages/{message_id}", self.get_message)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+        """
+        Запуск сервера в текущем event loop
+
+        :param port: 0 - выбрать свободный порт; фактический адрес - в self.base_url
+        """
+        runner = web.AppRunner(self.create_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        bound_port = runner.addresses[0][1]
+        self.base_url = f"http://{host}:{bound_port}"
+        return runner
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    """Общие параметры задержки и ошибок (используются и нагрузочным тестом)"""
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Средняя задержка ответа")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Разброс задержки")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--messages", type=int, default=5, help="Писем в каждом новом ящике")
+    parser.add_argument("--seed", type=int, default=None, help="Зерно генератора")
+
+
+def from_arguments(args: argparse.Namespace) -> FakeMailGw:
+    """FakeMailGw с параметрами из командной строки"""
+    return FakeMailGw(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        messages_per_inbox=args.messages,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена Mail.gw API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    server = from_arguments(args)
+    print(f"Fake Mail.gw: http://{args.host}:{args.port}")
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест: синтетические пользователи проходят сценарий работы с почтой,
+обновления подаются в Dispatcher.feed_update, запросы к Telegram обрабатывает
+поддельная сессия бота, Mail.gw - локальный сервер из tools/fake_mailgw.py.
+В конце выводится пропускная способность и p50/p95/p99 по каждой команде
+
+Запуск из корня проекта:
+    python tools/load_test.py --users 1000 --concurrency 200 --latency-ms 80 --error-rate 0.01
+
+Хранилище и FSM пишутся во временную папку, рабочие файлы storage/ не затрагиваются.
+Исходящие сообщения не проходят через очередь отправки с лимитами Telegram -
+измеряется обработка обновлений самим ботом
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.default import DefaultBotProperties  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.enums import ParseMode  # noqa: E402
+from aiogram.methods import SendMessage, TelegramMethod  # noqa: E402
+from aiogram.types import Chat, InlineKeyboardMarkup, Message, Update  # noqa: E402
+
+from tools.fake_mailgw import add_fault_arguments, from_arguments  # noqa: E402
+
+# Сценарий одного пользователя: команды и нажатия inline-кнопок
+SCENARIO = (
+    "/start",
+    "/newmail",
+    "/inbox",
+    "view_message",
+    "back_to_inbox",
+    "refresh_inbox",
+    "/delete",
+    "confirm_delete_email",
+)
+
+
+class LoadSession(BaseSession):
+    """Сессия бота без сети: запоминает последнюю inline-клавиатуру в каждом чате"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+        self.message_ids = itertools.count(1)
+        self.markups: Dict[int, InlineKeyboardMarkup] = {}
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.requests += 1
+        if isinstance(method, SendMessage):
+            if isinstance(method.reply_markup, InlineKeyboardMarkup):
+                self.markups[method.chat_id] = method.reply_markup
+            return Message(
+                message_id=next(self.message_ids), date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"), text=method.text
+            )
+        return True
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+    async def close(self):
+        pass
+
+    def find_callback(self, chat_id: int, prefix: str) -> Optional[str]:
+        """callback_data первой кнопки с префиксом из последней клавиатуры чата"""
+        markup = self.markups.get(chat_id)
+        if markup is None:
+            return None
+        for row in markup.inline_keyboard:
+            for button in row:
+                if button.callback_data and button.callback_data.startswith(prefix):
+                    return button.callback_data
+        return None
+
+
+class LoadTest:
+    """Генерация обновлений и сбор времени обработки по командам"""
+
+    def __init__(self, dp, bot: Bot, session: LoadSession, base_user_id: int = 10_000_000):
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.base_user_id = base_user_id
+        self.update_ids = itertools.count(1)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.skipped: Dict[str, int] = defaultdict(int)
+
+    def _message_update(self, user_id: int, text: str) -> Update:
+        update_id = next(self.update_ids)
+        entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else []
+        return Update.model_validate({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id, "date": int(time.time()), "text": text, "entities": entities,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Load", "language_code": "en"},
+            },
+        })
+
+    def _callback_update(self, user_id: int, data: str) -> Update:
+        update_id = next(self.update_ids)
+        return Update.model_validate({
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id), "chat_instance": str(user_id), "data": data,
+                "from": {"id": user_id, "is_bot": False, "first_name": "Load", "language_code": "en"},
+                "message": {
+                    "message_id": update_id, "date": int(time.time()), "text": "...",
+                    "chat": {"id": user_id, "type": "private"},
+                },
+            },
+        })
+
+    async def _feed(self, label: str, update: Update):
+        start = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            self.errors[label] += 1
+        self.latencies[label].append(time.perf_counter() - start)
+
+    async def run_user(self, index: int, think_time: float):
+        """Один пользователь проходит сценарий от начала до конца"""
+        user_id = self.base_user_id + index
+        for step in SCENARIO:
+            if step.startswith("/"):
+                update = self._message_update(user_id, step)
+            else:
+                # Письмо выбирается из клавиатуры, которую бот прислал в ответ на /inbox
+                data = self.session.find_callback(user_id, "view_message:") if step == "view_message" else step
+                if data is None:
+                    self.skipped[step] += 1
+                    continue
+                update = self._callback_update(user_id, data)
+            await self._feed(step, update)
+            if think_time:
+                await asyncio.sleep(think_time)
+
+    async def run(self, users: int, concurrency: int, think_time: float) -> float:
+        """Прогон всех пользователей не более чем по concurrency одновременно; возвращает время (с)"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(index: int):
+            async with semaphore:
+                await self.run_user(index, think_time)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(limited(index) for index in range(users)))
+        return time.perf_counter() - start
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Перцентиль по отсортированной выборке (мс)"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+
+def build_report(test: LoadTest, elapsed: float) -> Dict[str, Any]:
+    """Итоги прогона в виде словаря (он же сохраняется в JSON)"""
+    commands = {}
+    for label in SCENARIO:
+        samples = sorted(test.latencies.get(label, []))
+        commands[label] = {
+            "count": len(samples),
+            "errors": test.errors.get(label, 0),
+            "skipped": test.skipped.get(label, 0),
+            "p50_ms": percentile(samples, 0.5),
+            "p95_ms": percentile(samples, 0.95),
+            "p99_ms": percentile(samples, 0.99),
+            "max_ms": samples[-1] * 1000 if samples else 0.0,
+        }
+    total = sum(len(samples) for samples in test.latencies.values())
+    return {
+        "updates": total,
+        "elapsed_s": elapsed,
+        "throughput_ups": total / elapsed if elapsed else 0.0,
+        "telegram_requests": test.session.requests,
+        "commands": commands,
+    }
+
+
+def print_report(report: Dict[str, Any], mailgw_stats: Dict[str, int], shed: int):
+    print(
+        f"\nОбновлений: {report['updates']} за {report['elapsed_s']:.2f} с "
+        f"({report['throughput_ups']:.1f} upd/s), запросов к Telegram: {report['telegram_requests']}, "
+        f"отклонено из-за очереди: {shed}\n"
+    )
+    print(f"{'команда':<22}{'кол-во':>8}{'ошибки':>8}{'пропуск':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'max мс':>10}")
+    for label, row in report["commands"].items():
+        print(
+            f"{label:<22}{row['count']:>8}{row['errors']:>8}{row['skipped']:>8}"
+            f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}"
+        )
+    if mailgw_stats:
+        print("\nОтветы Mail.gw:")
+        for key, count in sorted(mailgw_stats.items()):
+            print(f"  {key:<40}{count:>8}")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    server = None
+    runner = None
+    if args.mailgw_url:
+        os.environ["BASE_URL"] = args.mailgw_url
+    else:
+        server = from_arguments(args)
+        runner = await server.start()
+        os.environ["BASE_URL"] = server.base_url
+
+    # Настройки читаются при импорте бота, поэтому окружение готовится заранее
+    storage_dir = tempfile.mkdtemp(prefix="mailbot-load-")
+    os.environ["STORAGE_DIR"] = storage_dir
+    os.environ["THROTTLE_RATE"] = str(args.throttle)
+    os.environ.setdefault("METRICS_PORT", "0")
+    import bot as bot_module
+
+    session = LoadSession()
+    bot = Bot(token="42:LOADTEST", session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dp = bot_module.create_dispatcher()
+    test = LoadTest(dp, bot, session)
+
+    try:
+        elapsed = await test.run(args.users, args.concurrency, args.think_ms / 1000)
+    finally:
+        await dp.storage.close()
+        if runner is not None:
+            await runner.cleanup()
+
+    shed = sum(getattr(middleware, "shed", 0) for middleware in dp.update.outer_middleware)
+    report = build_report(test, elapsed)
+    report["shed"] = shed
+    report["storage_dir"] = storage_dir
+    print_report(report, dict(server.stats) if server else {}, shed)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота с поддельным Mail.gw")
+    parser.add_argument("--users", type=int, default=500, help="Количество синтетических пользователей")
+    parser.add_argument("--concurrency", type=int, default=100, help="Пользователей одновременно")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Пауза пользователя между шагами")
+    parser.add_argument("--throttle", type=float, default=0.0,
+                        help="Интервал антиспама (0 - выключен, иначе часть команд будет отклонена)")
+    parser.add_argument("--mailgw-url", default="", help="Внешний fake Mail.gw; по умолчанию запускается встроенный")
+    parser.add_argument("--json", default="", help="Сохранить итоги в JSON-файл")
+    parser.add_argument("--log-level", default="CRITICAL", help="Уровень логов бота во время прогона")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    report = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Воспроизведение записанного трафика (RECORD_TRAFFIC_FILE): обновления подаются в
+Dispatcher.feed_update с исходными интервалами (или ускоренно), Mail.gw заменяется
+локальным сервером, который отдает записанные ответы с записанной задержкой.
+В конце выводится время обработки по командам: в записи и при воспроизведении
+
+Запуск из корня проекта:
+    python tools/replay.py storage/traffic.jsonl.gz             # в реальном времени
+    python tools/replay.py storage/traffic.jsonl.gz --speed 10  # в 10 раз быстрее
+    python tools/replay.py storage/traffic.jsonl.gz --speed 0   # без пауз, все сразу
+
+Хранилище пишется во временную папку; пользователи, у которых на момент записи
+была почта, создаются в нем заранее
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.default import DefaultBotProperties  # noqa: E402
+from aiogram.enums import ParseMode  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from tools.load_test import LoadSession, percentile  # noqa: E402
+
+# Интервал антиспама для записей, в заголовке которых нет настроек
+DEFAULT_THROTTLE = 2.0
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Записи из файла; оборванный конец файла (процесс не завершился штатно) пропускается"""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    except (EOFError, json.JSONDecodeError) as e:
+        print(f"Запись {path} оборвана: {e}")
+
+
+class Recording:
+    """Содержимое файла записи"""
+
+    def __init__(self, path: str):
+        self.header: Dict[str, Any] = {}
+        self.updates: List[Dict[str, Any]] = []
+        self.mailgw: List[Dict[str, Any]] = []
+        for record in read_records(path):
+            kind = record.get("k")
+            if kind == "h":
+                self.header = record
+            elif kind == "u":
+                self.updates.append(record)
+            elif kind == "m":
+                self.mailgw.append(record)
+        self.updates.sort(key=lambda record: record["t"])
+        self.mailgw.sort(key=lambda record: record["t"])
+
+
+class RecordedMailGw:
+    """
+    Сервер с записанными ответами Mail.gw. Ответ ищется по методу и пути, затем по шаблону
+    эндпоинта; если записанные ответы закончились, повторяется последний
+    """
+
+    def __init__(self, speed: float):
+        self.speed = speed
+        self.by_path: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = defaultdict(deque)
+        self.by_label: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = defaultdict(deque)
+        self.last: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.records: List[Dict[str, Any]] = []
+        self.misses = 0
+        self.base_url = ""
+
+    def load(self, records: List[Dict[str, Any]]):
+        """Очереди ответов; вызывается после настройки окружения (шаблоны эндпоинтов из api_client)"""
+        for record in records:
+            record = dict(record, used=False)
+            self.records.append(record)
+            self.by_path[(record["m"], record["p"])].append(record)
+            self.by_label[(record["m"], self._label(record["p"]))].append(record)
+
+    def unused(self) -> Dict[str, int]:
+        """Записанные ответы, которые не запросили при воспроизведении: {метод и эндпоинт: число}"""
+        counts: Dict[str, int] = defaultdict(int)
+        for record in self.records:
+            if not record["used"]:
+                counts[f"{record['m']} {self._label(record['p'])}"] += 1
+        return dict(counts)
+
+    @staticmethod
+    def _label(path: str) -> str:
+        # Импорт здесь: модули бота читают настройки при импорте, а BASE_URL известен после запуска сервера
+        from services.api_client import endpoint_label
+        return endpoint_label(path)
+
+    @staticmethod
+    def _pop(records: Deque[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        while records:
+            record = records.popleft()
+            if not record["used"]:
+                record["used"] = True
+                return record
+        return None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        label_key = (request.method, self._label(request.path))
+        record = self._pop(self.by_path[(request.method, request.path)]) or self._pop(self.by_label[label_key])
+        if record is None:
+            record = self.last.get(label_key)
+        if record is None:
+            self.misses += 1
+            return web.json_response({"code": 404, "message": "Not recorded"}, status=404)
+        self.last[label_key] = record
+
+        if self.speed > 0:
+            await asyncio.sleep(record["dur"] / self.speed)
+        if record["st"] == "error":
+            return web.json_response({"code": 503, "message": "Recorded connection error"}, status=503)
+        status = int(record["st"])
+        if record["d"] is None:
+            return web.Response(status=status)
+        return web.json_response(record["d"], status=status)
+
+    async def start(self, host: str = "127.0.0.1") -> web.AppRunner:
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, 0)
+        await site.start()
+        self.base_url = f"http://{host}:{runner.addresses[0][1]}"
+        return runner
+
+
+def seed_storage(updates: List[Dict[str, Any]]):
+    """Состояние пользователей на момент их первого появления в записи"""
+    from utils.storage_utils import LANGUAGES, storage_engine
+    from utils.user_record import UserRecord
+
+    now = int(time.time())
+    users = {}
+    languages = {}
+    for record in updates:
+        state = record.get("s")
+        if not state:
+            continue
+        user_id = state["uid"]
+        languages[str(user_id)] = state.get("lang", "ru")
+        if state.get("mail"):
+            users[user_id] = UserRecord(
+                user_id, f"{'x' * 10}@replay.test", "x" * 12, "replay", "0" * 24,
+                state.get("lang", "ru"), now, now, now
+            )
+    with storage_engine.transaction():
+        storage_engine.put_users(users.values())
+        for user_id, language in languages.items():
+            storage_engine.set_item(LANGUAGES, user_id, language)
+
+
+def update_label(update: Dict[str, Any], buttons: Dict[str, str]) -> str:
+    """Команда, кнопка или callback, по которым группируется время обработки"""
+    message = update.get("message")
+    if message and message.get("text"):
+        text = message["text"]
+        if text.startswith("/"):
+            return text.split(maxsplit=1)[0].split("@", 1)[0]
+        if text in buttons:
+            return f"button:{buttons[text]}"
+        return "text"
+    callback = update.get("callback_query")
+    if callback and callback.get("data"):
+        return "cb:" + callback["data"].split(":", 1)[0]
+    return "other"
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    recording = Recording(args.recording)
+    if not recording.updates:
+        print("В записи нет обновлений")
+        return {}
+
+    server = RecordedMailGw(args.speed)
+    runner = await server.start()
+
+    # Настройки читаются при импорте бота, поэтому окружение готовится заранее
+    storage_dir = tempfile.mkdtemp(prefix="mailbot-replay-")
+    os.environ["BASE_URL"] = server.base_url
+    os.environ["STORAGE_DIR"] = storage_dir
+    os.environ["RECORD_TRAFFIC_FILE"] = ""
+    recorded_settings = dict(recording.header.get("settings", {}))
+    if args.throttle is not None:
+        recorded_settings["throttle_rate"] = args.throttle
+    for name, value in recorded_settings.items():
+        os.environ[name.upper()] = str(value)
+    # Антиспам в масштабе записи: при ускорении интервал сокращается
+    throttle = float(recorded_settings.get("throttle_rate", DEFAULT_THROTTLE))
+    os.environ["THROTTLE_RATE"] = str(throttle / args.speed if args.speed > 0 else 0)
+    os.environ.setdefault("METRICS_PORT", "0")
+    if recording.header.get("admins"):
+        os.environ["ADMIN_IDS"] = ",".join(map(str, recording.header["admins"]))
+
+    from aiogram.types import Update
+    import bot as bot_module
+    from filters.button_filter import BUTTON_ACTIONS
+
+    server.load(recording.mailgw)
+    seed_storage(recording.updates)
+    session = LoadSession()
+    bot = Bot(token="42:REPLAY", session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dp = bot_module.create_dispatcher()
+
+    recorded: Dict[str, List[float]] = defaultdict(list)
+    replayed: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+
+    async def feed(label: str, update: Update):
+        start = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            errors[label] += 1
+        replayed[label].append(time.perf_counter() - start)
+
+    loop = asyncio.get_running_loop()
+    tasks = []
+    start = loop.time()
+    try:
+        for record in recording.updates:
+            if args.speed > 0:
+                delay = start + record["t"] / args.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            label = update_label(record["d"], BUTTON_ACTIONS)
+            recorded[label].append(record["dur"])
+            tasks.append(asyncio.create_task(feed(label, Update.model_validate(record["d"]))))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - start
+    finally:
+        await dp.storage.close()
+        await runner.cleanup()
+
+    commands = {}
+    for label in sorted(recorded):
+        before = sorted(recorded[label])
+        after = sorted(replayed[label])
+        commands[label] = {
+            "count": len(after),
+            "errors": errors.get(label, 0),
+            "recorded_p50_ms": percentile(before, 0.5),
+            "recorded_p95_ms": percentile(before, 0.95),
+            "p50_ms": percentile(after, 0.5),
+            "p95_ms": percentile(after, 0.95),
+            "p99_ms": percentile(after, 0.99),
+        }
+    total = sum(row["count"] for row in commands.values())
+    unused = server.unused()
+    report = {
+        "recording": args.recording,
+        "speed": args.speed,
+        "settings": dict(recorded_settings, throttle_rate=throttle),
+        "updates": total,
+        "elapsed_s": elapsed,
+        "throughput_ups": total / elapsed if elapsed else 0.0,
+        "mailgw_responses": len(recording.mailgw),
+        "mailgw_misses": server.misses,
+        "mailgw_unused": sum(unused.values()),
+        "mailgw_unused_by_endpoint": unused,
+        "commands": commands,
+    }
+    print_report(report)
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(
+        f"\nОбновлений: {report['updates']} за {report['elapsed_s']:.2f} с "
+        f"({report['throughput_ups']:.1f} upd/s, скорость x{report['speed']:g}), "
+        f"ответов Mail.gw в записи: {report['mailgw_responses']}, не найдено: {report['mailgw_misses']}, "
+        f"не запрошено: {report['mailgw_unused']}"
+    )
+    print("Настройки: " + ", ".join(f"{name}={value}" for name, value in report["settings"].items()))
+    if report["mailgw_unused"]:
+        # Обработка пошла иначе, чем при записи (другие настройки, антиспам, порядок)
+        print("Не запрошенные ответы Mail.gw: " + ", ".join(
+            f"{label} x{count}" for label, count in sorted(report["mailgw_unused_by_endpoint"].items())
+        ))
+    print()
+    print(f"{'команда':<26}{'кол-во':>8}{'ошибки':>8}{'запись p50':>12}{'запись p95':>12}"
+          f"{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}")
+    for label, row in report["commands"].items():
+        print(
+            f"{label:<26}{row['count']:>8}{row['errors']:>8}{row['recorded_p50_ms']:>12.1f}"
+            f"{row['recorded_p95_ms']:>12.1f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанного трафика бота")
+    parser.add_argument("recording", help="Файл записи (.jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Ускорение относительно записи (0 - без пауз и без задержек Mail.gw)")
+    parser.add_argument("--throttle", type=float, default=None,
+                        help="Интервал антиспама в масштабе записи (делится на --speed); по умолчанию из записи")
+    parser.add_argument("--json", default="", help="Сохранить итоги в JSON-файл")
+    parser.add_argument("--log-level", default="CRITICAL", help="Уровень логов бота во время прогона")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    report = asyncio.run(run(args))
+    if args.json and report:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Межпроцессная блокировка файлов хранилища, атомарная запись и обнаружение изменений
+"""
+
+import json
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Callable, Generic, Iterator, Optional, Tuple, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows: многопроцессный режим не поддерживается, блокировка не нужна
+    fcntl = None
+
+T = TypeVar("T")
+
+# Счетчик записей файла: 8 байт в начале файла блокировки
+_GENERATION = struct.Struct("<Q")
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False) -> Iterator[None]:
+    """
+    Advisory-блокировка (fcntl.flock) на файле path + ".lock"
+
+    :param path: Путь к защищаемому файлу
+    :param shared: Разделяемая блокировка (для чтения) вместо эксклюзивной
+    """
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def write_json_atomic(path: str, data: Any, **dump_kwargs):
+    """Записать JSON во временный файл и атомарно заменить им исходный"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_kwargs)
+        os.replace(tmp_path, path)
+        bump_generation(path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_bytes_atomic(path: str, payload: bytes):
+    """Записать готовое содержимое во временный файл и атомарно заменить им исходный"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        bump_generation(path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_generation(path: str) -> int:
+    """Счетчик атомарных записей файла (общий для всех процессов); 0 - записей еще не было"""
+    if fcntl is None:
+        return 0
+    try:
+        with open(f"{path}.lock", "rb") as f:
+            raw = f.read(_GENERATION.size)
+    except FileNotFoundError:
+        return 0
+    return _GENERATION.unpack(raw)[0] if len(raw) == _GENERATION.size else 0
+
+
+def bump_generation(path: str) -> int:
+    """
+    Увеличить счетчик записей файла. Вызывается после каждой атомарной записи,
+    писатель держит эксклюзивную блокировку
+    """
+    if fcntl is None:
+        return 0
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        raw = os.pread(fd, _GENERATION.size, 0)
+        generation = (_GENERATION.unpack(raw)[0] if len(raw) == _GENERATION.size else 0) + 1
+        os.pwrite(fd, _GENERATION.pack(generation), 0)
+    finally:
+        os.close(fd)
+    return generation
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Отпечаток версии файла без чтения содержимого: счетчик записей, inode, mtime и размер.
+    Номер inode может быть переиспользован, а mtime грубее частоты записей, поэтому
+    надежность обеспечивает счетчик; остальные поля ловят запись в обход блокировки
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return read_generation(path), stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class CachedFile(Generic[T]):
+    """
+    Разобранное содержимое файла в памяти. Перечитывается, только если файл изменился -
+    в том числе в другом процессе; проверка стоит двух системных вызовов, а не разбора файла
+    """
+
+    def __init__(self, path: str, load: Callable[[], T]):
+        """
+        :param path: Путь к файлу
+        :param load: Чтение и разбор файла
+        """
+        self.path = path
+        self.load = load
+        self.value: Optional[T] = None
+        self.stamp: Optional[Tuple[int, int, int, int]] = None
+        # Номер версии содержимого в этом процессе: растет при каждой перезагрузке и записи
+        self.version = 0
+
+    def get(self) -> T:
+        """Содержимое файла (общий объект: изменять только вместе с записью через stored)"""
+        # Отпечаток снимается до чтения: если файл заменят во время чтения, следующий вызов перечитает его
+        stamp = file_stamp(self.path)
+        if self.value is None or stamp != self.stamp:
+            self.value = self.load()
+            self.stamp = stamp
+            self.version += 1
+        return self.value
+
+    def stored(self, value: T):
+        """Файл записан этим процессом (под блокировкой): value становится актуальным содержимым"""
+        self.value = value
+        self.stamp = file_stamp(self.path)
+        self.version += 1
+
+    def invalidate(self):
+        """Сбросить кэш: следующее обращение перечитает файл"""
+        self.value = None
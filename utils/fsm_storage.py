@@ -0,0 +1,193 @@
+"""
+Персистентное FSM-хранилище поверх хранилища бота (utils.storage_engine) с кэшем в памяти
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Mapping, Optional, Set
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from utils.memory import memory_inspector
+from utils.metrics import metrics
+from utils.storage_utils import FSM_STATES, storage_engine
+
+logger = logging.getLogger(__name__)
+
+FSM_FLUSH_LATENCY = metrics.histogram(
+    "storage_operation_duration_seconds", "Время чтения и записи файлов хранилища", ("file", "operation")
+)
+
+# Как часто искать брошенные состояния (не реже, чем раз в TTL)
+SWEEP_INTERVAL = 60.0
+
+
+class EngineFSMStorage(BaseStorage):
+    """
+    FSM-хранилище: чтение всегда из кэша в памяти, изменения записываются в пространство
+    имен fsm_states хранилища бота отложенно (write-behind), одной транзакцией в потоке.
+    Брошенные состояния удаляются периодической проверкой TTL.
+
+    Кэш каждого процесса содержит состояния всех воркеров, поэтому удаление в хранилище
+    условное: запись удаляется, только если там не появилась более новая версия
+    """
+
+    def __init__(self, ttl: float, flush_interval: float):
+        """
+        :param ttl: Время жизни неизменяемого состояния в секундах
+        :param flush_interval: Задержка перед записью изменений в хранилище
+        """
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.key_builder = DefaultKeyBuilder(with_destiny=True)
+        self.records: Optional[Dict[str, Dict[str, Any]]] = None
+        self.dirty: Set[str] = set()
+        # Удаленные из кэша ключи: удалять в хранилище версии не новее этого времени
+        self.tombstones: Dict[str, float] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+        self.sweep_task: Optional[asyncio.Task] = None
+        memory_inspector.register("fsm_records", lambda: self.records or {})
+        metrics.callback(
+            "fsm_records", "Количество состояний FSM в кэше",
+            lambda: len(self.records) if self.records is not None else 0
+        )
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Однократная загрузка состояний из хранилища в кэш и запуск проверки TTL"""
+        if self.records is not None:
+            return self.records
+
+        # Значения хранилища общие с его кэшем: записи копируются, потому что меняются на месте
+        self.records = {key: dict(record) for key, record in storage_engine.items(FSM_STATES).items()}
+        if self.records:
+            logger.info(f"Loaded {len(self.records)} FSM records from storage")
+
+        self._expire(time.time())
+        self.sweep_task = asyncio.create_task(self._sweep())
+        return self.records
+
+    def _expire(self, now: float):
+        """Удаление состояний, которые не менялись дольше TTL"""
+        expired = [
+            key for key, record in self.records.items()
+            if now - record.get("updated_at", 0) > self.ttl
+        ]
+        for key in expired:
+            self._delete(key, self.records[key].get("updated_at", 0))
+        if expired:
+            logger.debug(f"Expired {len(expired)} FSM records")
+
+    async def _sweep(self):
+        """Периодическое удаление брошенных состояний: к ним больше не обращаются"""
+        while True:
+            await asyncio.sleep(min(SWEEP_INTERVAL, self.ttl))
+            self._expire(time.time())
+
+    def _get_record(self, key: StorageKey) -> Optional[Dict[str, Any]]:
+        """Получить запись из кэша с проверкой TTL"""
+        records = self._load()
+        record_key = self.key_builder.build(key)
+        record = records.get(record_key)
+
+        if record is not None and time.time() - record.get("updated_at", 0) > self.ttl:
+            self._delete(record_key, record.get("updated_at", 0))
+            return None
+        return record
+
+    def _update_record(self, key: StorageKey, **fields):
+        """Изменить запись в кэше и запланировать запись в хранилище"""
+        records = self._load()
+        record_key = self.key_builder.build(key)
+        record = records.setdefault(record_key, {"state": None, "data": {}})
+        record.update(fields)
+        record["updated_at"] = time.time()
+
+        # Пустые записи не храним
+        if record["state"] is None and not record["data"]:
+            self._delete(record_key, record["updated_at"])
+            return
+
+        self.tombstones.pop(record_key, None)
+        self._mark_dirty(record_key)
+
+    def _delete(self, record_key: str, version: float):
+        """Удалить запись из кэша и запланировать удаление версий не новее version"""
+        del self.records[record_key]
+        self.tombstones[record_key] = version
+        self._mark_dirty(record_key)
+
+    def _mark_dirty(self, record_key: str):
+        """Пометить запись измененной и запустить отложенную запись"""
+        self.dirty.add(record_key)
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        """Запись накопленных изменений после паузы (и изменений, сделанных во время записи)"""
+        while self.dirty:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """
+        Записать измененные ключи в хранилище. Каждый процесс пишет только свои ключи
+        (пользователи распределены по воркерам), поэтому записи других процессов не затираются
+        """
+        if not self.dirty or self.records is None:
+            return
+
+        dirty, self.dirty = self.dirty, set()
+        # Снимок изменений берется в event loop: поток не читает кэш, который меняют обработчики
+        updates = {key: dict(self.records[key]) for key in dirty if key in self.records}
+        deletes = {key: self.tombstones[key] for key in dirty if key not in self.records}
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, updates, deletes)
+            FSM_FLUSH_LATENCY.labels("fsm_storage", "write").observe(time.perf_counter() - start)
+            logger.debug(f"Flushed {len(dirty)} FSM records")
+        except Exception as e:
+            logger.error(f"Error saving FSM storage: {e}")
+            self.dirty |= dirty
+            return
+
+        for key, version in deletes.items():
+            if self.tombstones.get(key) == version:
+                del self.tombstones[key]
+
+    @staticmethod
+    def _write(updates: Dict[str, Dict[str, Any]], deletes: Dict[str, float]):
+        """Применить изменения одной транзакцией (выполняется в потоке)"""
+        with storage_engine.transaction():
+            for key, record in updates.items():
+                storage_engine.set_item(FSM_STATES, key, record)
+            for key, version in deletes.items():
+                stored = storage_engine.get_item(FSM_STATES, key)
+                if stored is not None and stored.get("updated_at", 0) <= version:
+                    storage_engine.delete_item(FSM_STATES, key)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._update_record(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get_record(key)
+        return record["state"] if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        self._update_record(key, data=data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get_record(key)
+        return record["data"].copy() if record else {}
+
+    async def close(self) -> None:
+        for task in (self.sweep_task, self.flush_task):
+            if task is not None and not task.done():
+                task.cancel()
+        await self.flush()
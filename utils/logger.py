@@ -2,42 +2,112 @@
 Настройка логирования для бота
 """
 
+import atexit
 import logging
 import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from typing import Optional
 
+from config.settings import settings
+
+# Фоновый поток, который пишет записи из очереди в файл и консоль
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+class _LoopQueueHandler(QueueHandler):
+    """
+    Обработчик для event loop: только кладет запись в очередь. Форматирование
+    (время, трейсбек) выполняется в потоке QueueListener
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Аргументы подставляем сразу: объекты могут измениться до записи в файл
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def _file_handler(path: str) -> logging.Handler:
+    """Файловый обработчик с ротацией по размеру или по времени"""
+    if settings.log_rotation == "time":
+        return TimedRotatingFileHandler(
+            filename=path,
+            when=settings.log_rotation_when,
+            backupCount=settings.log_backup_count,
+            encoding='utf-8'
+        )
+    return RotatingFileHandler(
+        filename=path,
+        mode='a',
+        maxBytes=settings.log_max_bytes,
+        backupCount=settings.log_backup_count,
+        encoding='utf-8'
+    )
+
+
+def setup_logging(log_file: str = "bot.log"):
+    """
+    Настройка системы логирования
+
+    :param log_file: Имя файла в папке logs (у каждого процесса свой файл, иначе ротация конфликтует)
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
 
-def setup_logging():
-    """Настройка системы логирования"""
     # Создаем папку для логов если её нет
     log_dir = "logs"
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
-    
+
+    level = logging.getLevelName(settings.log_level.upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+
     # Настройка форматирования
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
-    
-    # Настройка логирования в файл
-    file_handler = logging.FileHandler(
-        filename=os.path.join(log_dir, 'bot.log'), 
-        mode='a', 
-        encoding='utf-8'
-    )
+
+    # Настройка логирования в файл с ротацией
+    file_handler = _file_handler(os.path.join(log_dir, log_file))
     file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.INFO)
-    
+    file_handler.setLevel(level)
+
     # Настройка логирования в консоль
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.INFO)
-    
+    console_handler.setLevel(level)
+
+    # В event loop только очередь; запись на диск и в консоль - в отдельном потоке
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
     # Настройка корневого логгера
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-    
+    root_logger.setLevel(level)
+    _queue_handler = _LoopQueueHandler(log_queue)
+    root_logger.addHandler(_queue_handler)
+
     # Отключаем излишне подробные логи от aiogram
     logging.getLogger('aiogram').setLevel(logging.WARNING)
     logging.getLogger('aiohttp').setLevel(logging.WARNING)
+
+
+def stop_logging():
+    """Дописать оставшиеся в очереди записи и остановить поток логирования"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
@@ -0,0 +1,170 @@
+"""
+Оценка памяти, занятой кэшами и структурами процесса, и снимки tracemalloc
+"""
+
+import logging
+import os
+import sys
+import tracemalloc
+from collections import deque
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Сколько элементов контейнера измерять; размер остальных оценивается по среднему
+SAMPLE_ITEMS = 200
+
+
+def approx_sizeof(obj: Any, depth: int = 4) -> int:
+    """
+    Приблизительный размер объекта вместе с вложенными данными (байт).
+    Для больших контейнеров измеряется выборка элементов, результат экстраполируется
+    """
+    size = sys.getsizeof(obj)
+    if depth <= 0:
+        return size
+
+    if isinstance(obj, dict):
+        items = list(islice(obj.items(), SAMPLE_ITEMS))
+        measured = sum(approx_sizeof(k, depth - 1) + approx_sizeof(v, depth - 1) for k, v in items)
+        total = len(obj)
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        items = list(islice(obj, SAMPLE_ITEMS))
+        measured = sum(approx_sizeof(item, depth - 1) for item in items)
+        total = len(obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return size + approx_sizeof(vars(obj), depth - 1)
+    elif hasattr(obj, "__slots__"):
+        return size + sum(
+            approx_sizeof(getattr(obj, slot), depth - 1) for slot in obj.__slots__ if hasattr(obj, slot)
+        )
+    else:
+        return size
+
+    if not items:
+        return size
+    return size + measured * total // len(items)
+
+
+def process_rss() -> int:
+    """Текущий RSS процесса в байтах (0, если недоступно)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # На Linux ru_maxrss в КБ, на macOS в байтах; это пиковое значение
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+def _location(frame: tracemalloc.Frame) -> str:
+    """Короткое место аллокации: путь относительно проекта или последние части пути"""
+    filename = frame.filename
+    if filename.startswith(os.getcwd()):
+        filename = os.path.relpath(filename)
+    else:
+        filename = "/".join(filename.replace("\\", "/").split("/")[-3:])
+    return f"{filename}:{frame.lineno}"
+
+
+class MemoryInspector:
+    """
+    Реестр структур в памяти процесса (кэши, таблицы, очереди) и управление tracemalloc.
+    Модули регистрируют свои структуры сами при создании
+    """
+
+    def __init__(self):
+        self.structures: Dict[str, Callable[[], Any]] = {}
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+
+    def register(self, name: str, getter: Callable[[], Any]):
+        """
+        Зарегистрировать структуру для отчета
+
+        :param getter: Возвращает объект (словарь, список...) в момент измерения
+        """
+        self.structures[name] = getter
+
+    def report(self) -> List[Tuple[str, int, int]]:
+        """Размеры структур: (имя, элементов, приблизительно байт), по убыванию размера"""
+        rows = []
+        for name, getter in list(self.structures.items()):
+            try:
+                obj = getter()
+                items = len(obj) if hasattr(obj, "__len__") else 1
+                rows.append((name, items, approx_sizeof(obj)))
+            except Exception as e:
+                logger.error(f"Failed to measure {name}: {e}")
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows
+
+    # tracemalloc
+
+    @property
+    def tracing(self) -> bool:
+        """Включен ли tracemalloc"""
+        return tracemalloc.is_tracing()
+
+    def start_tracing(self, frames: int = 10):
+        """Включить tracemalloc и запомнить базовый снимок"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.baseline = self._snapshot()
+        logger.info("tracemalloc включен, базовый снимок сохранен")
+
+    def stop_tracing(self):
+        """Выключить tracemalloc и освободить снимок"""
+        self.baseline = None
+        tracemalloc.stop()
+        logger.info("tracemalloc выключен")
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        """Снимок без служебных аллокаций самого tracemalloc"""
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def top_allocations(self, limit: int = 10) -> List[str]:
+        """Места с наибольшим объемом живых аллокаций"""
+        stats = self._snapshot().statistics("lineno")
+        return [f"{stat.size / 1024:9.1f} KiB {stat.count:>7} {_location(stat.traceback[0])}" for stat in stats[:limit]]
+
+    def diff_allocations(self, limit: int = 10) -> List[str]:
+        """Наибольший прирост аллокаций относительно базового снимка"""
+        if self.baseline is None:
+            return []
+        stats = self._snapshot().compare_to(self.baseline, "lineno")
+        return [
+            f"{stat.size_diff / 1024:+9.1f} KiB {stat.count_diff:>+7} {_location(stat.traceback[0])}"
+            for stat in stats[:limit]
+        ]
+
+
+# Глобальный инспектор памяти
+memory_inspector = MemoryInspector()
+
+
+def _structure_metrics(index: int) -> Dict[tuple, float]:
+    """Значения метрик по структурам: index 1 - элементы, 2 - байты"""
+    return {(row[0],): row[index] for row in memory_inspector.report()}
+
+
+metrics.callback(
+    "memory_structure_items", "Количество элементов в структурах процесса",
+    lambda: _structure_metrics(1), ("structure",)
+)
+metrics.callback(
+    "memory_structure_bytes", "Приблизительный размер структур процесса",
+    lambda: _structure_metrics(2), ("structure",)
+)
+metrics.callback("process_resident_memory_bytes", "RSS процесса", process_rss)
@@ -0,0 +1,81 @@
+"""
+Хранилище бота с заменяемыми бэкендами: json (совместимые с прежними версиями файлы),
+journal (журнал изменений + снимок), sqlite и memory (без диска)
+"""
+
+from typing import Any, Dict, Iterable, Iterator, Type
+
+from utils.storage_engine.base import StorageBackend
+from utils.storage_engine.journal import JournalBackend
+from utils.storage_engine.json_backend import JsonBackend
+from utils.storage_engine.memory import MemoryBackend
+from utils.storage_engine.snapshot import DictSnapshot, StorageSnapshot
+from utils.storage_engine.sqlite import SqliteBackend
+from utils.user_record import UserRecord
+
+BACKENDS: Dict[str, Type[StorageBackend]] = {
+    JsonBackend.name: JsonBackend,
+    JournalBackend.name: JournalBackend,
+    SqliteBackend.name: SqliteBackend,
+    MemoryBackend.name: MemoryBackend,
+}
+
+# Пространства имен и документы, которые использует бот (для переноса и резервных копий)
+NAMESPACES = ("user_languages", "broadcast_jobs", "fsm_states")
+DOCUMENTS = ("stats", "banned_users", "broadcasts")
+
+
+def create_backend(name: str, directory: str, fmt: str = "json") -> StorageBackend:
+    """
+    Создать бэкенд хранилища
+
+    :param name: Имя бэкенда (ключ BACKENDS)
+    :param directory: Папка с файлами хранилища
+    :param fmt: Формат файлов (json/compact) для бэкендов, которые пишут файлы сами
+    """
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend: {name}") from None
+    return backend_class(directory, fmt)
+
+
+def dump_snapshot(snapshot: StorageSnapshot) -> Iterator[Dict[str, Any]]:
+    """Содержимое среза в виде операций (формат journal.log и резервных копий)"""
+    for record in snapshot.iter_users():
+        yield {"u": record.user_id, "r": record.to_dict()}
+    for namespace in NAMESPACES:
+        for key, value in snapshot.items(namespace).items():
+            yield {"n": namespace, "k": key, "v": value}
+    for name in DOCUMENTS:
+        value = snapshot.get_doc(name)
+        if value is not None:
+            yield {"d": name, "v": value}
+
+
+def load_operations(target: StorageBackend, operations: Iterable[Dict[str, Any]]) -> int:
+    """Применить операции dump_snapshot одной транзакцией; возвращает число операций"""
+    count = 0
+    with target.transaction():
+        for op in operations:
+            if "u" in op:
+                target.put_user(UserRecord.from_dict(op["u"], op["r"]))
+            elif "n" in op:
+                target.set_item(op["n"], op["k"], op["v"])
+            elif "d" in op:
+                target.put_doc(op["d"], op["v"])
+            count += 1
+    return count
+
+
+def copy_storage(source: StorageBackend, target: StorageBackend):
+    """Перенести все данные из одного бэкенда в другой (согласованный срез, одна транзакция целевого)"""
+    with source.snapshot() as snapshot:
+        load_operations(target, dump_snapshot(snapshot))
+
+
+__all__ = [
+    'StorageBackend', 'JsonBackend', 'JournalBackend', 'SqliteBackend', 'MemoryBackend',
+    'StorageSnapshot', 'DictSnapshot', 'BACKENDS', 'NAMESPACES', 'DOCUMENTS', 'create_backend',
+    'dump_snapshot', 'load_operations', 'copy_storage'
+]
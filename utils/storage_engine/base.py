@@ -0,0 +1,221 @@
+"""
+Интерфейс хранилища бота и общие части бэкендов
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from utils.metrics import metrics
+from utils.storage_engine.snapshot import StorageSnapshot
+from utils.user_record import UserRecord
+
+STORAGE_LATENCY = metrics.histogram(
+    "storage_operation_duration_seconds", "Время чтения и записи файлов хранилища", ("file", "operation")
+)
+STORAGE_BYTES = metrics.counter(
+    "storage_bytes_total", "Объем прочитанных и записанных данных хранилища", ("file", "operation")
+)
+
+
+def observe(label: str, operation: str, start: float, size: int):
+    """Учесть операцию с файлом хранилища в метриках"""
+    STORAGE_LATENCY.labels(label, operation).observe(time.perf_counter() - start)
+    STORAGE_BYTES.labels(label, operation).inc(size)
+
+
+class StorageBackend(ABC):
+    """
+    Хранилище бота: записи пользователей, словари по пространствам имен (языки пользователей,
+    задачи рассылок) и небольшие документы (статистика, бан-лист, история рассылок).
+
+    Изменения выполняются в транзакции: она эксклюзивна между процессами, вложенная транзакция
+    присоединяется к внешней, изменения становятся видны другим процессам при выходе из внешней
+    и отменяются, если из нее вылетело исключение. Изменение вне транзакции открывает свою.
+
+    Значения, которые возвращают методы чтения (кроме get_user), могут быть общими с кэшем
+    бэкенда - их нельзя изменять; для изменения нужно сохранить новое значение
+    """
+
+    name = ""
+
+    def __init__(self):
+        self._mutex = threading.RLock()
+        self._depth = 0
+        self._changed = False
+        # Счетчик зафиксированных транзакций с изменениями (в этом процессе)
+        self.generation = 0
+
+    # Транзакции
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Эксклюзивная транзакция (между процессами и потоками)"""
+        with self._mutex:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+
+            self._begin()
+            self._depth = 1
+            try:
+                yield
+                if self._changed:
+                    self._commit()
+                    self.generation += 1
+            except BaseException:
+                # В том числе ошибка записи: данные в памяти возвращаются к состоянию на диске
+                self._rollback()
+                raise
+            finally:
+                self._changed = False
+                self._depth = 0
+                self._end()
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._depth > 0
+
+    def _begin(self):
+        """Начало внешней транзакции: захват межпроцессной блокировки и актуализация данных"""
+
+    def _commit(self):
+        """Запись изменений внешней транзакции (вызывается, только если они были)"""
+
+    def _rollback(self):
+        """Отмена изменений внешней транзакции"""
+
+    def _end(self):
+        """Освобождение блокировки (после commit или rollback)"""
+
+    def close(self):
+        """Закрыть файлы и соединения"""
+
+    # Пользователи
+
+    def get_user(self, user_id: int) -> Optional[UserRecord]:
+        """Копия записи пользователя"""
+        record = self._get_user(user_id)
+        return record.copy() if record is not None else None
+
+    def put_user(self, record: UserRecord):
+        """Сохранить запись (в хранилище попадает копия)"""
+        with self.transaction():
+            self._put_user(record.copy())
+            self._changed = True
+
+    def put_users(self, records: Iterable[UserRecord]):
+        """Сохранить много записей одной транзакцией"""
+        with self.transaction():
+            for record in records:
+                self._put_user(record.copy())
+            self._changed = True
+
+    def delete_user(self, user_id: int) -> Optional[UserRecord]:
+        """Удалить запись; возвращает удаленную запись или None"""
+        with self.transaction():
+            record = self._delete_user(user_id)
+            if record is not None:
+                self._changed = True
+            return record
+
+    def iter_users(self) -> Iterator[UserRecord]:
+        """Все записи в произвольном порядке (не изменять)"""
+        return self._iter_users()
+
+    def user_ids(self) -> List[int]:
+        """ID всех пользователей по возрастанию"""
+        return sorted(record.user_id for record in self._iter_users())
+
+    def count_users(self) -> int:
+        return self._count_users()
+
+    def cached_users(self) -> Dict[int, UserRecord]:
+        """Записи, которые бэкенд держит в памяти (для инспектора памяти)"""
+        return {}
+
+    def snapshot(self) -> StorageSnapshot:
+        """
+        Согласованный срез для долгих чтений: не блокирует запись и не меняется после нее.
+        Срез нужно закрыть (with storage.snapshot() as snapshot: ...)
+        """
+        with self._mutex:
+            if self._depth:
+                raise RuntimeError("Storage snapshot inside a transaction")
+            return self._snapshot()
+
+    # Словари по пространствам имен (ключи - строки)
+
+    def get_item(self, namespace: str, key: str, default: Any = None) -> Any:
+        return self._get_item(namespace, key, default)
+
+    def set_item(self, namespace: str, key: str, value: Any):
+        with self.transaction():
+            self._set_item(namespace, key, value)
+            self._changed = True
+
+    def delete_item(self, namespace: str, key: str) -> bool:
+        with self.transaction():
+            deleted = self._delete_item(namespace, key)
+            if deleted:
+                self._changed = True
+            return deleted
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        """Копия словаря пространства имен"""
+        return self._items(namespace)
+
+    # Документы
+
+    def get_doc(self, name: str, default: Any = None) -> Any:
+        """Документ (не изменять: для изменения сохранить копию через put_doc)"""
+        return self._get_doc(name, default)
+
+    def put_doc(self, name: str, value: Any):
+        with self.transaction():
+            self._put_doc(name, value)
+            self._changed = True
+
+    # Реализация бэкенда
+
+    @abstractmethod
+    def _snapshot(self) -> StorageSnapshot: ...
+
+    @abstractmethod
+    def _get_user(self, user_id: int) -> Optional[UserRecord]: ...
+
+    @abstractmethod
+    def _put_user(self, record: UserRecord): ...
+
+    @abstractmethod
+    def _delete_user(self, user_id: int) -> Optional[UserRecord]: ...
+
+    @abstractmethod
+    def _iter_users(self) -> Iterator[UserRecord]: ...
+
+    @abstractmethod
+    def _count_users(self) -> int: ...
+
+    @abstractmethod
+    def _get_item(self, namespace: str, key: str, default: Any) -> Any: ...
+
+    @abstractmethod
+    def _set_item(self, namespace: str, key: str, value: Any): ...
+
+    @abstractmethod
+    def _delete_item(self, namespace: str, key: str) -> bool: ...
+
+    @abstractmethod
+    def _items(self, namespace: str) -> Dict[str, Any]: ...
+
+    @abstractmethod
+    def _get_doc(self, name: str, default: Any) -> Any: ...
+
+    @abstractmethod
+    def _put_doc(self, name: str, value: Any): ...
@@ -0,0 +1,239 @@
+"""
+Журнальное хранилище: изменение дописывается в конец журнала, а не перезаписывает весь файл.
+Журнал периодически сворачивается в снимок
+"""
+
+import json
+import logging
+import os
+import time
+from contextlib import AbstractContextManager
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from utils import storage_format
+from utils.file_lock import file_lock, read_generation, write_bytes_atomic
+from utils.storage_engine.base import observe
+from utils.storage_engine.memory import MemoryBackend
+from utils.user_record import UserRecord, decode_users, encode_users
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_NAME = "journal.snapshot"
+LOG_NAME = "journal.log"
+# Журнал сворачивается, когда он больше снимка (но не раньше этого размера)
+COMPACT_MIN_BYTES = 1 << 20
+
+
+class JournalBackend(MemoryBackend):
+    """
+    Данные в памяти процесса + снимок на диске + журнал изменений (JSONL).
+    Операции журнала - новые значения целиком, поэтому повторное применение безопасно.
+    Другие процессы дочитывают журнал с последней позиции; свертка заменяет файл журнала
+    (новый inode и счетчик записей), и тогда данные перечитываются со снимка
+    """
+
+    name = "journal"
+
+    def __init__(self, directory: str, fmt: str = storage_format.FORMAT_JSON):
+        super().__init__()
+        self.fmt = fmt
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.log_path = os.path.join(directory, LOG_NAME)
+        # Версия файла журнала, до которой дочитаны данные: (inode, счетчик записей) и позиция
+        self._log_version: Optional[tuple] = None
+        self._log_offset = 0
+        self._snapshot_size = 0
+        self._pending: List[bytes] = []
+        self._lock: Optional[AbstractContextManager] = None
+        os.makedirs(directory, exist_ok=True)
+        self._reload()
+
+    # Чтение с диска
+
+    def _log_file_version(self, f: BinaryIO) -> tuple:
+        return os.fstat(f.fileno()).st_ino, read_generation(self.log_path)
+
+    def _snapshot_version(self) -> tuple:
+        # Данные меняются своей транзакцией или дочитыванием и перечитыванием журнала
+        return self.generation, self._log_version, self._log_offset
+
+    def _sync(self):
+        # Внутри транзакции (под блокировкой) данные уже актуальны
+        if not self._depth:
+            self._refresh()
+
+    def _refresh(self):
+        """Дочитать журнал или перечитать все после свертки в другом процессе"""
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            if self._log_version is not None:
+                self._reload()
+            return
+        if self._log_version is None or (stat.st_ino, read_generation(self.log_path)) != self._log_version:
+            self._reload()
+        elif stat.st_size > self._log_offset:
+            with open(self.log_path, 'rb') as f:
+                self._apply_log(f)
+
+    def _reload(self):
+        """Снимок + весь журнал"""
+        self._users, self._maps, self._docs = {}, {}, {}
+        self._log_version = None
+        self._log_offset = 0
+        try:
+            # Журнал открывается до чтения снимка: если между ними пройдет свертка, снимок будет
+            # новее журнала, а повторное применение старых операций к нему ничего не меняет
+            log = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            log = None
+        try:
+            self._load_snapshot()
+            if log is not None:
+                self._log_version = self._log_file_version(log)
+                self._apply_log(log)
+        finally:
+            if log is not None:
+                log.close()
+
+    def _load_snapshot(self):
+        start = time.perf_counter()
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            self._snapshot_size = 0
+            return
+        try:
+            snapshot = storage_format.decode(payload)
+        except ValueError as e:
+            logger.error(f"Error loading journal snapshot: {e}")
+            snapshot = {}
+        self._users = decode_users(snapshot.get("users", {}))
+        self._maps = snapshot.get("items", {})
+        self._docs = snapshot.get("docs", {})
+        self._snapshot_size = len(payload)
+        observe("journal_snapshot", "read", start, len(payload))
+
+    def _apply_log(self, f: BinaryIO):
+        """Применить операции журнала с текущей позиции; недописанная последняя строка ждет следующего раза"""
+        start = time.perf_counter()
+        f.seek(self._log_offset)
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line:
+                continue
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                # Оборванная при сбое запись: следующие строки целые
+                logger.error(f"Skipping corrupted journal entry: {e}")
+        self._log_offset += end
+        if end:
+            observe("journal", "read", start, end)
+
+    def _apply(self, op: Dict[str, Any]):
+        if "u" in op:
+            user_id = op["u"]
+            if "r" in op:
+                self._users[user_id] = UserRecord.from_dict(user_id, op["r"])
+            else:
+                self._users.pop(user_id, None)
+        elif "n" in op:
+            items = self._maps.setdefault(op["n"], {})
+            if "v" in op:
+                items[op["k"]] = op["v"]
+            else:
+                items.pop(op["k"], None)
+        elif "d" in op:
+            self._docs[op["d"]] = op["v"]
+
+    # Транзакции
+
+    def _begin(self):
+        self._lock = file_lock(self.log_path)
+        self._lock.__enter__()
+        try:
+            self._refresh()
+        except BaseException:
+            self._end()
+            raise
+
+    def _commit(self):
+        payload = b"".join(self._pending)
+        start = time.perf_counter()
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # Одна запись на транзакцию: читатели без блокировки видят ее целиком или не видят
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view):]
+            if self._log_version is None:
+                self._log_version = (os.fstat(fd).st_ino, read_generation(self.log_path))
+        finally:
+            os.close(fd)
+        self._log_offset += len(payload)
+        observe("journal", "append", start, len(payload))
+
+        if self._log_offset > max(COMPACT_MIN_BYTES, self._snapshot_size):
+            try:
+                self._compact()
+            except OSError as e:
+                # Изменения уже в журнале; свертка повторится при следующей записи
+                logger.error(f"Journal compaction failed: {e}")
+
+    def _end(self):
+        super()._end()
+        self._pending.clear()
+        if self._lock is not None:
+            lock, self._lock = self._lock, None
+            lock.__exit__(None, None, None)
+
+    def compact(self):
+        """Свернуть журнал в снимок"""
+        with self.transaction():
+            self._compact()
+
+    def _compact(self):
+        start = time.perf_counter()
+        payload = storage_format.encode(
+            {"users": encode_users(self._users), "items": self._maps, "docs": self._docs}, self.fmt
+        )
+        write_bytes_atomic(self.snapshot_path, payload)
+        # Новый пустой журнал: другие процессы увидят смену файла и перечитают снимок
+        write_bytes_atomic(self.log_path, b"")
+        self._log_version = (os.stat(self.log_path).st_ino, read_generation(self.log_path))
+        self._log_offset = 0
+        self._snapshot_size = len(payload)
+        observe("journal_snapshot", "write", start, len(payload))
+        logger.info(f"Journal compacted: {len(self._users)} users, {len(payload)} bytes")
+
+    # Изменения: значение в памяти + операция в журнал
+
+    def _log(self, op: Dict[str, Any]):
+        self._pending.append(json.dumps(op, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+
+    def _put_user(self, record: UserRecord):
+        super()._put_user(record)
+        self._log({"u": record.user_id, "r": record.to_dict()})
+
+    def _delete_user(self, user_id: int) -> Optional[UserRecord]:
+        record = super()._delete_user(user_id)
+        if record is not None:
+            self._log({"u": user_id})
+        return record
+
+    def _set_item(self, namespace: str, key: str, value: Any):
+        super()._set_item(namespace, key, value)
+        self._log({"n": namespace, "k": key, "v": value})
+
+    def _delete_item(self, namespace: str, key: str) -> bool:
+        deleted = super()._delete_item(namespace, key)
+        if deleted:
+            self._log({"n": namespace, "k": key})
+        return deleted
+
+    def _put_doc(self, name: str, value: Any):
+        super()._put_doc(name, value)
+        self._log({"d": name, "v": value})
@@ -0,0 +1,174 @@
+"""
+Хранилище в двух файлах: user_storage.json (пользователи) и bot_storage.json (словари и документы).
+Формат файлов совместим с прежними версиями бота
+"""
+
+import logging
+import os
+import time
+from contextlib import ExitStack
+from typing import Any, Dict, Iterator, Optional
+
+from utils import storage_format
+from utils.file_lock import CachedFile, file_lock, write_bytes_atomic
+from utils.storage_engine.base import StorageBackend, observe
+from utils.storage_engine.snapshot import DictSnapshot
+from utils.user_record import UserRecord, decode_users, encode_users
+
+logger = logging.getLogger(__name__)
+
+USERS_FILE_NAME = "user_storage.json"
+BOT_FILE_NAME = "bot_storage.json"
+
+
+class JsonBackend(StorageBackend):
+    """
+    Файлы целиком держатся в памяти и перечитываются, только если их записал другой процесс.
+    Каждая транзакция с изменениями перезаписывает измененный файл целиком.
+    В bot_storage.json пространство имен - словарь верхнего уровня, документ - значение верхнего уровня
+    """
+
+    name = "json"
+
+    def __init__(self, directory: str, fmt: str = storage_format.FORMAT_JSON):
+        super().__init__()
+        self.fmt = fmt
+        self.users_path = os.path.join(directory, USERS_FILE_NAME)
+        self.bot_path = os.path.join(directory, BOT_FILE_NAME)
+        self._users: CachedFile[Dict[int, UserRecord]] = CachedFile(self.users_path, self.read_users_file)
+        self._bot: CachedFile[Dict[str, Any]] = CachedFile(self.bot_path, self.read_bot_file)
+        self._users_dirty = False
+        self._bot_dirty = False
+        self._locks: Optional[ExitStack] = None
+        self._last_snapshot: Optional[DictSnapshot] = None
+        os.makedirs(directory, exist_ok=True)
+
+    # Файлы
+
+    def _read(self, path: str) -> Any:
+        """Прочитать файл в любом формате; отсутствующий или поврежденный файл - пустые данные"""
+        start = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+            data = storage_format.decode(payload)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.error(f"Error loading storage {path}: {e}")
+            return {}
+        observe(os.path.splitext(os.path.basename(path))[0], "read", start, len(payload))
+        return data
+
+    def _write(self, path: str, data: Any):
+        start = time.perf_counter()
+        payload = storage_format.encode(data, self.fmt)
+        write_bytes_atomic(path, payload)
+        observe(os.path.splitext(os.path.basename(path))[0], "write", start, len(payload))
+
+    def read_users_file(self) -> Dict[int, UserRecord]:
+        return decode_users(self._read(self.users_path))
+
+    def read_bot_file(self) -> Dict[str, Any]:
+        return self._read(self.bot_path)
+
+    def write_users_file(self):
+        """Записать файл пользователей из памяти (вызывается под блокировкой)"""
+        users = self._users.get()
+        self._write(self.users_path, encode_users(users))
+        self._users.stored(users)
+
+    def write_bot_file(self):
+        bot = self._bot.get()
+        self._write(self.bot_path, bot)
+        self._bot.stored(bot)
+
+    # Транзакции
+
+    def _begin(self):
+        # Порядок блокировок одинаков во всех процессах: сначала пользователи, потом данные бота
+        stack = ExitStack()
+        stack.enter_context(file_lock(self.users_path))
+        stack.enter_context(file_lock(self.bot_path))
+        self._locks = stack
+
+    def _commit(self):
+        if self._users_dirty:
+            self.write_users_file()
+        if self._bot_dirty:
+            self.write_bot_file()
+
+    def _rollback(self):
+        # Изменения сделаны прямо в кэше: он перечитается с диска
+        if self._users_dirty:
+            self._users.invalidate()
+        if self._bot_dirty:
+            self._bot.invalidate()
+
+    def _end(self):
+        self._users_dirty = False
+        self._bot_dirty = False
+        if self._locks is not None:
+            locks, self._locks = self._locks, None
+            locks.close()
+
+    # Пользователи
+
+    def cached_users(self) -> Dict[int, UserRecord]:
+        return self._users.value or {}
+
+    def _snapshot(self) -> DictSnapshot:
+        users, bot = self._users.get(), self._bot.get()
+        # Версия кэша меняется при каждой записи и при перечитывании файла
+        version = (self._users.version, self._bot.version)
+        if self._last_snapshot is None or self._last_snapshot.version != version:
+            # Пространства имен в кэше меняются на месте - копируются, документы заменяются целиком
+            bot = {key: dict(value) if isinstance(value, dict) else value for key, value in bot.items()}
+            self._last_snapshot = DictSnapshot(version, dict(users), bot, bot)
+        return self._last_snapshot
+
+    def _get_user(self, user_id: int) -> Optional[UserRecord]:
+        return self._users.get().get(user_id)
+
+    def _put_user(self, record: UserRecord):
+        self._users.get()[record.user_id] = record
+        self._users_dirty = True
+
+    def _delete_user(self, user_id: int) -> Optional[UserRecord]:
+        record = self._users.get().pop(user_id, None)
+        if record is not None:
+            self._users_dirty = True
+        return record
+
+    def _iter_users(self) -> Iterator[UserRecord]:
+        return iter(list(self._users.get().values()))
+
+    def _count_users(self) -> int:
+        return len(self._users.get())
+
+    # Словари и документы
+
+    def _get_item(self, namespace: str, key: str, default: Any) -> Any:
+        return self._bot.get().get(namespace, {}).get(key, default)
+
+    def _set_item(self, namespace: str, key: str, value: Any):
+        self._bot.get().setdefault(namespace, {})[key] = value
+        self._bot_dirty = True
+
+    def _delete_item(self, namespace: str, key: str) -> bool:
+        items = self._bot.get().get(namespace, {})
+        if key not in items:
+            return False
+        del items[key]
+        self._bot_dirty = True
+        return True
+
+    def _items(self, namespace: str) -> Dict[str, Any]:
+        return dict(self._bot.get().get(namespace, {}))
+
+    def _get_doc(self, name: str, default: Any) -> Any:
+        return self._bot.get().get(name, default)
+
+    def _put_doc(self, name: str, value: Any):
+        self._bot.get()[name] = value
+        self._bot_dirty = True
@@ -0,0 +1,111 @@
+"""
+Хранилище в памяти процесса: без диска, для разработки, бенчмарков и основы журнального бэкенда
+"""
+
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from utils.storage_engine.base import StorageBackend
+from utils.storage_engine.snapshot import DictSnapshot
+from utils.user_record import UserRecord
+
+_MISSING = object()
+
+
+class MemoryBackend(StorageBackend):
+    """Данные в словарях; ничего не сохраняется между запусками"""
+
+    name = "memory"
+
+    def __init__(self, directory: str = "", fmt: str = ""):
+        super().__init__()
+        self._users: Dict[int, UserRecord] = {}
+        self._maps: Dict[str, Dict[str, Any]] = {}
+        self._docs: Dict[str, Any] = {}
+        # Прежние значения, измененные в текущей транзакции: (словарь, ключ, значение)
+        self._undo: List[Tuple[Dict, Any, Any]] = []
+        # Последний срез: пока данные не менялись, все читатели получают его же
+        self._last_snapshot: Optional[DictSnapshot] = None
+
+    def _sync(self):
+        """Подтянуть изменения других процессов (в памяти их нет)"""
+
+    def _remember(self, container: Dict, key: Any):
+        self._undo.append((container, key, container.get(key, _MISSING)))
+
+    def _rollback(self):
+        for container, key, value in reversed(self._undo):
+            if value is _MISSING:
+                container.pop(key, None)
+            else:
+                container[key] = value
+
+    def _end(self):
+        self._undo.clear()
+
+    def cached_users(self) -> Dict[int, UserRecord]:
+        return self._users
+
+    def _snapshot_version(self) -> Hashable:
+        return self.generation
+
+    def _snapshot(self) -> DictSnapshot:
+        self._sync()
+        version = self._snapshot_version()
+        if self._last_snapshot is None or self._last_snapshot.version != version:
+            self._last_snapshot = DictSnapshot(
+                version, dict(self._users), {namespace: dict(items) for namespace, items in self._maps.items()},
+                dict(self._docs)
+            )
+        return self._last_snapshot
+
+    def _get_user(self, user_id: int) -> Optional[UserRecord]:
+        self._sync()
+        return self._users.get(user_id)
+
+    def _put_user(self, record: UserRecord):
+        self._remember(self._users, record.user_id)
+        self._users[record.user_id] = record
+
+    def _delete_user(self, user_id: int) -> Optional[UserRecord]:
+        if user_id not in self._users:
+            return None
+        self._remember(self._users, user_id)
+        return self._users.pop(user_id)
+
+    def _iter_users(self) -> Iterator[UserRecord]:
+        self._sync()
+        # Список: хранилище можно менять, пока вызывающий код перебирает записи
+        return iter(list(self._users.values()))
+
+    def _count_users(self) -> int:
+        self._sync()
+        return len(self._users)
+
+    def _get_item(self, namespace: str, key: str, default: Any) -> Any:
+        self._sync()
+        return self._maps.get(namespace, {}).get(key, default)
+
+    def _set_item(self, namespace: str, key: str, value: Any):
+        items = self._maps.setdefault(namespace, {})
+        self._remember(items, key)
+        items[key] = value
+
+    def _delete_item(self, namespace: str, key: str) -> bool:
+        items = self._maps.get(namespace, {})
+        if key not in items:
+            return False
+        self._remember(items, key)
+        del items[key]
+        return True
+
+    def _items(self, namespace: str) -> Dict[str, Any]:
+        self._sync()
+        return dict(self._maps.get(namespace, {}))
+
+    def _get_doc(self, name: str, default: Any) -> Any:
+        self._sync()
+        return self._docs.get(name, default)
+
+    def _put_doc(self, name: str, value: Any):
+        self._remember(self._docs, name)
+        self._docs[name] = value
@@ -0,0 +1,83 @@
+"""
+Срезы хранилища для долгих чтений: рассылки, пересчет статистики, резервные копии
+"""
+
+import bisect
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Hashable, Iterator, List, Optional
+
+from utils.user_record import UserRecord
+
+
+class StorageSnapshot(ABC):
+    """
+    Согласованное состояние хранилища на момент создания. Последующие записи в срез не попадают
+    и не ждут, пока его читают; читать срез можно из другого потока (по одному потоку за раз).
+    Возвращаемые значения общие для всех читателей среза - их нельзя изменять
+    """
+
+    def __init__(self, version: Hashable):
+        # Версия данных: одинаковая версия - одинаковое содержимое (в пределах процесса)
+        self.version = version
+        self._sorted_ids: Optional[List[int]] = None
+
+    def __enter__(self) -> "StorageSnapshot":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Освободить ресурсы среза"""
+
+    @abstractmethod
+    def iter_users(self) -> Iterator[UserRecord]: ...
+
+    @abstractmethod
+    def count_users(self) -> int: ...
+
+    def user_ids(self) -> List[int]:
+        """ID всех пользователей по возрастанию"""
+        return sorted(record.user_id for record in self.iter_users())
+
+    def user_ids_after(self, after: Optional[int], limit: int) -> List[int]:
+        """
+        Страница ID по возрастанию: не больше limit штук, строго больше after (None - с начала).
+        Список ID сортируется один раз на срез; бэкенды с индексом читают только страницу
+        """
+        if self._sorted_ids is None:
+            self._sorted_ids = self.user_ids()
+        start = 0 if after is None else bisect.bisect_right(self._sorted_ids, after)
+        return self._sorted_ids[start:start + limit]
+
+    @abstractmethod
+    def items(self, namespace: str) -> Dict[str, Any]: ...
+
+    @abstractmethod
+    def get_doc(self, name: str, default: Any = None) -> Any: ...
+
+
+class DictSnapshot(StorageSnapshot):
+    """
+    Срез бэкендов, которые держат данные в памяти: копии словарей верхнего уровня (copy-on-write).
+    Записи и значения не копируются - бэкенды при изменении заменяют их, а не меняют на месте
+    """
+
+    def __init__(self, version: Hashable, users: Dict[int, UserRecord],
+                 maps: Dict[str, Dict[str, Any]], docs: Dict[str, Any]):
+        super().__init__(version)
+        self._users = users
+        self._maps = maps
+        self._docs = docs
+
+    def iter_users(self) -> Iterator[UserRecord]:
+        return iter(self._users.values())
+
+    def count_users(self) -> int:
+        return len(self._users)
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        return self._maps.get(namespace, {})
+
+    def get_doc(self, name: str, default: Any = None) -> Any:
+        return self._docs.get(name, default)
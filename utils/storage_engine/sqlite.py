@@ -0,0 +1,241 @@
+"""
+Хранилище в SQLite (режим WAL): точечные чтения и записи без загрузки всех данных в память
+"""
+
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.storage_engine.base import StorageBackend
+from utils.storage_engine.snapshot import StorageSnapshot
+from utils.user_record import UserRecord
+
+DATABASE_NAME = "storage.sqlite3"
+# Сколько ждать блокировку записи другого процесса (мс)
+BUSY_TIMEOUT_MS = 10_000
+# Размер страницы при переборе пользователей
+ITER_BATCH = 1000
+
+_USER_COLUMNS = (
+    "user_id", "email", "password", "token", "account_id", "lang",
+    "created_at", "updated_at", "mail_created_at", "extra",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL DEFAULT '',
+    password TEXT NOT NULL DEFAULT '',
+    token TEXT NOT NULL DEFAULT '',
+    account_id TEXT NOT NULL DEFAULT '',
+    lang TEXT NOT NULL DEFAULT 'ru',
+    created_at INTEGER NOT NULL DEFAULT 0,
+    updated_at INTEGER NOT NULL DEFAULT 0,
+    mail_created_at INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS docs (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _record(row: tuple) -> UserRecord:
+    record = UserRecord(*row[:-1])
+    if row[-1]:
+        record.extra = json.loads(row[-1])
+    return record
+
+
+def _iter_users(db: sqlite3.Connection) -> Iterator[UserRecord]:
+    # Постранично по ключу: курсор не держится открытым, пока вызывающий код работает с записями
+    query = f"SELECT {', '.join(_USER_COLUMNS)} FROM users WHERE user_id > ? ORDER BY user_id LIMIT {ITER_BATCH}"
+    after = -(1 << 63)
+    while True:
+        rows = db.execute(query, (after,)).fetchall()
+        for row in rows:
+            yield _record(row)
+        if len(rows) < ITER_BATCH:
+            return
+        after = rows[-1][0]
+
+
+def _user_ids(db: sqlite3.Connection) -> List[int]:
+    return [row[0] for row in db.execute("SELECT user_id FROM users ORDER BY user_id")]
+
+
+def _user_ids_after(db: sqlite3.Connection, after: Optional[int], limit: int) -> List[int]:
+    if after is None:
+        rows = db.execute("SELECT user_id FROM users ORDER BY user_id LIMIT ?", (limit,))
+    else:
+        rows = db.execute("SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?", (after, limit))
+    return [row[0] for row in rows]
+
+
+def _count_users(db: sqlite3.Connection) -> int:
+    return db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+def _items(db: sqlite3.Connection, namespace: str) -> Dict[str, Any]:
+    return {
+        key: json.loads(value)
+        for key, value in db.execute("SELECT key, value FROM items WHERE namespace = ?", (namespace,))
+    }
+
+
+def _get_doc(db: sqlite3.Connection, name: str, default: Any) -> Any:
+    row = db.execute("SELECT value FROM docs WHERE name = ?", (name,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+
+class SqliteSnapshot(StorageSnapshot):
+    """
+    Срез - читающая транзакция на отдельном соединении: в режиме WAL она видит данные на момент
+    начала и не мешает записи. Пока срез открыт, журнал WAL не сворачивается дальше его начала
+    """
+
+    def __init__(self, path: str, version: tuple):
+        super().__init__(version)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("BEGIN")
+        # Данные фиксируются первым чтением в транзакции (любой таблицы)
+        self.db.execute("SELECT 1 FROM docs LIMIT 1").fetchall()
+        self._count: Optional[int] = None
+
+    def close(self):
+        self.db.close()
+
+    def iter_users(self) -> Iterator[UserRecord]:
+        return _iter_users(self.db)
+
+    def count_users(self) -> int:
+        if self._count is None:
+            self._count = _count_users(self.db)
+        return self._count
+
+    def user_ids(self) -> List[int]:
+        return _user_ids(self.db)
+
+    def user_ids_after(self, after: Optional[int], limit: int) -> List[int]:
+        return _user_ids_after(self.db, after, limit)
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        return _items(self.db, namespace)
+
+    def get_doc(self, name: str, default: Any = None) -> Any:
+        return _get_doc(self.db, name, default)
+
+
+class SqliteBackend(StorageBackend):
+    """
+    Транзакция - BEGIN IMMEDIATE (блокировка записи между процессами делает сама SQLite).
+    Вне транзакции каждое чтение видит последние зафиксированные данные всех процессов
+    """
+
+    name = "sqlite"
+
+    def __init__(self, directory: str, fmt: str = ""):
+        super().__init__()
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, DATABASE_NAME)
+        # Соединение общее для потоков процесса: транзакции сериализуются блокировкой хранилища
+        self.db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.db.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # Транзакции
+
+    def _begin(self):
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def _commit(self):
+        self.db.execute("COMMIT")
+
+    def _rollback(self):
+        self.db.execute("ROLLBACK")
+
+    def _end(self):
+        # Транзакция без изменений: фиксировать нечего
+        if self.db.in_transaction:
+            self.db.execute("COMMIT")
+
+    def _snapshot(self) -> SqliteSnapshot:
+        # data_version меняется после записи других соединений, generation - после своей
+        data_version = self.db.execute("PRAGMA data_version").fetchone()[0]
+        return SqliteSnapshot(self.path, (data_version, self.generation))
+
+    # Пользователи
+
+    def _get_user(self, user_id: int) -> Optional[UserRecord]:
+        row = self.db.execute(
+            f"SELECT {', '.join(_USER_COLUMNS)} FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return _record(row) if row else None
+
+    def _put_user(self, record: UserRecord):
+        self.db.execute(
+            f"INSERT OR REPLACE INTO users ({', '.join(_USER_COLUMNS)}) VALUES ({', '.join('?' * len(_USER_COLUMNS))})",
+            (
+                record.user_id, record.email, record.password, record.token, record.account_id, record.lang,
+                record.created_at, record.updated_at, record.mail_created_at,
+                _dumps(record.extra) if record.extra else None,
+            ),
+        )
+
+    def _delete_user(self, user_id: int) -> Optional[UserRecord]:
+        record = self._get_user(user_id)
+        if record is not None:
+            self.db.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+        return record
+
+    def _iter_users(self) -> Iterator[UserRecord]:
+        return _iter_users(self.db)
+
+    def user_ids(self) -> List[int]:
+        return _user_ids(self.db)
+
+    def _count_users(self) -> int:
+        return _count_users(self.db)
+
+    # Словари и документы
+
+    def _get_item(self, namespace: str, key: str, default: Any) -> Any:
+        row = self.db.execute(
+            "SELECT value FROM items WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_item(self, namespace: str, key: str, value: Any):
+        self.db.execute(
+            "INSERT OR REPLACE INTO items (namespace, key, value) VALUES (?, ?, ?)", (namespace, key, _dumps(value))
+        )
+
+    def _delete_item(self, namespace: str, key: str) -> bool:
+        cursor = self.db.execute("DELETE FROM items WHERE namespace = ? AND key = ?", (namespace, key))
+        return cursor.rowcount > 0
+
+    def _items(self, namespace: str) -> Dict[str, Any]:
+        return _items(self.db, namespace)
+
+    def _get_doc(self, name: str, default: Any) -> Any:
+        return _get_doc(self.db, name, default)
+
+    def _put_doc(self, name: str, value: Any):
+        self.db.execute("INSERT OR REPLACE INTO docs (name, value) VALUES (?, ?)", (name, _dumps(value)))
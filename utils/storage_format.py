@@ -0,0 +1,52 @@
+"""
+Форматы файлов хранилища: читаемый JSON и компактный (минифицированный JSON, сжатый zlib)
+"""
+
+import json
+import struct
+import zlib
+from typing import Any
+
+# Читаемый JSON с отступами - удобно смотреть и править руками
+FORMAT_JSON = "json"
+# Заголовок MAGIC + длина несжатых данных (4 байта, big-endian), затем поток zlib
+FORMAT_COMPACT = "compact"
+FORMATS = (FORMAT_JSON, FORMAT_COMPACT)
+
+MAGIC = b"MBZ1"
+_HEADER = struct.Struct(">4sI")
+# Уровень 1: основная экономия места уже есть, а запись почти не замедляется
+COMPRESS_LEVEL = 1
+
+
+def encode(data: Any, fmt: str = FORMAT_JSON) -> bytes:
+    """Данные -> содержимое файла в формате fmt"""
+    if fmt == FORMAT_JSON:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    if fmt == FORMAT_COMPACT:
+        # Без indent json использует C-кодировщик - это основная часть выигрыша по времени
+        raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return _HEADER.pack(MAGIC, len(raw)) + zlib.compress(raw, COMPRESS_LEVEL)
+    raise ValueError(f"Unknown storage format: {fmt}")
+
+
+def detect(payload: bytes) -> str:
+    """Формат содержимого файла (по заголовку)"""
+    return FORMAT_COMPACT if payload[:len(MAGIC)] == MAGIC else FORMAT_JSON
+
+
+def decode(payload: bytes) -> Any:
+    """Содержимое файла в любом формате -> данные. Поврежденный файл - ValueError"""
+    if detect(payload) == FORMAT_JSON:
+        return json.loads(payload.decode("utf-8"))
+
+    if len(payload) < _HEADER.size:
+        raise ValueError("Truncated compact storage header")
+    _, size = _HEADER.unpack_from(payload)
+    try:
+        raw = zlib.decompress(payload[_HEADER.size:])
+    except zlib.error as e:
+        raise ValueError(f"Corrupted compact storage: {e}") from e
+    if len(raw) != size:
+        raise ValueError(f"Compact storage size mismatch: {len(raw)} != {size}")
+    return json.loads(raw)
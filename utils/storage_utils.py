@@ -1,336 +1,428 @@
 """
-Утилиты для работы с локальным хранилищем пользователей
+Утилиты для работы с хранилищем пользователей и данными бота (поверх utils.storage_engine)
 """
 
-import json
+import copy
 import os
 import logging
+import time
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Callable, Dict, Optional, Any, Iterator, List
+
+from config.settings import settings
+from utils.memory import memory_inspector
+from utils.storage_engine import StorageSnapshot, create_backend
+from utils.storage_engine.json_backend import BOT_FILE_NAME, USERS_FILE_NAME
+from utils.user_record import UserRecord
 
 logger = logging.getLogger(__name__)
 
-STORAGE_FILE = "storage/user_storage.json"
-BOT_STORAGE_FILE = "storage/bot_storage.json"
+# Файлы бэкенда json (и источник для переноса в другие бэкенды)
+STORAGE_FILE = os.path.join(settings.storage_dir, USERS_FILE_NAME)
+BOT_STORAGE_FILE = os.path.join(settings.storage_dir, BOT_FILE_NAME)
 
+# Счетчики, которые вычисляются из содержимого хранилища и пересчитываются при отсутствии
+DERIVED_COUNTERS = ("total_users", "active_sessions", "banned_users")
+# Счетчики событий: только увеличиваются
+EVENT_COUNTERS = ("created_emails", "total_broadcasts")
+# Размер кольцевого буфера почасовой статистики
+TREND_HOURS = 24
 
-def _ensure_storage_dir():
-    """Убедиться, что директория storage существует"""
-    os.makedirs(os.path.dirname(STORAGE_FILE), exist_ok=True)
+# Пространства имен и документы хранилища
+LANGUAGES = "user_languages"
+BROADCAST_JOBS = "broadcast_jobs"
+STATS = "stats"
+BANNED_USERS = "banned_users"
+BROADCASTS = "broadcasts"
+FSM_STATES = "fsm_states"
 
+# Глобальное хранилище (бэкенд выбирается в настройках)
+storage_engine = create_backend(settings.storage_backend, settings.storage_dir, settings.storage_format)
+memory_inspector.register("user_records", storage_engine.cached_users)
 
-def load_data() -> Dict[str, Dict[str, Any]]:
-    """Загружает данные из JSON файла"""
-    _ensure_storage_dir()
-    
-    if not os.path.exists(STORAGE_FILE):
-        logger.info(f"Storage file {STORAGE_FILE} doesn't exist, creating empty storage")
-        return {}
-    
-    try:
-        with open(STORAGE_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            logger.info(f"Loaded {len(data)} users from storage")
-            return data
-    except (json.JSONDecodeError, FileNotFoundError) as e:
-        logger.error(f"Error loading storage: {e}")
-        return {}
-
-
-def save_data(data: Dict[str, Dict[str, Any]]) -> bool:
-    """Сохраняет данные в JSON файл"""
-    _ensure_storage_dir()
-    
-    try:
-        with open(STORAGE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        logger.info(f"Saved {len(data)} users to storage")
-        return True
-    except Exception as e:
-        logger.error(f"Error saving storage: {e}")
-        return False
+# Обработчики изменений записей пользователей: callback(user_id, запись или None при удалении)
+_user_listeners: List[Callable[[int, Optional[UserRecord]], None]] = []
 
 
-def load_bot_data() -> Dict[str, Any]:
-    """Загружает данные бота из JSON файла"""
-    _ensure_storage_dir()
-    
-    if not os.path.exists(BOT_STORAGE_FILE):
-        logger.info(f"Bot storage file {BOT_STORAGE_FILE} doesn't exist, creating empty storage")
-        return {"user_languages": {}}
-    
-    try:
-        with open(BOT_STORAGE_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            logger.info(f"Loaded bot data from storage")
-            return data
-    except (json.JSONDecodeError, FileNotFoundError) as e:
-        logger.error(f"Error loading bot storage: {e}")
-        return {"user_languages": {}}
-
-
-def save_bot_data(data: Dict[str, Any]) -> bool:
-    """Сохраняет данные бота в JSON файл"""
-    _ensure_storage_dir()
-    
-    try:
-        with open(BOT_STORAGE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        logger.info(f"Saved bot data to storage")
-        return True
-    except Exception as e:
-        logger.error(f"Error saving bot storage: {e}")
-        return False
+def on_user_change(callback: Callable[[int, Optional[UserRecord]], None]):
+    """
+    Зарегистрировать обработчик изменений пользователей. Вызывается после фиксации
+    изменения в хранилище, поэтому должен быть быстрым и не менять запись
+    """
+    _user_listeners.append(callback)
+
 
+def _notify_user_change(user_id: int, record: Optional[UserRecord]):
+    """Уведомить обработчики об изменении пользователя"""
+    for callback in _user_listeners:
+        try:
+            callback(user_id, record)
+        except Exception as e:
+            logger.error(f"User change listener failed for {user_id}: {e}")
 
-def get_user(user_id: int) -> Optional[Dict[str, Any]]:
-    """Получает данные пользователя"""
-    data = load_data()
-    user_data = data.get(str(user_id))
-    
-    if user_data:
-        logger.info(f"Retrieved user {user_id}: email={user_data.get('email', 'N/A')}")
-    else:
-        logger.info(f"User {user_id} not found in storage")
-    
-    return user_data
+
+def get_user(user_id: int) -> Optional[UserRecord]:
+    """Получает данные пользователя (копию записи)"""
+    record = storage_engine.get_user(user_id)
+
+    if record:
+        logger.debug(f"Retrieved user {user_id}: email={record.email or 'N/A'}")
+        return record
+
+    logger.debug(f"User {user_id} not found in storage")
+    return None
 
 
 def update_user(user_id: int, **kwargs) -> bool:
     """Обновляет данные пользователя"""
-    data = load_data()
-    user_key = str(user_id)
-    
-    if user_key not in data:
-        data[user_key] = {}
-    
-    # Добавляем время последнего обновления
-    kwargs['updated_at'] = datetime.now().isoformat()
-    
-    # Если это новый пользователь, добавляем время создания
-    if 'created_at' not in data[user_key]:
-        kwargs['created_at'] = datetime.now().isoformat()
-    
-    data[user_key].update(kwargs)
-    
-    success = save_data(data)
-    if success:
-        logger.info(f"Updated user {user_id} with data: {list(kwargs.keys())}")
-    
-    return success
+    try:
+        with storage_engine.transaction():
+            now = int(time.time())
+
+            record = storage_engine.get_user(user_id)
+            is_new = record is None
+            if is_new:
+                # Если это новый пользователь, добавляем время создания
+                record = UserRecord(user_id, created_at=now)
+            had_email = bool(record.email)
+            previous_email = record.email
+
+            record.update(**kwargs)
+            # Добавляем время последнего обновления
+            record.updated_at = now
+
+            # Время создания почты: от него отсчитывается срок жизни аккаунта
+            if record.email and record.email != previous_email:
+                record.mail_created_at = now
+
+            storage_engine.put_user(record)
+            has_email = bool(record.email)
+            if is_new or had_email != has_email:
+                _record_stats(total_users=int(is_new), active_sessions=int(has_email) - int(had_email))
+    except Exception as e:
+        logger.error(f"Error saving storage: {e}")
+        return False
+
+    logger.info(f"Updated user {user_id} with data: {list(kwargs.keys())}")
+    _notify_user_change(user_id, record)
+    return True
 
 
 def delete_user(user_id: int) -> bool:
     """Удаляет пользователя из хранилища"""
-    data = load_data()
-    user_key = str(user_id)
-    
-    if user_key in data:
-        email = data[user_key].get('email', 'unknown')
-        del data[user_key]
-        success = save_data(data)
-        if success:
-            logger.info(f"Deleted user {user_id} (email: {email})")
-        return success
-    else:
+    try:
+        with storage_engine.transaction():
+            record = storage_engine.delete_user(user_id)
+            if record is not None:
+                _record_stats(total_users=-1, active_sessions=-int(bool(record.email)))
+    except Exception as e:
+        logger.error(f"Error saving storage: {e}")
+        return False
+
+    if record is None:
         logger.warning(f"User {user_id} not found for deletion")
         return False
 
+    logger.info(f"Deleted user {user_id} (email: {record.email or 'unknown'})")
+    _notify_user_change(user_id, None)
+    return True
+
 
 def user_exists(user_id: int) -> bool:
     """Проверяет, существует ли пользователь в хранилище"""
-    return get_user(user_id) is not None
+    return storage_engine.get_user(user_id) is not None
 
 
 def get_user_email(user_id: int) -> Optional[str]:
     """Получает email пользователя"""
-    user_data = get_user(user_id)
-    return user_data.get('email') if user_data else None
+    record = storage_engine.get_user(user_id)
+    return record.email or None if record else None
 
 
 def get_user_token(user_id: int) -> Optional[str]:
     """Получает токен пользователя"""
-    user_data = get_user(user_id)
-    return user_data.get('token') if user_data else None
-
-
-def get_all_users() -> Dict[str, Dict[str, Any]]:
-    """Получает всех пользователей (для административных целей)"""
-    return load_data()
-
-
-def cleanup_old_users(days: int = 7) -> int:
-    """Удаляет пользователей старше указанного количества дней"""
-    from datetime import datetime, timedelta
-    
-    data = load_data()
-    cutoff_date = datetime.now() - timedelta(days=days)
-    users_to_delete = []
-    
-    for user_id, user_data in data.items():
-        created_at_str = user_data.get('created_at')
-        if created_at_str:
-            try:
-                created_at = datetime.fromisoformat(created_at_str)
-                if created_at < cutoff_date:
-                    users_to_delete.append(user_id)
-            except ValueError:
-                logger.warning(f"Invalid date format for user {user_id}: {created_at_str}")
-    
-    for user_id in users_to_delete:
-        del data[user_id]
-    
-    if users_to_delete:
-        save_data(data)
-        logger.info(f"Cleaned up {len(users_to_delete)} old users")
-    
-    return len(users_to_delete)
+    record = storage_engine.get_user(user_id)
+    return record.token or None if record else None
+
+
+def iter_users() -> Iterator[UserRecord]:
+    """Все записи пользователей в произвольном порядке (не изменять)"""
+    return storage_engine.iter_users()
+
+
+def snapshot() -> StorageSnapshot:
+    """
+    Согласованный срез хранилища для долгих чтений (рассылки, резервные копии): не блокирует
+    запись и не меняется после нее. Использовать как with snapshot() as data: ...
+    """
+    return storage_engine.snapshot()
+
+
+def get_all_users() -> Dict[int, UserRecord]:
+    """Получает всех пользователей (для административных целей, копии записей из среза)"""
+    with storage_engine.snapshot() as data:
+        return {record.user_id: record.copy() for record in data.iter_users()}
+
+
+def count_users() -> int:
+    """Возвращает количество пользователей в хранилище"""
+    return storage_engine.count_users()
+
+
+def iter_user_ids(batch_size: int = 500, after: Optional[int] = None) -> Iterator[List[int]]:
+    """
+    Постранично выдает ID пользователей в порядке возрастания, не загружая весь список
+
+    :param batch_size: Размер одной пачки
+    :param after: Пропустить ID меньше или равные этому значению (для продолжения)
+    """
+    # Каждая страница читается из своего среза по курсору: рассылка не видит полузаписанных
+    # изменений и не держит срез открытым, пока отправляет сообщения
+    while True:
+        with storage_engine.snapshot() as data:
+            batch = data.user_ids_after(after, batch_size)
+        if not batch:
+            return
+        yield batch
+        after = batch[-1]
 
 
 def get_user_language(user_id: int) -> str:
-    """Получает язык пользователя из bot_storage"""
-    data = load_bot_data()
-    return data.get("user_languages", {}).get(str(user_id), "ru")
+    """Получает язык пользователя"""
+    return storage_engine.get_item(LANGUAGES, str(user_id), "ru")
 
 
 def set_user_language(user_id: int, language: str) -> bool:
-    """Устанавливает язык пользователя в bot_storage"""
-    data = load_bot_data()
-    
-    if "user_languages" not in data:
-        data["user_languages"] = {}
-    
-    data["user_languages"][str(user_id)] = language
-    
-    success = save_bot_data(data)
-    if success:
-        logger.info(f"Set language for user {user_id}: {language}")
-    
-    return success
+    """Устанавливает язык пользователя"""
+    try:
+        storage_engine.set_item(LANGUAGES, str(user_id), language)
+    except Exception as e:
+        logger.error(f"Error saving bot storage: {e}")
+        return False
+
+    logger.info(f"Set language for user {user_id}: {language}")
+    return True
+
+
+def _stats_ready(stats: Dict[str, Any]) -> bool:
+    """Проверяет, что вычисляемые счетчики уже есть в статистике"""
+    return all(counter in stats for counter in DERIVED_COUNTERS)
+
+
+def _load_stats() -> Dict[str, Any]:
+    """Копия статистики для изменения (документ хранилища изменять нельзя)"""
+    return copy.deepcopy(storage_engine.get_doc(STATS, {}))
+
+
+def _compute_stats(stats: Dict[str, Any]):
+    """Пересчет счетчиков по содержимому хранилища (однократно для старых данных)"""
+    stats.setdefault("created_at", datetime.now().isoformat())
+    total_users = active_sessions = 0
+    for record in storage_engine.iter_users():
+        total_users += 1
+        active_sessions += bool(record.email)
+    stats["total_users"] = total_users
+    stats["active_sessions"] = active_sessions
+    stats["banned_users"] = len(storage_engine.get_doc(BANNED_USERS, []))
+    stats["created_emails"] = max(stats.get("created_emails", 0), active_sessions)
+    stats["total_broadcasts"] = max(stats.get("total_broadcasts", 0), len(storage_engine.get_doc(BROADCASTS, [])))
+    logger.info(f"Rebuilt bot stats counters: {stats['total_users']} users")
+
+
+def _bump_stats(stats: Dict[str, Any], **deltas: int):
+    """
+    Изменяет счетчики статистики и почасовой кольцевой буфер
+
+    :param deltas: Изменения счетчиков; в почасовой буфер попадают только положительные
+    """
+    ready = _stats_ready(stats)
+    for counter, delta in deltas.items():
+        if counter in EVENT_COUNTERS or ready:
+            stats[counter] = stats.get(counter, 0) + delta
+
+    hour = int(time.time() // 3600)
+    trend = stats.setdefault("hourly", [])
+    if len(trend) < TREND_HOURS:
+        trend.extend([None] * (TREND_HOURS - len(trend)))
+
+    bucket = trend[hour % TREND_HOURS]
+    if not bucket or bucket.get("hour") != hour:
+        bucket = trend[hour % TREND_HOURS] = {"hour": hour}
+    for counter, delta in deltas.items():
+        if delta > 0:
+            bucket[counter] = bucket.get(counter, 0) + delta
+
+    stats["updated_at"] = datetime.now().isoformat()
+
+
+def _record_stats(**deltas: int):
+    """
+    Учесть изменение хранилища в статистике. Вызывается в транзакции изменения,
+    поэтому при отсутствии счетчиков их можно пересчитать по хранилищу
+    """
+    with storage_engine.transaction():
+        stats = _load_stats()
+        ready = _stats_ready(stats)
+        _bump_stats(stats, **deltas)
+        if not ready:
+            # Хранилище уже содержит это изменение, поэтому счетчики считаются после _bump_stats
+            _compute_stats(stats)
+        storage_engine.put_doc(STATS, stats)
 
 
 def get_bot_stats() -> Dict[str, Any]:
-    """Получает статистику бота из bot_storage"""
-    data = load_bot_data()
-    
-    if "stats" not in data:
-        data["stats"] = {
-            "total_users": 0,
-            "created_emails": 0,
-            "total_broadcasts": 0,
-            "created_at": datetime.now().isoformat()
-        }
-        save_bot_data(data)
-    
-    return data["stats"]
+    """Получает статистику бота (счетчики поддерживаются при изменениях)"""
+    stats = storage_engine.get_doc(STATS, {})
+    if _stats_ready(stats):
+        return stats
+
+    # Старое хранилище без счетчиков: однократный пересчет
+    with storage_engine.transaction():
+        stats = _load_stats()
+        if not _stats_ready(stats):
+            _compute_stats(stats)
+            storage_engine.put_doc(STATS, stats)
+        return stats
+
+
+def get_stats_trend(stats: Dict[str, Any], hours: int = TREND_HOURS) -> List[Dict[str, int]]:
+    """
+    Почасовая статистика за последние часы, от старых к новым
+
+    :param stats: Статистика из get_bot_stats()
+    :param hours: Количество часов (не больше TREND_HOURS)
+    :return: Список корзин {"hour": номер часа с начала эпохи, счетчик: прирост}
+    """
+    current = int(time.time() // 3600)
+    buckets = {bucket["hour"]: bucket for bucket in stats.get("hourly", []) if bucket}
+    return [
+        buckets.get(hour, {"hour": hour})
+        for hour in range(current - min(hours, TREND_HOURS) + 1, current + 1)
+    ]
 
 
 def update_bot_stats(stats: Dict[str, Any]) -> bool:
-    """Обновляет статистику бота в bot_storage"""
-    data = load_bot_data()
-    
-    if "stats" not in data:
-        data["stats"] = {}
-    
-    data["stats"].update(stats)
-    data["stats"]["updated_at"] = datetime.now().isoformat()
-    
-    success = save_bot_data(data)
-    if success:
-        logger.info(f"Updated bot stats: {list(stats.keys())}")
-    
-    return success
+    """Обновляет статистику бота"""
+    try:
+        with storage_engine.transaction():
+            current = _load_stats()
+            current.update(stats)
+            current["updated_at"] = datetime.now().isoformat()
+            storage_engine.put_doc(STATS, current)
+    except Exception as e:
+        logger.error(f"Error saving bot storage: {e}")
+        return False
+
+    logger.info(f"Updated bot stats: {list(stats.keys())}")
+    return True
 
 
 def get_banned_users() -> list:
     """Получает список заблокированных пользователей"""
-    data = load_bot_data()
-    return data.get("banned_users", [])
+    return list(storage_engine.get_doc(BANNED_USERS, []))
 
 
 def add_banned_user(user_id: int) -> bool:
     """Добавляет пользователя в список заблокированных"""
-    data = load_bot_data()
-    
-    if "banned_users" not in data:
-        data["banned_users"] = []
-    
-    if user_id not in data["banned_users"]:
-        data["banned_users"].append(user_id)
-        
-        success = save_bot_data(data)
-        if success:
-            logger.info(f"Added user {user_id} to banned list")
-        return success
-    else:
-        logger.warning(f"User {user_id} is already banned")
-        return True
+    try:
+        with storage_engine.transaction():
+            banned_users = list(storage_engine.get_doc(BANNED_USERS, []))
+            if user_id in banned_users:
+                logger.warning(f"User {user_id} is already banned")
+                return True
+
+            banned_users.append(user_id)
+            storage_engine.put_doc(BANNED_USERS, banned_users)
+            _record_stats(banned_users=1)
+    except Exception as e:
+        logger.error(f"Error saving bot storage: {e}")
+        return False
+
+    logger.info(f"Added user {user_id} to banned list")
+    return True
 
 
 def remove_banned_user(user_id: int) -> bool:
     """Удаляет пользователя из списка заблокированных"""
-    data = load_bot_data()
-    
-    if "banned_users" not in data:
-        data["banned_users"] = []
-    
-    if user_id in data["banned_users"]:
-        data["banned_users"].remove(user_id)
-        
-        success = save_bot_data(data)
-        if success:
-            logger.info(f"Removed user {user_id} from banned list")
-        return success
-    else:
-        logger.warning(f"User {user_id} is not in banned list")
-        return True
+    try:
+        with storage_engine.transaction():
+            banned_users = list(storage_engine.get_doc(BANNED_USERS, []))
+            if user_id not in banned_users:
+                logger.warning(f"User {user_id} is not in banned list")
+                return True
+
+            banned_users.remove(user_id)
+            storage_engine.put_doc(BANNED_USERS, banned_users)
+            _record_stats(banned_users=-1)
+    except Exception as e:
+        logger.error(f"Error saving bot storage: {e}")
+        return False
+
+    logger.info(f"Removed user {user_id} from banned list")
+    return True
 
 
 def is_user_banned(user_id: int) -> bool:
     """Проверяет, заблокирован ли пользователь"""
-    banned_users = get_banned_users()
-    return user_id in banned_users
+    return user_id in storage_engine.get_doc(BANNED_USERS, [])
 
 
 def add_broadcast_record(record: Dict[str, Any]) -> bool:
-    """Добавляет запись о рассылке в bot_storage"""
-    data = load_bot_data()
-    
-    if "broadcasts" not in data:
-        data["broadcasts"] = []
-    
-    data["broadcasts"].append(record)
-    
-    # Обновляем статистику
-    if "stats" not in data:
-        data["stats"] = {"total_broadcasts": 0}
-    
-    data["stats"]["total_broadcasts"] = data["stats"].get("total_broadcasts", 0) + 1
-    
-    success = save_bot_data(data)
-    if success:
-        logger.info(f"Added broadcast record by admin {record.get('admin_id')}")
-    
-    return success
+    """Добавляет запись о рассылке в историю"""
+    try:
+        with storage_engine.transaction():
+            history = list(storage_engine.get_doc(BROADCASTS, []))
+            history.append(record)
+            storage_engine.put_doc(BROADCASTS, history)
+
+            # Обновляем статистику
+            _record_stats(total_broadcasts=1)
+    except Exception as e:
+        logger.error(f"Error saving bot storage: {e}")
+        return False
+
+    logger.info(f"Added broadcast record by admin {record.get('admin_id')}")
+    return True
 
 
 def get_broadcast_history() -> list:
     """Получает историю рассылок"""
-    data = load_bot_data()
-    return data.get("broadcasts", [])
+    return list(storage_engine.get_doc(BROADCASTS, []))
+
+
+def save_broadcast_job(job: Dict[str, Any]) -> bool:
+    """Сохраняет состояние незавершенной рассылки (для продолжения после перезапуска)"""
+    try:
+        # Копия: задача рассылки меняет свой словарь между сохранениями
+        storage_engine.set_item(BROADCAST_JOBS, job["job_id"], dict(job))
+    except Exception as e:
+        logger.error(f"Error saving bot storage: {e}")
+        return False
+    return True
+
+
+def get_broadcast_jobs() -> Dict[str, Dict[str, Any]]:
+    """Получает незавершенные рассылки (копии: задачи рассылки изменяют их)"""
+    return {job_id: dict(job) for job_id, job in storage_engine.items(BROADCAST_JOBS).items()}
+
+
+def delete_broadcast_job(job_id: str) -> bool:
+    """Удаляет состояние рассылки после ее завершения"""
+    try:
+        storage_engine.delete_item(BROADCAST_JOBS, job_id)
+    except Exception as e:
+        logger.error(f"Error saving bot storage: {e}")
+        return False
+    return True
 
 
 def increment_email_counter() -> bool:
     """Увеличивает счетчик созданных email-адресов"""
-    data = load_bot_data()
-    
-    if "stats" not in data:
-        data["stats"] = {"created_emails": 0}
-    
-    data["stats"]["created_emails"] = data["stats"].get("created_emails", 0) + 1
-    
-    success = save_bot_data(data)
-    if success:
-        logger.info("Incremented email counter")
-    
-    return success
+    try:
+        _record_stats(created_emails=1)
+    except Exception as e:
+        logger.error(f"Error saving bot storage: {e}")
+        return False
+
+    logger.info("Incremented email counter")
+    return True
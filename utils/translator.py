@@ -2,26 +2,99 @@
 Утилиты для работы с переводами и локализацией
 """
 
+import asyncio
 import json
 import logging
+import string
 from pathlib import Path
-from typing import Dict, Any
+from typing import Callable, Dict, List, Union
+
+from utils.memory import memory_inspector
 
 logger = logging.getLogger(__name__)
 
-# Загружаем локали
+LOCALES_DIR = Path("locales")
+DEFAULT_LANGUAGE = "ru"
+
+# Исходные словари локалей
 LOCALES: Dict[str, Dict[str, str]] = {}
 
-def load_locales():
-    """Загрузка файлов локализации"""
-    global LOCALES
-    
-    locales_dir = Path("locales")
-    if not locales_dir.exists():
+# Скомпилированные таблицы: для каждого языка уже учтен fallback на язык по умолчанию.
+# Значение - готовая строка (без параметров) или предсвязанный str.format шаблона
+_COMPILED: Dict[str, Dict[str, Union[str, "_Template"]]] = {}
+
+# Время изменения файлов локалей на момент последней загрузки
+_mtimes: Dict[str, float] = {}
+
+# Обработчики, вызываемые после перезагрузки локалей (например, сброс кэша клавиатур)
+_reload_callbacks: List[Callable[[], None]] = []
+
+
+class _Template:
+    """Шаблон с параметрами: разобран один раз при компиляции"""
+
+    __slots__ = ("text", "format", "fields")
+
+    def __init__(self, text: str, fields: frozenset):
+        self.text = text
+        self.format = text.format
+        self.fields = fields
+
+
+def _compile_entry(text: str) -> Union[str, _Template]:
+    """Разобрать строку перевода: константа возвращается как есть, шаблон - как _Template"""
+    try:
+        fields = frozenset(
+            field_name for _, field_name, _, _ in string.Formatter().parse(text)
+            if field_name is not None
+        )
+    except ValueError:
+        return text
+
+    if not fields:
+        # Экранированные фигурные скобки раскрываются один раз
+        return text.format() if "{" in text or "}" in text else text
+    return _Template(text, fields)
+
+
+def _compile():
+    """Компиляция таблиц переводов с учетом fallback на язык по умолчанию"""
+    default = LOCALES.get(DEFAULT_LANGUAGE, {})
+    compiled = {}
+    for lang_code, locale_dict in LOCALES.items():
+        merged = {**default, **locale_dict}
+        compiled[lang_code] = {key: _compile_entry(text) for key, text in merged.items()}
+
+    _COMPILED.clear()
+    _COMPILED.update(compiled)
+
+
+def _current_mtimes() -> Dict[str, float]:
+    """Время изменения всех файлов локалей"""
+    return {str(path): path.stat().st_mtime for path in LOCALES_DIR.glob("*.json")}
+
+
+def on_locales_reload(callback: Callable[[], None]):
+    """Зарегистрировать обработчик перезагрузки локалей"""
+    _reload_callbacks.append(callback)
+
+
+def load_locales(force: bool = False) -> bool:
+    """
+    Загрузка файлов локализации. Повторный вызов перечитывает файлы только если они изменились
+
+    :param force: Перечитать файлы независимо от времени изменения
+    :return: True если локали были (пере)загружены
+    """
+    if not LOCALES_DIR.exists():
         logger.warning("Locales directory not found")
-        return
-    
-    for locale_file in locales_dir.glob("*.json"):
+        return False
+
+    mtimes = _current_mtimes()
+    if not force and mtimes == _mtimes:
+        return False
+
+    for locale_file in LOCALES_DIR.glob("*.json"):
         lang_code = locale_file.stem
         try:
             with open(locale_file, "r", encoding="utf-8") as f:
@@ -30,34 +103,55 @@ def load_locales():
         except Exception as e:
             logger.error(f"Failed to load locale {lang_code}: {e}")
 
+    _compile()
+    _mtimes.clear()
+    _mtimes.update(mtimes)
+
+    for callback in _reload_callbacks:
+        callback()
+    return True
+
+
+async def watch_locales(interval: float = 2.0):
+    """Фоновая задача: перезагрузка локалей при изменении файлов без перезапуска бота"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if load_locales():
+                logger.info("Locales reloaded")
+        except OSError as e:
+            logger.error(f"Failed to check locales: {e}")
+
 # Загружаем локали при импорте модуля
 load_locales()
+memory_inspector.register("locale_tables", lambda: _COMPILED)
 
 def t(key: str, lang: str = "ru", **kwargs) -> str:
     """
     Получить переведенную строку
-    
+
     :param key: Ключ перевода
     :param lang: Код языка (ru, en)
     :param kwargs: Параметры для форматирования строки
     :return: Переведенная строка
     """
-    # Получаем словарь для языка
-    locale_dict = LOCALES.get(lang, {})
-    
-    # Получаем шаблон строки
-    template = locale_dict.get(key, key)
-    
-    # Если ключ не найден в выбранном языке, пробуем русский
-    if template == key and lang != "ru":
-        template = LOCALES.get("ru", {}).get(key, key)
-    
+    table = _COMPILED.get(lang) or _COMPILED.get(DEFAULT_LANGUAGE)
+    if table is None:
+        return key
+
+    entry = table.get(key, key)
+    if entry.__class__ is str:
+        return entry
+
     # Форматируем строку с параметрами
+    if not entry.fields.issubset(kwargs):
+        logger.warning(f"Failed to format translation key '{key}' with kwargs {kwargs}: missing {set(entry.fields - kwargs.keys())}")
+        return entry.text
     try:
-        return template.format(**kwargs)
+        return entry.format(**kwargs)
     except (KeyError, ValueError) as e:
         logger.warning(f"Failed to format translation key '{key}' with kwargs {kwargs}: {e}")
-        return template
+        return entry.text
 
 def get_available_languages() -> Dict[str, str]:
     """Получить список доступных языков"""
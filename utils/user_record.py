@@ -0,0 +1,148 @@
+"""
+Типизированная запись пользователя и кодек формата файла хранилища
+"""
+
+import logging
+import sys
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGE = "ru"
+
+# Версия формата записей в файле хранилища (ключ не является ID, поэтому читается старыми версиями).
+# 1 (без ключа) - время ISO-строками, язык и время сохранялись всегда; 2 - время в секундах unix,
+# язык по умолчанию и нулевое время не сохраняются
+FORMAT_KEY = "_format"
+FORMAT_VERSION = 2
+
+
+def _intern_lang(lang: Any) -> str:
+    """Коды языков повторяются у всех пользователей - храним одну строку на код"""
+    return sys.intern(lang) if isinstance(lang, str) and lang else DEFAULT_LANGUAGE
+
+
+def to_epoch(value: Any) -> int:
+    """Время в секундах unix; старые записи хранили ISO-строки"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, str) and value:
+        try:
+            return int(datetime.fromisoformat(value).timestamp())
+        except ValueError:
+            return 0
+    return 0
+
+
+@dataclass(slots=True)
+class UserRecord:
+    """Запись пользователя: почта Mail.gw, язык и время изменений (unix time, секунды)"""
+
+    user_id: int
+    email: str = ""
+    password: str = ""
+    token: str = ""
+    account_id: str = ""
+    lang: str = DEFAULT_LANGUAGE
+    created_at: int = 0
+    updated_at: int = 0
+    mail_created_at: int = 0
+    # Поля, которых нет в модели (сохраняются как есть)
+    extra: Optional[Dict[str, Any]] = None
+
+    @property
+    def has_mail(self) -> bool:
+        """Есть ли активная почта"""
+        return bool(self.email and self.token)
+
+    def copy(self) -> "UserRecord":
+        """Копия записи (кэш хранилища отдает копии, чтобы его нельзя было изменить снаружи)"""
+        return UserRecord(
+            self.user_id, self.email, self.password, self.token, self.account_id, self.lang,
+            self.created_at, self.updated_at, self.mail_created_at,
+            dict(self.extra) if self.extra else None
+        )
+
+    def update(self, **changes: Any):
+        """Изменить поля; неизвестные поля попадают в extra"""
+        for key, value in changes.items():
+            if key in _TIMESTAMP_FIELDS:
+                setattr(self, key, to_epoch(value))
+            elif key == "lang":
+                self.lang = _intern_lang(value)
+            elif key in _STRING_FIELDS:
+                setattr(self, key, value or "")
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    @classmethod
+    def from_dict(cls, user_id: int, data: Dict[str, Any]) -> "UserRecord":
+        """Запись из формата файла"""
+        record = cls(
+            user_id,
+            data.get("email") or "",
+            data.get("password") or "",
+            data.get("token") or "",
+            data.get("account_id") or "",
+            _intern_lang(data.get("lang")),
+            to_epoch(data.get("created_at")),
+            to_epoch(data.get("updated_at")),
+            to_epoch(data.get("mail_created_at")),
+        )
+        extra = {key: value for key, value in data.items() if key not in _KNOWN_KEYS}
+        if extra:
+            record.extra = extra
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Запись в формате файла: пустые поля, язык по умолчанию и нулевое время не сохраняются"""
+        data: Dict[str, Any] = {}
+        if self.email:
+            data["email"] = self.email
+        if self.password:
+            data["password"] = self.password
+        if self.token:
+            data["token"] = self.token
+        if self.account_id:
+            data["account_id"] = self.account_id
+        if self.lang != DEFAULT_LANGUAGE:
+            data["lang"] = self.lang
+        if self.created_at:
+            data["created_at"] = self.created_at
+        if self.updated_at:
+            data["updated_at"] = self.updated_at
+        if self.mail_created_at:
+            data["mail_created_at"] = self.mail_created_at
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+_STRING_FIELDS = frozenset(("email", "password", "token", "account_id"))
+_TIMESTAMP_FIELDS = frozenset(("created_at", "updated_at", "mail_created_at"))
+_KNOWN_KEYS = frozenset(field.name for field in fields(UserRecord)) - {"user_id", "extra"}
+
+
+def decode_users(data: Dict[str, Any]) -> Dict[int, UserRecord]:
+    """Содержимое файла хранилища -> записи по user_id (читаются все версии формата)"""
+    if data and FORMAT_KEY not in data:
+        logger.info(f"Пользователи в формате версии 1: при следующей записи будут сохранены в версии {FORMAT_VERSION}")
+    return {
+        int(user_key): UserRecord.from_dict(int(user_key), user_data)
+        for user_key, user_data in data.items()
+        if user_key.lstrip("-").isdigit()
+    }
+
+
+def encode_users(users: Dict[int, UserRecord]) -> Dict[str, Any]:
+    """Записи -> содержимое файла хранилища (с версией формата)"""
+    data: Dict[str, Any] = {FORMAT_KEY: FORMAT_VERSION}
+    for user_id, record in users.items():
+        data[str(user_id)] = record.to_dict()
+    return data